@@ -7,6 +7,7 @@ from django.contrib.auth.models import Group, User
 from django.utils.translation import gettext_lazy as _
 
 from app.accounts.forms import UserChangeForm, UserCreationForm
+from app.accounts.models import SecurityEvent
 
 UserModel = get_user_model()
 
@@ -87,3 +88,22 @@ class UserAdmin(auth_admin.UserAdmin):
 
 
 admin_site.register(Group)
+
+
+@admin.register(SecurityEvent, site=admin_site)
+class SecurityEventAdmin(admin.ModelAdmin):
+    list_display = ["created_at", "event_type", "username", "ip", "user_agent"]
+    list_filter = ["event_type", "created_at"]
+    search_fields = ["=username", "=ip"]
+    date_hierarchy = "created_at"
+    ordering = ["-created_at"]
+    # Audit rows are append-only, and counting the whole table on every
+    # changelist page gets slow as it grows.
+    show_full_result_count = False
+    readonly_fields = ["created_at", "event_type", "username", "ip", "user_agent", "details"]
+
+    def has_add_permission(self, request) -> bool:
+        return False
+
+    def has_change_permission(self, request, obj=None) -> bool:
+        return False
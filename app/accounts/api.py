@@ -1,102 +1,157 @@
 from xml.dom import ValidationErr
 
+from asgiref.sync import sync_to_async
 from django.contrib import auth
 from django.contrib.auth import authenticate, get_user_model
-from django.db.models import Q
+from django.http import HttpResponse
 from django.utils import timezone
 from ninja import Router
 
+from app.accounts.audit import record_lockout
+from app.accounts.backends import EmailOrUsernameModelBackend, aauthenticate
+from app.accounts.hashing import PasswordHashPoolFull
+from app.accounts.middleware import get_client_ip
+from app.accounts.models import LOCKOUT_THRESHOLD, canonical_login_key
+from app.accounts.ratelimit import RateLimitResult, get_login_rate_limiter
 from app.accounts.schemas import LoginInputSchema, LoginResponseSchema, MessageSchema
+from app.logs import get_event_logger
+from app.metrics import RATE_LIMIT_REJECTIONS
+from app.timing import timed
 
 User = get_user_model()
 auth_router = Router()
+security_logger = get_event_logger("security")
+
+LOGIN_RESPONSES = {
+    200: LoginResponseSchema,
+    401: MessageSchema,
+    403: MessageSchema,
+    429: MessageSchema,
+    500: MessageSchema,
+    503: MessageSchema,
+}
+
+INVALID_CREDENTIALS = (
+    401,
+    {
+        "message": "Invalid credentials.",
+        "detail": "Username/Email or password is incorrect.",
+    },
+)
 
-
-@auth_router.post(
-    "login",
-    response={
-        200: LoginResponseSchema,
-        401: MessageSchema,
-        403: MessageSchema,
-        429: MessageSchema,
-        500: MessageSchema,
+TOO_MANY_ATTEMPTS = (
+    429,
+    {
+        "message": "Too many login attempts",
+        "detail": "Account temporarily locked for security reasons.",
     },
-    url_name="auth-login",
 )
-def auth_login(request, login_data: LoginInputSchema):  # noqa PLR0911
+
+
+def _rate_limited_response(login_data: LoginInputSchema, rate_limit: RateLimitResult, response: HttpResponse):
+    security_logger.warning(
+        "Login rate limit exceeded (%s): %s",
+        rate_limit.scope,
+        login_data.login_id,
+        event="rate_limited",
+        username=login_data.login_id,
+        scope=rate_limit.scope,
+    )
+    RATE_LIMIT_REJECTIONS.labels(scope=rate_limit.scope).inc()
+    response["Retry-After"] = str(rate_limit.retry_after)
+    return (
+        429,
+        {
+            "message": "Too many login attempts",
+            "detail": "Please try again later.",
+        },
+    )
+
+
+def _overloaded_response(err: PasswordHashPoolFull, response: HttpResponse):
+    response["Retry-After"] = str(err.retry_after)
+    return (
+        503,
+        {
+            "message": "Service temporarily overloaded.",
+            "detail": "Please try again later.",
+        },
+    )
+
+
+def _locked_response(user: User):
+    return (
+        403,
+        {
+            "message": "Account temporarily locked.",
+            "detail": f"Please try again after {user.account_locked_until.strftime('%H:%M:%S')}",
+        },
+    )
+
+
+def _is_locked(user: User) -> bool:
+    return bool(user.account_locked_until and user.account_locked_until > timezone.now())
+
+
+def _lock_account(request, user: User) -> None:
+    # Counted as a failure, so the lock grows with the account's tier and is
+    # applied by the same atomic UPDATE as any other failed login.
+    lock_minutes = user.record_failed_login()
+    if lock_minutes:
+        record_lockout(request, user.username, lock_minutes)
+
+
+@auth_router.post("login", response=LOGIN_RESPONSES, url_name="auth-login")
+def auth_login(request, login_data: LoginInputSchema, response: HttpResponse):  # noqa PLR0911
     """
     Endpoint for user authentication using email or useranme.
 
     Allow login with email or username, checks login attempts and account lockout.
+    Attempts over the account or client IP rate limits are rejected before any
+    database query or password hashing, and logins arriving while the hashing
+    queue is full fail fast with 503.
     """
+    rate_limit = get_login_rate_limiter().hit(
+        account=canonical_login_key(login_data.login_id),
+        ip=get_client_ip(request),
+    )
+    if not rate_limit.allowed:
+        return _rate_limited_response(login_data, rate_limit, response)
+
     try:
-        user = User.objects.filter(
-            Q(email__iexact=login_data.login_id)
-            | Q(username__iexact=login_data.login_id)
-        ).first()
+        backend = EmailOrUsernameModelBackend()
+        with timed("lookup"):
+            user = backend.resolve_user(login_data.login_id)
 
         if not user:
-            return (
-                401,
-                {
-                    "message": "Invalid credentials.",
-                    "detail": "Username/Email or password is incorrect.",
-                },
-            )
-
-        if user and user.account_locked_until:
-            if user.account_locked_until > timezone.now():
-                return (
-                    403,
-                    {
-                        "message": "Account temporarily locked.",
-                        "detail": f"Please try again after {user.account_locked_until.strftime('%H:%M:%S')}",
-                    },
-                )
-
-        if user:
-
-            if user.failed_login_attempts >= 5:
-                user.account_locked_until = timezone.now() + timezone.timedelta(
-                    minutes=5
-                )
-                user.save(
-                    update_fields=[
-                        "failed_login_attempts",
-                        "last_failed_login",
-                        "account_locked_until",
-                    ]
-                )
-
-                return (
-                    429,
-                    {
-                        "message": "Too many login attempts",
-                        "detail": "Account temporarily locked for security reasons.",
-                    },
-                )
-
-            user.save(update_fields=["failed_login_attempts", "last_failed_login"])
+            backend.check_dummy_password(login_data.password)
+            return INVALID_CREDENTIALS
+
+        if _is_locked(user):
+            return _locked_response(user)
+
+        if user.failed_login_attempts >= LOCKOUT_THRESHOLD:
+            _lock_account(request, user)
+            return TOO_MANY_ATTEMPTS
 
+        # The resolved instance travels through the backend and, on failure,
+        # the user_login_failed signal, so neither has to look it up again.
         authenticated_user = authenticate(
             request,
             username=login_data.login_id,
             password=login_data.password,
+            user=user,
         )
 
         if authenticated_user:
-            if authenticated_user.failed_login_attempts > 0:
-                authenticated_user.failed_login_attempts = 0
-                authenticated_user.last_failed_login = None
-                authenticated_user.save(
-                    update_fields=["failed_login_attempts", "last_failed_login"]
-                )
-
             # Check if the session is available.
             if hasattr(request, "session"):
-                auth.login(request, authenticated_user)
+                # The user_logged_in handler resets the failed attempt counters.
+                with timed("login"):
+                    auth.login(request, authenticated_user)
             else:
                 print("SESSÃO INDISPONÍVEL")
+                authenticated_user.record_successful_login()
 
             return 200, {
                 "message": "Login successful.",
@@ -104,20 +159,76 @@ def auth_login(request, login_data: LoginInputSchema):  # noqa PLR0911
                 "detail": None,
             }
         else:
-            return (
-                401,
-                {
-                    "message": "Invalid credentials.",
-                    "detail": "Username/Email or password is incorrect.",
-                },
-            )
+            return INVALID_CREDENTIALS
 
+    except PasswordHashPoolFull as err:
+        return _overloaded_response(err, response)
     except ValidationErr as err:
         return (400, {"message": "Validation error.", "detail": str(err)})
     except Exception as err:
         return (500, {"message": "Internal server error.", "detail": str(err)})
 
 
+@auth_router.post("login/async", response=LOGIN_RESPONSES, url_name="auth-login-async")
+async def auth_login_async(request, login_data: LoginInputSchema, response: HttpResponse):  # noqa PLR0911
+    """
+    Async version of auth_login for ASGI deployments.
+
+    Database access goes through the async ORM and the password hash is
+    verified in a worker thread, so in-flight logins do not hold a thread
+    while they wait on the database.
+    """
+    rate_limit = await get_login_rate_limiter().ahit(
+        account=canonical_login_key(login_data.login_id),
+        ip=get_client_ip(request),
+    )
+    if not rate_limit.allowed:
+        return _rate_limited_response(login_data, rate_limit, response)
+
+    try:
+        backend = EmailOrUsernameModelBackend()
+        with timed("lookup"):
+            user = await backend.aresolve_user(login_data.login_id)
+
+        if not user:
+            await backend.acheck_dummy_password(login_data.password)
+            return INVALID_CREDENTIALS
+
+        if _is_locked(user):
+            return _locked_response(user)
+
+        if user.failed_login_attempts >= LOCKOUT_THRESHOLD:
+            await sync_to_async(_lock_account)(request, user)
+            return TOO_MANY_ATTEMPTS
+
+        authenticated_user = await aauthenticate(
+            request,
+            username=login_data.login_id,
+            password=login_data.password,
+            user=user,
+        )
+
+        if not authenticated_user:
+            return INVALID_CREDENTIALS
+
+        if hasattr(request, "session"):
+            with timed("login"):
+                await auth.alogin(request, authenticated_user)
+        else:
+            await authenticated_user.arecord_successful_login()
+
+        return 200, {
+            "message": "Login successful.",
+            "user": authenticated_user,
+            "detail": None,
+        }
+
+    except PasswordHashPoolFull as err:
+        return _overloaded_response(err, response)
+    except Exception as err:
+        return (500, {"message": "Internal server error.", "detail": str(err)})
+
+
 @auth_router.get("get-csrftoken", response={200: MessageSchema, 401: MessageSchema})
 def csrf_test(request):
     return 200, {"message": "CRSF TOKEN"}
@@ -1,6 +1,8 @@
 from django.apps import AppConfig
+from django.conf import settings
 
-from app.logs import get_logger
+from app.logs import enable_queue_logging, get_logger
+from app.slow_queries import install_slow_query_log
 
 logger = get_logger("", level=20)
 
@@ -14,7 +16,28 @@ class AccountsConfig(AppConfig):
         try:
             import app.accounts.signals  # noqa F401
 
+            # user_logged_handler updates last_login together with the fail
+            # counters, so Django's separate UPDATE is not needed.
+            from django.contrib.auth.models import update_last_login
+            from django.contrib.auth.signals import user_logged_in
+
+            user_logged_in.disconnect(update_last_login, dispatch_uid="update_last_login")
+
             logger.info("Accounts security signals registered successfully.")
         except ImportError as err:
             logger.error(f"Failed to register account signals: {err}")
             raise
+
+        install_slow_query_log()
+
+        queue_config = getattr(settings, "SECURITY_LOG_QUEUE", {})
+        if queue_config.get("ENABLED"):
+            # Login requests only enqueue security records; disk and console
+            # writes happen on the listener thread.
+            enable_queue_logging(
+                "security",
+                max_size=queue_config.get("MAX_SIZE", 10_000),
+                policy=queue_config.get("POLICY", "drop"),
+                block_timeout=queue_config.get("BLOCK_TIMEOUT", 0.1),
+                batch_size=queue_config.get("BATCH_SIZE", 100),
+            )
@@ -0,0 +1,190 @@
+import atexit
+import ipaddress
+import os
+import threading
+from functools import lru_cache
+from typing import Optional
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import close_old_connections
+from django.dispatch import receiver
+from django.http import HttpRequest
+
+from app.accounts.middleware import get_client_ip
+from app.accounts.models import SecurityEvent
+from app.logs import get_event_logger
+from app.metrics import ACCOUNT_LOCKOUTS
+
+security_logger = get_event_logger("security")
+
+
+def _clean_ip(value: Optional[str]) -> Optional[str]:
+    try:
+        return str(ipaddress.ip_address(value)) if value else None
+    except ValueError:
+        return None
+
+
+class SecurityEventBuffer:
+    """
+    Write-behind buffer for ``SecurityEvent`` rows.
+
+    ``record`` only appends to an in-process list; a background thread saves
+    the pending events with one ``bulk_create`` every ``flush_seconds`` or as
+    soon as ``batch_size`` are waiting. At most ``max_pending`` events are
+    held: past that new events are dropped and counted, so a database outage
+    cannot grow the buffer without limit. Pending events are flushed at exit.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        batch_size: int = 100,
+        flush_seconds: float = 5.0,
+        max_pending: int = 10_000,
+    ) -> None:
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_pending = max_pending
+        self.dropped = 0
+        self._pending: list[SecurityEvent] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = None
+
+    def record(
+        self,
+        event_type: str,
+        username: str = "",
+        ip: Optional[str] = None,
+        user_agent: Optional[str] = None,
+        **details,
+    ) -> None:
+        """Queue one event; never touches the database."""
+        if not self.enabled:
+            return
+
+        event = SecurityEvent(
+            event_type=event_type,
+            username=(username or "")[:254],
+            ip=_clean_ip(ip),
+            user_agent=(user_agent or "")[:512],
+            details=details,
+        )
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return
+            self._pending.append(event)
+            full = len(self._pending) >= self.batch_size
+            if self._thread is None:
+                self._start()
+
+        if full:
+            self._wakeup.set()
+
+    def flush(self) -> int:
+        """Insert the pending events now and return how many were written."""
+        with self._flush_lock:
+            with self._lock:
+                events, self._pending = self._pending, []
+            if not events:
+                return 0
+
+            try:
+                SecurityEvent.objects.bulk_create(events, batch_size=self.batch_size)
+            except Exception as err:
+                security_logger.error(
+                    "Could not save %s security events: %s", len(events), err, event="audit_flush_failed"
+                )
+                return 0
+            return len(events)
+
+    def _start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="security-events", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopped:
+            self._wakeup.wait(self.flush_seconds)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+    def close(self) -> None:
+        """Stop the background thread after a last flush."""
+        self._stopped = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _after_fork(self) -> None:
+        # Events queued by the parent are written by the parent.
+        self._pending = []
+        self._thread = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def get_security_event_buffer() -> SecurityEventBuffer:
+    """Return the buffer configured in ``settings.SECURITY_EVENTS``."""
+    config = settings.SECURITY_EVENTS
+    return SecurityEventBuffer(
+        enabled=config.get("ENABLED", True),
+        batch_size=config.get("BATCH_SIZE", 100),
+        flush_seconds=config.get("FLUSH_SECONDS", 5.0),
+        max_pending=config.get("MAX_PENDING", 10_000),
+    )
+
+
+def _close_at_exit() -> None:
+    if get_security_event_buffer.cache_info().currsize:
+        get_security_event_buffer().close()
+
+
+def _reset_after_fork() -> None:
+    if get_security_event_buffer.cache_info().currsize:
+        get_security_event_buffer()._after_fork()
+
+
+# Installed once per process; they act on whichever buffer is current.
+atexit.register(_close_at_exit)
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def record_lockout(request: Optional[HttpRequest], username: str, lock_minutes: int) -> None:
+    """Count, log and store an account lockout, wherever the login pipeline decided it."""
+    ip = get_client_ip(request) if request else "N/A"
+    user_agent = request.META.get("HTTP_USER_AGENT", "") if request else "N/A"
+
+    ACCOUNT_LOCKOUTS.inc()
+    security_logger.warning(
+        "Account temporarily blocked: %s for %s minutes",
+        username,
+        lock_minutes,
+        event="account_locked",
+        username=username,
+        lock_minutes=lock_minutes,
+    )
+    get_security_event_buffer().record(
+        SecurityEvent.EventType.ACCOUNT_LOCKED,
+        username=username,
+        ip=ip,
+        user_agent=user_agent,
+        lock_minutes=lock_minutes,
+    )
+
+
+@receiver(setting_changed)
+def reset_security_event_buffer(setting: str, **kwargs) -> None:
+    if setting == "SECURITY_EVENTS" and get_security_event_buffer.cache_info().currsize:
+        get_security_event_buffer().close()
+        get_security_event_buffer.cache_clear()
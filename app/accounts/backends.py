@@ -1,18 +1,26 @@
 import re
 from typing import Optional, Type
 
-from django.contrib import messages
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.backends import ModelBackend
-from django.contrib.messages import constants
-from django.core.cache import cache
+from django.contrib.auth.signals import user_login_failed
+from django.core.exceptions import PermissionDenied
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Q
 from django.http import HttpRequest
 from django.utils.translation import gettext_lazy as _
 
+from app.accounts.hashing import get_dummy_password_hash, get_password_hash_pool, get_password_rehash_queue
+from app.accounts.lookup_filter import get_login_id_filter
 from app.accounts.models import User as CustomUser
-from app.logs import get_logger
+from app.accounts.models import canonical_login_key
+from app.accounts.user_cache import get_user_cache
+from app.db import prepared_statements
+from app.logs import get_event_logger, get_logger
 
-security_logger = get_logger("security")
+security_logger = get_event_logger("security")
 info_logger = get_logger("test")
 
 User = get_user_model()
@@ -43,96 +51,284 @@ class EmailOrUsernameModelBackend(ModelBackend):
 
         return True
 
-    def _increment_login_attempts(self, username: str) -> None:
-        """Increment failed attempt counter"""
-        if not username:
-            return
+    def resolve_user(self, login_id: str) -> Optional[CustomUser]:
+        """
+        Resolve the account addressed by a login_id (email or username) with a
+        single query. The instance is meant to be handed to ``authenticate``
+        through the ``user`` credential so the rest of the login pipeline
+        (backend, lockout checks and signal handlers) does not query it again.
 
-        username_lower = username.lower()
-        key = f"login_attempts:{username_lower}"
+        Identifiers the login id filter has never seen return None without a
+        query.
+        """
+        if not login_id:
+            return None
 
-        attempts = cache.get(key, 0)
-        cache.set(key, attempts + 1, 60 * 15)
+        key = canonical_login_key(login_id)
+        if not get_login_id_filter().might_exist(key):
+            return None
 
-    def authenticate(
-        self, request: HttpRequest, username: str = None, password: str = None, **kwargs
-    ) -> Optional[Type[CustomUser]]:
-        """Check credentials for user login with email or username"""
-        if not username or not password:
+        return self._find_login_id(key)
+
+    async def aresolve_user(self, login_id: str) -> Optional[CustomUser]:
+        """See resolve_user()."""
+        if not login_id:
             return None
 
-        info_logger.info(f"Attempting authentication with username/email: {username}")
-
-        is_email = self.is_valid_email(username)
-        login_type = "email" if is_email else "username"
-
-        try:
-            # Check if there is a superuser trying to log in with username
-            if not is_email:
-                # Check if there is a superuser with this username
-                try:
-                    potential_superuser = User.objects.get(username=username)
-                    if potential_superuser.is_superuser:
-                        if request:
-                            messages.add_message(
-                                request,
-                                constants.ERROR,
-                                _(
-                                    "Administrators must log in using their email address."
-                                ),
-                            )
-                            return None
-                        security_logger.warning(
-                            f"Invalid login attempt for superuser using username: {username}",
-                            extra={"request": request, "type": "auth_violation"},
-                        )
-                        return None
-                except User.DoesNotExist:
-                    pass
-
-            if is_email:
-                user = User.objects.get(email=username)
-            else:
-                user = User.objects.get(username=username)
-
-            if user.check_password(password):
-                security_logger.info(
-                    f"Successful login via {login_type} for user {user.username}",
-                    extra={
-                        "request": request,
-                        "username": user.username,
-                        "type": "login_success",
-                    },
+        key = canonical_login_key(login_id)
+        if not await get_login_id_filter().amight_exist(key):
+            return None
+
+        return await sync_to_async(self._find_login_id)(key)
+
+    def check_dummy_password(self, password: str) -> None:
+        """
+        Spend the hashing work of a password check when no account matched,
+        so unknown and existing login ids answer in the same time.
+        """
+        get_password_hash_pool().verify(password or "", get_dummy_password_hash())
+
+    async def acheck_dummy_password(self, password: str) -> None:
+        """See check_dummy_password()."""
+        await get_password_hash_pool().averify(password or "", get_dummy_password_hash())
+
+    def _login_id_queryset(self, key: str):
+        # Login reads go to the primary: a replica behind the failure counter
+        # updates would show a locked account as open (see PrimaryReplicaRouter).
+        return User.objects.using(DEFAULT_DB_ALIAS).filter(Q(email_key=key) | Q(username_key=key))
+
+    def _find_login_id(self, key: str) -> Optional[CustomUser]:
+        # The lookup runs on every login: prepare it on first use when the
+        # database settings allow prepared statements.
+        with prepared_statements():
+            return self._login_id_queryset(key).first()
+
+    def _login_type(self, username: str) -> str:
+        return "email" if self.is_valid_email(username) else "username"
+
+    def _screen_user(
+        self,
+        request: HttpRequest,
+        user: Optional[CustomUser],
+        username: str,
+        login_type: str,
+    ) -> Optional[CustomUser]:
+        """
+        Return the user whose password should be checked, or None when the
+        login is rejected (unknown identifier or a superuser using their
+        username). Rejected logins are still charged a dummy hash by the
+        caller, so they answer in the time of a wrong password.
+        """
+        # Lookups go through the canonical keys, but the identifier itself
+        # must still match exactly.
+        if user is not None and getattr(user, login_type) != username:
+            user = None
+
+        if user is None:
+            security_logger.warning(
+                "Login attempt for non-existent user via %s: %s",
+                login_type,
+                username,
+                event="login_failure",
+                username=username,
+                request=request,
+            )
+            return None
+
+        # Check if there is a superuser trying to log in with username
+        if login_type == "username" and user.is_superuser:
+            if request:
+                from django.contrib import messages
+                from django.contrib.messages import constants
+
+                messages.add_message(
+                    request,
+                    constants.ERROR,
+                    _("Administrators must log in using their email address."),
                 )
-                return user
             else:
-                security_logger.info(
-                    f"Invalid password for login via {login_type}: {username}",
-                    extra={
-                        "request": request,
-                        "type": "login_failure",
-                    },
+                security_logger.warning(
+                    "Invalid login attempt for superuser using username: %s",
+                    username,
+                    event="auth_violation",
+                    username=username,
+                    request=request,
                 )
-        except User.DoesNotExist:
-            security_logger.warning(
-                f"Login attempt for non-existent user via {login_type}: {username}",
-                extra={
-                    "request": request,
-                    "type": "login_failure",
-                },
+            return None
+
+        return user
+
+    def _log_password_check(
+        self,
+        request: HttpRequest,
+        user: CustomUser,
+        username: str,
+        login_type: str,
+        is_correct: bool,
+    ) -> None:
+        if is_correct:
+            security_logger.info(
+                "Successful login via %s for user %s",
+                login_type,
+                user.username,
+                event="login_success",
+                username=user.username,
+                request=request,
             )
+        else:
+            security_logger.info(
+                "Invalid password for login via %s: %s",
+                login_type,
+                username,
+                event="login_failure",
+                username=username,
+                request=request,
+            )
+
+    def _upgrade_password(self, user: CustomUser, password: str) -> bool:
+        """
+        Upgrade an outdated hash according to ``settings.PASSWORD_REHASH_MODE``.
+        Returns True when the caller has to save the password field.
+        """
+        mode = getattr(settings, "PASSWORD_REHASH_MODE", "inline")
+        if mode == "off":
+            return False
+
+        outdated = user.password
+        user.set_password(password)
+        # Password hash upgrades shouldn't be considered password changes.
+        user._password = None
+        if mode == "deferred":
+            # The instance already carries the new hash, so the session auth
+            # hash login() stores still matches once the queue has written it.
+            get_password_rehash_queue().schedule(user.pk, user.password, outdated)
+            return False
+        return True
+
+    def authenticate(
+        self,
+        request: HttpRequest,
+        username: str = None,
+        password: str = None,
+        user: Optional[CustomUser] = None,
+        **kwargs,
+    ) -> Optional[Type[CustomUser]]:
+        """
+        Check credentials for user login with email or username.
+
+        When ``user`` is given it is the account already resolved by
+        ``resolve_user`` and no lookup is made. In that case this backend is
+        authoritative: a rejected login raises ``PermissionDenied`` so the
+        remaining backends do not repeat the lookup and the password hashing.
+        """
+        if not username or not password:
+            return None
 
-        # Still increment attempts to prevent user enumeration
-        self._increment_login_attempts(username)
+        info_logger.info("Attempting authentication with username/email: %s", username)
 
+        login_type = self._login_type(username)
+        pipeline = user is not None
+
+        if not pipeline:
+            try:
+                key = canonical_login_key(username)
+                user = User.objects.using(DEFAULT_DB_ALIAS).get(**{f"{login_type}_key": key})
+            except User.DoesNotExist:
+                user = None
+
+        user = self._screen_user(request, user, username, login_type)
+        if user is None:
+            self.check_dummy_password(password)
+        else:
+            is_correct, must_update = get_password_hash_pool().verify(password, user.password)
+            self._log_password_check(request, user, username, login_type, is_correct)
+            if is_correct:
+                if must_update and self._upgrade_password(user, password):
+                    user.save(update_fields=["password"])
+                return user
+
+        if pipeline:
+            raise PermissionDenied
         return None
 
-    def get_user(self, user_id):
+    async def aauthenticate(
+        self,
+        request: HttpRequest,
+        username: str = None,
+        password: str = None,
+        user: Optional[CustomUser] = None,
+        **kwargs,
+    ) -> Optional[Type[CustomUser]]:
         """
-        Retrieve user by ID and ensure proper permissions are loaded
+        See authenticate().
+
+        Lookups use the async ORM and the password hash is verified on the
+        hashing pool, so the event loop is never blocked by the database or
+        PBKDF2.
         """
-        try:
-            user = User.objects.get(pk=user_id)
-            return user
-        except User.DoesNotExist:
+        if not username or not password:
             return None
+
+        info_logger.info("Attempting authentication with username/email: %s", username)
+
+        login_type = self._login_type(username)
+        pipeline = user is not None
+
+        if not pipeline:
+            try:
+                key = canonical_login_key(username)
+                user = await User.objects.using(DEFAULT_DB_ALIAS).aget(**{f"{login_type}_key": key})
+            except User.DoesNotExist:
+                user = None
+
+        user = self._screen_user(request, user, username, login_type)
+        if user is None:
+            await self.acheck_dummy_password(password)
+        else:
+            is_correct, must_update = await get_password_hash_pool().averify(password, user.password)
+            self._log_password_check(request, user, username, login_type, is_correct)
+            if is_correct:
+                if must_update and await sync_to_async(self._upgrade_password)(user, password):
+                    await user.asave(update_fields=["password"])
+                return user
+
+        if pipeline:
+            raise PermissionDenied
+        return None
+
+    def get_user(self, user_id):
+        """
+        Retrieve user by ID and ensure proper permissions are loaded.
+
+        Served from the user cache, so a warm request resolves its user
+        without a query.
+        """
+        return get_user_cache().get(user_id)
+
+
+async def aauthenticate(request: HttpRequest, user: CustomUser, **credentials) -> Optional[CustomUser]:
+    """
+    Async counterpart of ``django.contrib.auth.authenticate`` for the login
+    pipeline.
+
+    Django 5.1's ``aauthenticate`` runs the whole sync backend chain in a
+    thread. With a resolved ``user`` EmailOrUsernameModelBackend is
+    authoritative, so its native ``aauthenticate`` is awaited directly and
+    ``user_login_failed`` is dispatched with ``asend``.
+    """
+    backend = EmailOrUsernameModelBackend()
+    try:
+        authenticated_user = await backend.aauthenticate(request, user=user, **credentials)
+    except PermissionDenied:
+        authenticated_user = None
+
+    if authenticated_user is not None:
+        authenticated_user.backend = f"{backend.__module__}.{backend.__class__.__qualname__}"
+        return authenticated_user
+
+    await user_login_failed.asend(
+        sender=__name__,
+        credentials={**{k: v for k, v in credentials.items() if k != "password"}, "user": user},
+        request=request,
+    )
+    return None
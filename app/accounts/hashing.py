@@ -0,0 +1,254 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, make_password, verify_password
+from django.core.signals import setting_changed
+from django.db import close_old_connections
+from django.dispatch import receiver
+from django.utils.crypto import get_random_string
+
+from app.accounts.user_cache import invalidate_cached_user
+from app.logs import get_event_logger
+from app.timing import timed
+
+security_logger = get_event_logger("security")
+
+
+class CalibratedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2-SHA256 with the work factor taken from
+    ``settings.PASSWORD_HASH_ITERATIONS`` (see the calibrate_hasher command).
+    It keeps the ``pbkdf2_sha256`` algorithm name, so existing hashes verify
+    and are upgraded when the iteration count changes.
+    """
+
+    @property
+    def iterations(self) -> int:
+        return getattr(settings, "PASSWORD_HASH_ITERATIONS", 0) or PBKDF2PasswordHasher.iterations
+
+
+class PasswordHashPoolFull(Exception):
+    """Raised when the hashing queue is full and the request should be shed."""
+
+    def __init__(self, retry_after: int) -> None:
+        super().__init__("Password hashing queue is full.")
+        self.retry_after = retry_after
+
+
+def _timed_verify(password: str, encoded: str) -> tuple[bool, bool, float]:
+    start = time.perf_counter()
+    is_correct, must_update = verify_password(password, encoded)
+    return is_correct, must_update, time.perf_counter() - start
+
+
+def _init_process_worker() -> None:
+    import django
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "app.settings")
+    django.setup()
+
+
+class PasswordHashPool:
+    """
+    Bounded pool running ``verify_password`` off the request thread.
+
+    At most ``max_workers`` hashes run at once and ``max_queue`` more may wait.
+    Beyond that ``verify`` raises ``PasswordHashPoolFull`` immediately, so a
+    login storm is shed instead of queueing without limit and starving other
+    endpoints of CPU. PBKDF2 releases the GIL, so the thread pool hashes in
+    parallel; the process pool also isolates hashing from the request workers.
+    """
+
+    def __init__(self, kind: str = "thread", max_workers: int = None, max_queue: int = 64, retry_after: int = 1):
+        self.kind = kind
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+
+        if kind == "process":
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("fork"),
+                initializer=_init_process_worker,
+            )
+        elif kind == "thread":
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="password-hash")
+        else:
+            self.executor = None
+
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.max_queue)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+        self._hash_seconds = 0.0
+        self._wait_seconds = 0.0
+
+    def _submit(self, password: str, encoded: str) -> Future:
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            security_logger.warning(
+                "Password hashing queue full (%s running, %s queued)",
+                self.max_workers,
+                self.max_queue,
+                event="hash_pool_full",
+            )
+            raise PasswordHashPoolFull(self.retry_after)
+
+        with self._lock:
+            self._in_flight += 1
+        submitted_at = time.perf_counter()
+
+        if self.executor is None:
+            future = Future()
+            try:
+                future.set_result(_timed_verify(password, encoded))
+            except Exception as err:
+                future.set_exception(err)
+        else:
+            future = self.executor.submit(_timed_verify, password, encoded)
+
+        def done(future: Future) -> None:
+            elapsed = time.perf_counter() - submitted_at
+            try:
+                with self._lock:
+                    self._in_flight -= 1
+                    # Futures still queued on shutdown() are cancelled, and
+                    # exception() raises CancelledError for them.
+                    if not future.cancelled() and not future.exception():
+                        hash_seconds = future.result()[2]
+                        self._completed += 1
+                        self._hash_seconds += hash_seconds
+                        self._wait_seconds += max(0.0, elapsed - hash_seconds)
+            finally:
+                self._slots.release()
+
+        future.add_done_callback(done)
+        return future
+
+    def verify(self, password: str, encoded: str) -> tuple[bool, bool]:
+        """
+        Return ``(is_correct, must_update)`` like ``verify_password``, blocking
+        the caller until the hash is done. Raises ``PasswordHashPoolFull``.
+        """
+        with timed("hash"):
+            is_correct, must_update, _ = self._submit(password, encoded).result()
+        return is_correct, must_update
+
+    async def averify(self, password: str, encoded: str) -> tuple[bool, bool]:
+        """See verify()."""
+        with timed("hash"):
+            is_correct, must_update, _ = await asyncio.wrap_future(self._submit(password, encoded))
+        return is_correct, must_update
+
+    def stats(self) -> dict:
+        """Queue depth and hash latency counters for monitoring."""
+        with self._lock:
+            completed = self._completed or 1
+            return {
+                "kind": self.kind,
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "in_flight": self._in_flight,
+                "queue_depth": max(0, self._in_flight - self.max_workers),
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "hash_seconds_total": self._hash_seconds,
+                "avg_hash_ms": self._hash_seconds / completed * 1000,
+                "avg_wait_ms": self._wait_seconds / completed * 1000,
+            }
+
+    def shutdown(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+@lru_cache(maxsize=None)
+def get_password_hash_pool() -> PasswordHashPool:
+    """Return the pool configured in ``settings.PASSWORD_HASH_POOL``."""
+    config = settings.PASSWORD_HASH_POOL
+    return PasswordHashPool(
+        kind=config.get("KIND", "thread"),
+        max_workers=config.get("MAX_WORKERS"),
+        max_queue=config.get("MAX_QUEUE", 64),
+        retry_after=config.get("RETRY_AFTER", 1),
+    )
+
+
+@receiver(setting_changed)
+def reset_password_hash_pool(setting: str, **kwargs) -> None:
+    if setting == "PASSWORD_HASH_POOL" and get_password_hash_pool.cache_info().currsize:
+        get_password_hash_pool().shutdown()
+        get_password_hash_pool.cache_clear()
+
+
+@lru_cache(maxsize=None)
+def get_dummy_password_hash() -> str:
+    """
+    Hash of a random password, checked for logins of unknown accounts so they
+    cost the same hashing work as a wrong password.
+    """
+    return make_password(get_random_string(32))
+
+
+@receiver(setting_changed)
+def reset_dummy_password_hash(setting: str, **kwargs) -> None:
+    if setting in ("PASSWORD_HASHERS", "PASSWORD_HASH_ITERATIONS"):
+        get_dummy_password_hash.cache_clear()
+
+
+class PasswordRehashQueue:
+    """
+    Single background thread that stores upgraded password hashes.
+
+    The new hash is made during the login, as the session auth hash that
+    ``login()`` stores derives from it, and only the write is kept out of the
+    request. The UPDATE only applies if the stored hash is still the one that
+    was verified, so a password changed meanwhile is never overwritten. When
+    ``max_pending`` upgrades are waiting new ones are dropped; they are
+    scheduled again on the user's next login.
+    """
+
+    def __init__(self, max_pending: int = 1000) -> None:
+        self.max_pending = max_pending
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="password-rehash")
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def schedule(self, user_pk, encoded: str, outdated: str) -> bool:
+        """Replace the ``outdated`` hash of the user with ``encoded``."""
+        with self._lock:
+            if user_pk in self._pending or len(self._pending) >= self.max_pending:
+                return False
+            self._pending.add(user_pk)
+
+        self.executor.submit(self._rehash, user_pk, encoded, outdated)
+        return True
+
+    def _rehash(self, user_pk, encoded: str, outdated: str) -> None:
+        try:
+            if get_user_model().objects.filter(pk=user_pk, password=outdated).update(password=encoded):
+                invalidate_cached_user(user_pk)
+        except Exception as err:
+            security_logger.error("Deferred password rehash failed for %s: %s", user_pk, err, event="rehash_failed")
+        finally:
+            with self._lock:
+                self._pending.discard(user_pk)
+            close_old_connections()
+
+    def join(self) -> None:
+        """Wait for the upgrades scheduled so far."""
+        self.executor.submit(lambda: None).result()
+
+
+@lru_cache(maxsize=None)
+def get_password_rehash_queue() -> PasswordRehashQueue:
+    return PasswordRehashQueue()
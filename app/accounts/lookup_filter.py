@@ -0,0 +1,224 @@
+import hashlib
+import math
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.signals import setting_changed
+from django.db import close_old_connections
+from django.dispatch import receiver
+
+from app.logs import get_event_logger
+from app.metrics import record_cache_lookup
+
+security_logger = get_event_logger("security")
+
+
+class BloomFilter:
+    """Fixed size Bloom filter over strings, sized for ``capacity`` entries at ``error_rate``."""
+
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        capacity = max(1, capacity)
+        self.size = max(64, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hash_count))
+
+    def add(self, key: str) -> None:
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class LoginIdFilter:
+    """
+    Negative lookup filter over the canonical email and username keys.
+
+    A miss means no account has that login_id, so the login can be rejected
+    without a query. The filter is built in a background thread on first use
+    and rebuilt every ``rebuild_seconds``; until the first build finishes every
+    lookup goes to the database.
+
+    Accounts saved in this process are added right away. Accounts saved by
+    other workers since their last rebuild are covered by a marker in the
+    shared cache, checked only on a filter miss. Deleted accounts stay in the
+    filter (costing a query) until the next rebuild.
+    """
+
+    marker_prefix = "login_id_filter"
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        capacity: int = 100_000,
+        error_rate: float = 0.001,
+        rebuild_seconds: int = 3600,
+    ) -> None:
+        self.enabled = enabled
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.rebuild_seconds = rebuild_seconds
+        self._bloom = None
+        self._next_build_at = 0.0
+        self._building = False
+        self._added_while_building = []
+        self._stale = 0
+        self._lock = threading.Lock()
+
+    def _marker_key(self, key: str) -> str:
+        digest = hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+        return f"{self.marker_prefix}:{digest}"
+
+    def _lookup(self, key: str):
+        """Return True/False when the filter decides, None when the cache marker must be checked."""
+        if not self.enabled:
+            return True
+
+        bloom = self._bloom
+        if time.monotonic() >= self._next_build_at:
+            self.rebuild_in_background()
+        if bloom is None or key in bloom:
+            return True
+        return None
+
+    def might_exist(self, key: str) -> bool:
+        """False only when no account has the canonical login key ``key``."""
+        decision = self._lookup(key)
+        if decision is not None:
+            return decision
+        try:
+            found = cache.get(self._marker_key(key)) is not None
+        except Exception:
+            return True
+        record_cache_lookup("login_id_marker", found)
+        return found
+
+    async def amight_exist(self, key: str) -> bool:
+        """See might_exist()."""
+        decision = self._lookup(key)
+        if decision is not None:
+            return decision
+        try:
+            found = await cache.aget(self._marker_key(key)) is not None
+        except Exception:
+            return True
+        record_cache_lookup("login_id_marker", found)
+        return found
+
+    def add(self, *keys: str) -> None:
+        """Record the login keys of a saved account."""
+        if not self.enabled:
+            return
+
+        keys = [key for key in keys if key]
+        with self._lock:
+            if self._bloom is not None:
+                for key in keys:
+                    self._bloom.add(key)
+            if self._building:
+                self._added_while_building.extend(keys)
+
+        # Markers must outlive the previous filter of every other worker.
+        try:
+            cache.set_many({self._marker_key(key): 1 for key in keys}, timeout=self.rebuild_seconds * 2)
+        except Exception as err:
+            security_logger.error("Login id filter marker not stored: %s", err, event="login_id_filter_error")
+
+    def discard(self, *keys: str) -> None:
+        """
+        Note the login keys of a deleted account. A Bloom filter cannot remove
+        entries, so once deletions pass 5% of the capacity it is rebuilt early.
+        """
+        with self._lock:
+            self._stale += len(keys)
+            rebuild = self._stale > self.capacity * 0.05
+        if rebuild:
+            self.rebuild_in_background()
+
+    def rebuild(self) -> None:
+        """Build a new filter from the database and swap it in."""
+        with self._lock:
+            self._building = True
+            self._added_while_building = []
+        self._rebuild()
+
+    def rebuild_in_background(self) -> None:
+        with self._lock:
+            if self._building:
+                return
+            self._building = True
+            self._added_while_building = []
+
+        def run():
+            try:
+                self._rebuild()
+            except Exception as err:
+                security_logger.error("Login id filter rebuild failed: %s", err, event="login_id_filter_error")
+            finally:
+                close_old_connections()
+
+        threading.Thread(target=run, name="login-id-filter", daemon=True).start()
+
+    def _rebuild(self) -> None:
+        try:
+            User = get_user_model()
+            bloom = BloomFilter(max(self.capacity, User.objects.count() * 2), self.error_rate)
+            for email_key, username_key in User.objects.values_list("email_key", "username_key").iterator(
+                chunk_size=5000
+            ):
+                bloom.add(email_key)
+                bloom.add(username_key)
+
+            with self._lock:
+                for key in self._added_while_building:
+                    bloom.add(key)
+                self._bloom = bloom
+                self._stale = 0
+        finally:
+            with self._lock:
+                # A failed build is retried at the next interval, not on every lookup.
+                self._next_build_at = time.monotonic() + self.rebuild_seconds
+                self._building = False
+                self._added_while_building = []
+
+
+@lru_cache(maxsize=None)
+def get_login_id_filter() -> LoginIdFilter:
+    """
+    Return the filter configured in ``settings.LOGIN_ID_FILTER``.
+
+    Accounts saved by other workers are only seen through the markers of the
+    default cache, so the filter stays off when that cache is per process,
+    unless SINGLE_PROCESS says one process serves every request.
+    """
+    config = settings.LOGIN_ID_FILTER
+    enabled = config.get("ENABLED", True)
+    if enabled and isinstance(caches[DEFAULT_CACHE_ALIAS], LocMemCache) and not config.get("SINGLE_PROCESS", False):
+        security_logger.warning(
+            "Login id filter disabled: the default cache is not shared between processes",
+            event="login_id_filter_error",
+        )
+        enabled = False
+    return LoginIdFilter(
+        enabled=enabled,
+        capacity=config.get("CAPACITY", 100_000),
+        error_rate=config.get("ERROR_RATE", 0.001),
+        rebuild_seconds=config.get("REBUILD_SECONDS", 3600),
+    )
+
+
+@receiver(setting_changed)
+def reset_login_id_filter(setting: str, **kwargs) -> None:
+    if setting in ("LOGIN_ID_FILTER", "CACHES"):
+        get_login_id_filter.cache_clear()
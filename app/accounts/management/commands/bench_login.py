@@ -0,0 +1,408 @@
+import asyncio
+import json
+import math
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections
+from django.middleware.csrf import CSRF_ALLOWED_CHARS, CSRF_SECRET_LENGTH
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+from prometheus_client.parser import text_string_to_metric_families
+
+from app.accounts.models import LOCKOUT_THRESHOLD
+from app.metrics import metrics_response
+
+User = get_user_model()
+
+BENCH_USERNAME = "bench_login_user"
+BENCH_PASSWORD = "bench_password_12345"
+LOCKED_USERNAME = "bench_login_locked"
+WRONG_PASSWORD_PREFIX = "bench_login_wrong_"
+
+SCENARIOS = ("username", "email", "wrong_password", "unknown", "locked")
+DEFAULT_MIX = "username=50,email=20,wrong_password=15,unknown=10,locked=5"
+
+# Environment of the two runs of --compare-pool, see DATABASE_POOL in settings.
+POOL_MODES = {
+    "pooled": {"DATABASE_POOL_ENABLED": "True"},
+    "unpooled": {"DATABASE_POOL_ENABLED": "False", "DATABASE_CONN_MAX_AGE": "0"},
+}
+
+
+def parse_mix(value: str) -> dict[str, int]:
+    """Parse ``scenario=weight,...`` into weights by scenario."""
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS or not weight.strip().isdigit():
+            raise CommandError(f"Invalid mix entry {item!r}, expected one of {', '.join(SCENARIOS)} as name=weight.")
+        mix[name] = int(weight)
+    if not sum(mix.values()):
+        raise CommandError("The scenario mix has no weight.")
+    return mix
+
+
+def percentiles(timings: list[float]) -> dict[str, float]:
+    if len(timings) < 2:
+        value = round(timings[0], 2) if timings else 0.0
+        return {"mean": value, "p50": value, "p95": value, "p99": value}
+    cuts = statistics.quantiles(timings, n=100, method="inclusive")
+    return {
+        "mean": round(statistics.fmean(timings), 2),
+        "p50": round(cuts[49], 2),
+        "p95": round(cuts[94], 2),
+        "p99": round(cuts[98], 2),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the sync and async /api/v1/auth/login routes at a given concurrency with a mix of "
+        "login scenarios, in-process or against a running server (--url). Reports throughput, latency "
+        "percentiles and database queries per request as a table and optionally as JSON. In-process "
+        "runs release the database connection after every request, as the request handler does."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500, help="Total logins per route.")
+        parser.add_argument("--concurrency", type=int, default=50, help="Logins in flight at once.")
+        parser.add_argument("--route", choices=["sync", "async", "both"], default="both")
+        parser.add_argument(
+            "--mix",
+            type=parse_mix,
+            default=DEFAULT_MIX,
+            help=f"Scenario weights, from {', '.join(SCENARIOS)} (default: {DEFAULT_MIX}).",
+        )
+        parser.add_argument("--seed", type=int, default=0, help="Seed of the scenario order.")
+        parser.add_argument(
+            "--url",
+            help=(
+                "Base URL of a running server, e.g. http://localhost:8000. The bench accounts are written "
+                "through this process's database settings, so they must point at the server's database, "
+                "and the server's login rate limits must allow the run."
+            ),
+        )
+        parser.add_argument("--metrics-token", default="", help="Bearer token of the server's metrics endpoint.")
+        parser.add_argument(
+            "--json", dest="json_path", help="Also write the results as JSON to this file, or - for stdout."
+        )
+        parser.add_argument(
+            "--compare-pool",
+            action="store_true",
+            help="Run in-process twice, with the connection pool and with a connection per request, and compare.",
+        )
+
+    def handle(self, *args, **options):
+        if options["compare_pool"]:
+            if options["url"]:
+                raise CommandError("--compare-pool runs in-process, it cannot be combined with --url.")
+            results = {mode: self.run_pool_mode(env, options) for mode, env in POOL_MODES.items()}
+            self.write_pool_comparison(results)
+            self.write_json(results, options["json_path"])
+            return
+
+        mix = options["mix"]
+        routes = ["sync", "async"] if options["route"] == "both" else [options["route"]]
+        results = {
+            "target": options["url"] or "in-process",
+            "concurrency": options["concurrency"],
+            "requests": options["requests"],
+            "mix": mix,
+            "routes": {},
+        }
+
+        # Every request comes from the same client, so lift the rate limits
+        # for the duration of an in-process run.
+        with override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"],
+            LOGIN_RATE_LIMIT={**settings.LOGIN_RATE_LIMIT, "RATES": {}},
+        ):
+            for route in routes:
+                path = reverse("api-1.0:auth-login" if route == "sync" else "api-1.0:auth-login-async")
+                plan = self.build_plan(mix, options["requests"], random.Random(options["seed"]))
+                queries_before = self.query_totals(path, options)
+
+                start = time.perf_counter()
+                if options["url"]:
+                    samples = self.run_remote(options["url"].rstrip("/") + path, plan, options["concurrency"])
+                elif route == "sync":
+                    samples = self.run_sync(path, plan, options["concurrency"])
+                else:
+                    samples = asyncio.run(self.run_async(path, plan, options["concurrency"]))
+                elapsed = time.perf_counter() - start
+
+                queries_after = self.query_totals(path, options)
+                results["routes"][route] = self.summarize(samples, elapsed, queries_before, queries_after)
+
+        self.write_table(results)
+        self.write_json(results, options["json_path"])
+
+    def write_json(self, results: dict, path: Optional[str]) -> None:
+        if path == "-":
+            self.stdout.write(json.dumps(results, indent=2))
+        elif path:
+            with open(path, "w") as file:
+                json.dump(results, file, indent=2)
+
+    def run_pool_mode(self, env: dict[str, str], options) -> dict:
+        """Run the bench in a child process whose database settings come from ``env``."""
+        with tempfile.TemporaryDirectory() as directory:
+            json_path = os.path.join(directory, "results.json")
+            command = [
+                sys.executable,
+                "-m",
+                "django",
+                "bench_login",
+                f"--requests={options['requests']}",
+                f"--concurrency={options['concurrency']}",
+                f"--route={options['route']}",
+                f"--mix={','.join(f'{name}={weight}' for name, weight in options['mix'].items())}",
+                f"--seed={options['seed']}",
+                f"--json={json_path}",
+            ]
+            completed = subprocess.run(command, env={**os.environ, **env}, capture_output=True, text=True, check=False)
+            if completed.returncode:
+                raise CommandError(f"Bench run with {env} failed:\n{completed.stderr}")
+            with open(json_path) as file:
+                return json.load(file)
+
+    def build_plan(self, mix: dict[str, int], total: int, rng: random.Random) -> list[tuple[str, str]]:
+        """Scenario and JSON body of every request, with the bench accounts reset."""
+        weight = sum(mix.values())
+        counts = {name: total * share // weight for name, share in mix.items()}
+        for name in sorted(mix, key=mix.get, reverse=True)[: total - sum(counts.values())]:
+            counts[name] += 1
+
+        # Each wrong-password account takes fewer failures than the lockout
+        # threshold, so the scenario keeps measuring the password check.
+        wrong_accounts = self.prepare_accounts(math.ceil(counts.get("wrong_password", 0) / (LOCKOUT_THRESHOLD - 1)))
+        email = User.objects.get(username=BENCH_USERNAME).email
+
+        credentials = {
+            "username": lambda i: (BENCH_USERNAME, BENCH_PASSWORD),
+            "email": lambda i: (email, BENCH_PASSWORD),
+            "wrong_password": lambda i: (wrong_accounts[i // (LOCKOUT_THRESHOLD - 1)], "wrong_password_12345"),
+            "unknown": lambda i: (f"bench_login_unknown_{i}", BENCH_PASSWORD),
+            "locked": lambda i: (LOCKED_USERNAME, BENCH_PASSWORD),
+        }
+        plan = []
+        for name, count in counts.items():
+            for i in range(count):
+                login_id, password = credentials[name](i)
+                plan.append((name, json.dumps({"login_id": login_id, "password": password})))
+        rng.shuffle(plan)
+        return plan
+
+    def prepare_accounts(self, wrong_password_accounts: int) -> list[str]:
+        """Create the missing bench accounts and clear the failures of earlier runs."""
+        usernames = [BENCH_USERNAME, LOCKED_USERNAME] + [
+            f"{WRONG_PASSWORD_PREFIX}{i}" for i in range(wrong_password_accounts)
+        ]
+        existing = set(User.objects.filter(username__in=usernames).values_list("username", flat=True))
+        encoded = make_password(BENCH_PASSWORD)
+        for username in usernames:
+            if username not in existing:
+                User(username=username, email=f"{username}@bench.example.com", password=encoded).save()
+
+        User.objects.filter(username__in=usernames).update(
+            failed_login_attempts=0, last_failed_login=None, account_locked_until=None
+        )
+        User.objects.filter(username=LOCKED_USERNAME).update(account_locked_until=timezone.now() + timedelta(days=1))
+        return usernames[2:]
+
+    def run_sync(self, path: str, plan: list[tuple[str, str]], concurrency: int):
+        def worker(share: list[tuple[str, str]]):
+            client = Client()
+            samples = []
+            for scenario, payload in share:
+                start = time.perf_counter()
+                response = client.post(path, data=payload, content_type="application/json")
+                close_old_connections()
+                samples.append((scenario, (time.perf_counter() - start) * 1000, response.status_code))
+            connections.close_all()
+            return samples
+
+        return self.run_threads(worker, plan, concurrency)
+
+    async def run_async(self, path: str, plan: list[tuple[str, str]], concurrency: int):
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+        samples = []
+
+        async def login(scenario: str, payload: str):
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post(path, data=payload, content_type="application/json")
+                await sync_to_async(close_old_connections)()
+                samples.append((scenario, (time.perf_counter() - start) * 1000, response.status_code))
+
+        await asyncio.gather(*(login(scenario, payload) for scenario, payload in plan))
+        return samples
+
+    def run_remote(self, url: str, plan: list[tuple[str, str]], concurrency: int):
+        # The API enforces CSRF: send the same secret as cookie and header.
+        csrf_secret = get_random_string(CSRF_SECRET_LENGTH, allowed_chars=CSRF_ALLOWED_CHARS)
+        headers = {
+            "Content-Type": "application/json",
+            "Cookie": f"{settings.CSRF_COOKIE_NAME}={csrf_secret}",
+            "X-CSRFToken": csrf_secret,
+        }
+
+        def worker(share: list[tuple[str, str]]):
+            samples = []
+            for scenario, payload in share:
+                request = urllib.request.Request(url, data=payload.encode(), headers=headers, method="POST")
+                start = time.perf_counter()
+                try:
+                    with urllib.request.urlopen(request, timeout=30) as response:
+                        response.read()
+                        status = response.status
+                except urllib.error.HTTPError as err:
+                    status = err.code
+                samples.append((scenario, (time.perf_counter() - start) * 1000, status))
+            return samples
+
+        return self.run_threads(worker, plan, concurrency)
+
+    def run_threads(self, worker, plan: list[tuple[str, str]], concurrency: int):
+        shares = [plan[i::concurrency] for i in range(concurrency)]
+        samples = []
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for worker_samples in executor.map(worker, [share for share in shares if share]):
+                samples += worker_samples
+        return samples
+
+    def query_totals(self, path: str, options) -> Optional[tuple[float, float]]:
+        """Sum and count of ``db_queries_per_request`` for the route, from the metrics endpoint."""
+        if options["url"]:
+            request = urllib.request.Request(options["url"].rstrip("/") + reverse("api-1.0:metrics"))
+            if options["metrics_token"]:
+                request.add_header("Authorization", f"Bearer {options['metrics_token']}")
+            try:
+                with urllib.request.urlopen(request, timeout=30) as response:
+                    text = response.read().decode()
+            except (urllib.error.URLError, OSError):
+                return None
+        else:
+            text = metrics_response().content.decode()
+
+        totals = {}
+        for family in text_string_to_metric_families(text):
+            for sample in family.samples:
+                if sample.labels.get("route") == path.lstrip("/") and sample.name.startswith("db_queries_per_request_"):
+                    totals[sample.name.rsplit("_", 1)[-1]] = sample.value
+        if "sum" not in totals or "count" not in totals:
+            return None
+        return totals["sum"], totals["count"]
+
+    def summarize(self, samples, elapsed: float, queries_before, queries_after) -> dict:
+        queries = None
+        if queries_after is not None:
+            before_sum, before_count = queries_before or (0.0, 0.0)
+            requests = queries_after[1] - before_count
+            if requests:
+                queries = round((queries_after[0] - before_sum) / requests, 2)
+
+        scenarios = {}
+        for name in SCENARIOS:
+            timings = [ms for scenario, ms, _ in samples if scenario == name]
+            if timings:
+                scenarios[name] = {
+                    "requests": len(timings),
+                    "latency_ms": percentiles(timings),
+                    "statuses": dict(Counter(status for scenario, _, status in samples if scenario == name)),
+                }
+
+        return {
+            "requests": len(samples),
+            "elapsed_s": round(elapsed, 3),
+            "throughput_rps": round(len(samples) / elapsed, 1) if elapsed else 0.0,
+            "latency_ms": percentiles([ms for _, ms, _ in samples]),
+            "queries_per_request": queries,
+            "statuses": dict(Counter(status for _, _, status in samples)),
+            "scenarios": scenarios,
+        }
+
+    def write_table(self, results: dict) -> None:
+        self.stdout.write(
+            f"target={results['target']} concurrency={results['concurrency']} "
+            f"mix={','.join(f'{name}={weight}' for name, weight in results['mix'].items())}"
+        )
+        row = "{:<6} {:<15} {:>8} {:>9} {:>9} {:>9} {:>9} {:>9}  {}"
+        self.stdout.write(
+            row.format("route", "scenario", "requests", "req/s", "p50 ms", "p95 ms", "p99 ms", "queries", "statuses")
+        )
+        for route, summary in results["routes"].items():
+            latency = summary["latency_ms"]
+            queries = summary["queries_per_request"]
+            self.stdout.write(
+                row.format(
+                    route,
+                    "all",
+                    summary["requests"],
+                    summary["throughput_rps"],
+                    latency["p50"],
+                    latency["p95"],
+                    latency["p99"],
+                    "-" if queries is None else queries,
+                    summary["statuses"],
+                )
+            )
+            for name, scenario in summary["scenarios"].items():
+                latency = scenario["latency_ms"]
+                self.stdout.write(
+                    row.format(
+                        "",
+                        name,
+                        scenario["requests"],
+                        "",
+                        latency["p50"],
+                        latency["p95"],
+                        latency["p99"],
+                        "",
+                        scenario["statuses"],
+                    )
+                )
+
+    def write_pool_comparison(self, results: dict) -> None:
+        pooled, unpooled = results["pooled"], results["unpooled"]
+        self.stdout.write(
+            f"concurrency={pooled['concurrency']} requests={pooled['requests']} "
+            f"mix={','.join(f'{name}={weight}' for name, weight in pooled['mix'].items())}"
+        )
+        row = "{:<6} {:<9} {:>9} {:>9} {:>9} {:>9}"
+        self.stdout.write(row.format("route", "mode", "req/s", "p50 ms", "p95 ms", "p99 ms"))
+        for route in pooled["routes"]:
+            for mode, summary in (("pooled", pooled["routes"][route]), ("unpooled", unpooled["routes"][route])):
+                latency = summary["latency_ms"]
+                self.stdout.write(
+                    row.format(
+                        route if mode == "pooled" else "",
+                        mode,
+                        summary["throughput_rps"],
+                        latency["p50"],
+                        latency["p95"],
+                        latency["p99"],
+                    )
+                )
@@ -0,0 +1,61 @@
+import json
+import re
+import timeit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from app.accounts.middleware import SUSPICIOUS_PATTERN, SUSPICIOUS_PATTERNS, RequestValidationMiddleware
+
+
+def per_pattern_search(value: str) -> bool:
+    """The previous matcher: one re.search per pattern and value."""
+    return any(re.search(f"(?i){pattern}", value) for pattern in SUSPICIOUS_PATTERNS)
+
+
+class Command(BaseCommand):
+    help = "Micro-benchmark RequestValidationMiddleware on query string, form and JSON requests."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fields", type=int, default=20, help="Fields per request.")
+        parser.add_argument("--value-length", type=int, default=64, help="Characters per field value.")
+        parser.add_argument("--iterations", type=int, default=2000, help="Requests timed per case.")
+
+    def handle(self, *args, **options):
+        fields, iterations = options["fields"], options["iterations"]
+        values = {
+            f"field_{i}": ("stock quote " * options["value_length"])[: options["value_length"]] for i in range(fields)
+        }
+        factory = RequestFactory()
+        middleware = RequestValidationMiddleware(lambda request: HttpResponse())
+
+        cases = {
+            "query": lambda: factory.get("/api/v1/stocks", values),
+            "form": lambda: factory.post("/api/v1/stocks", values),
+            "json": lambda: factory.post(
+                "/api/v1/stocks",
+                json.dumps({"items": [values], "login_id": "user@example.com"}),
+                content_type="application/json",
+            ),
+        }
+
+        for name, build in cases.items():
+            if middleware(build()).status_code != 200:
+                raise CommandError(f"The {name} request was rejected, the benchmark would not scan it.")
+            requests = [build() for _ in range(iterations)]
+            seconds = timeit.timeit(lambda: middleware(requests.pop()), number=iterations)
+            self.stdout.write(f"[{name}] fields={fields} {seconds / iterations * 1e6:.1f}us/request")
+
+        # Matcher cost per value, independent of request parsing.
+        sample = list(values.values())
+        combined = timeit.timeit(
+            lambda: [SUSPICIOUS_PATTERN.search(v) for v in sample],
+            number=iterations,
+        )
+        legacy = timeit.timeit(lambda: [per_pattern_search(v) for v in sample], number=iterations)
+        per_value = iterations * len(sample)
+        self.stdout.write(
+            f"[matcher] combined={combined / per_value * 1e6:.2f}us/value "
+            f"per-pattern={legacy / per_value * 1e6:.2f}us/value"
+        )
@@ -0,0 +1,91 @@
+import os
+import re
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, check_password, make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+BASE_ITERATIONS = 100_000
+ROUND_TO = 10_000
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure PBKDF2 on this machine and recommend PASSWORD_HASH_ITERATIONS for a target "
+        "check_password latency. With --apply the value is written to the env file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--target-ms", type=float, default=250.0, help="Wanted check_password latency.")
+        parser.add_argument("--samples", type=int, default=5, help="Hashes measured per step.")
+        parser.add_argument("--apply", action="store_true", help="Write PASSWORD_HASH_ITERATIONS to --env-file.")
+        parser.add_argument("--env-file", default=settings.BASE_DIR / ".env")
+
+    def measure(self, iterations: int, samples: int) -> float:
+        """Median check_password time in ms for a hash with ``iterations``."""
+        hasher = PBKDF2PasswordHasher()
+        encoded = hasher.encode("calibration-password", hasher.salt(), iterations)
+        timings = []
+        for _ in range(samples):
+            start = time.perf_counter()
+            check_password("calibration-password", encoded, preferred="pbkdf2_sha256")
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
+
+    def handle(self, *args, **options):
+        target_ms, samples = options["target_ms"], options["samples"]
+        if target_ms <= 0 or samples <= 0:
+            raise CommandError("--target-ms and --samples must be positive.")
+
+        # PBKDF2 cost is linear in the iteration count.
+        base_ms = self.measure(BASE_ITERATIONS, samples)
+        iterations = max(ROUND_TO, round(BASE_ITERATIONS * target_ms / base_ms / ROUND_TO) * ROUND_TO)
+        measured_ms = self.measure(iterations, samples)
+
+        self.stdout.write(f"{BASE_ITERATIONS} iterations: {base_ms:.1f}ms")
+        self.stdout.write(
+            f"Recommended PASSWORD_HASH_ITERATIONS={iterations}: {measured_ms:.1f}ms, "
+            f"~{1000 / measured_ms:.1f} logins/s per core"
+        )
+        if iterations < PBKDF2PasswordHasher.iterations:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Below Django's default of {PBKDF2PasswordHasher.iterations} iterations; "
+                    "prefer adding hashing capacity over lowering the cost."
+                )
+            )
+
+        current = settings.PASSWORD_HASH_ITERATIONS or PBKDF2PasswordHasher.iterations
+        self.stdout.write(f"Current: {current} iterations (~{self.measure(current, 1):.1f}ms)")
+
+        # Sanity check that the new setting round-trips through the hasher.
+        with override_settings(PASSWORD_HASH_ITERATIONS=iterations):
+            if not check_password("calibration-password", make_password("calibration-password")):
+                raise CommandError("Calibrated hasher failed to verify its own hash.")
+
+        if options["apply"]:
+            self.write_env(options["env_file"], iterations)
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Wrote PASSWORD_HASH_ITERATIONS={iterations} to {options['env_file']}. "
+                    "Existing hashes are upgraded as users log in."
+                )
+            )
+
+    def write_env(self, path: str, iterations: int) -> None:
+        line = f"PASSWORD_HASH_ITERATIONS={iterations}\n"
+        content = ""
+        if os.path.exists(path):
+            with open(path) as env_file:
+                content = env_file.read()
+
+        if re.search(r"^PASSWORD_HASH_ITERATIONS=.*$", content, flags=re.MULTILINE):
+            content = re.sub(r"^PASSWORD_HASH_ITERATIONS=.*\n?", line, content, flags=re.MULTILINE)
+        else:
+            content += ("" if not content or content.endswith("\n") else "\n") + line
+
+        with open(path, "w") as env_file:
+            env_file.write(content)
@@ -0,0 +1,104 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+
+from app.accounts.backends import EmailOrUsernameModelBackend
+from app.accounts.models import canonical_login_key
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the login user lookup: prints the query plan and latency of the "
+        "legacy iexact filter and of the canonical lookup keys."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="Make sure at least this many benchmark users exist (e.g. 1000000).",
+        )
+        parser.add_argument("--iterations", type=int, default=1000, help="Lookups timed per strategy.")
+        parser.add_argument("--batch-size", type=int, default=5000, help="bulk_create batch size when seeding.")
+
+    def handle(self, *args, **options):
+        if options["seed"]:
+            self.seed_users(options["seed"], options["batch_size"])
+
+        total = User.objects.count()
+        sample = list(User.objects.order_by("?").values_list("username", flat=True)[: min(total, 500)])
+        if not sample:
+            self.stderr.write("No users to look up, use --seed.")
+            return
+
+        self.stdout.write(f"Users: {total} | backend: {connection.vendor}\n")
+
+        backend = EmailOrUsernameModelBackend()
+        strategies = {
+            "iexact": lambda login_id: User.objects.filter(
+                Q(email__iexact=login_id) | Q(username__iexact=login_id)
+            ).first(),
+            "lookup_key": backend.resolve_user,
+        }
+        plans = {
+            "iexact": lambda login_id: User.objects.filter(Q(email__iexact=login_id) | Q(username__iexact=login_id)),
+            "lookup_key": lambda login_id: User.objects.filter(
+                Q(email_key=canonical_login_key(login_id)) | Q(username_key=canonical_login_key(login_id))
+            ),
+        }
+
+        for name, lookup in strategies.items():
+            login_id = random.choice(sample).upper()
+            explain_options = {"analyze": True} if connection.vendor == "postgresql" else {}
+            self.stdout.write(self.style.MIGRATE_HEADING(f"[{name}] query plan"))
+            self.stdout.write(plans[name](login_id)[:1].explain(**explain_options))
+
+            timings = []
+            for _ in range(options["iterations"]):
+                login_id = random.choice(sample)
+                start = time.perf_counter()
+                lookup(login_id)
+                timings.append((time.perf_counter() - start) * 1000)
+
+            timings.sort()
+            self.stdout.write(
+                f"[{name}] mean={statistics.fmean(timings):.3f}ms "
+                f"p50={timings[len(timings) // 2]:.3f}ms "
+                f"p95={timings[int(len(timings) * 0.95) - 1]:.3f}ms\n"
+            )
+
+    def seed_users(self, count: int, batch_size: int) -> None:
+        existing = User.objects.filter(username__startswith="bench_user_").count()
+        if existing >= count:
+            return
+
+        password = make_password(None)
+        self.stdout.write(f"Seeding {count - existing} benchmark users...")
+        for start in range(existing, count, batch_size):
+            users = []
+            for i in range(start, min(start + batch_size, count)):
+                username = f"bench_user_{i}"
+                email = f"{username}@bench.example.com"
+                users.append(
+                    User(
+                        username=username,
+                        email=email,
+                        username_key=canonical_login_key(username),
+                        email_key=canonical_login_key(email),
+                        password=password,
+                    )
+                )
+            User.objects.bulk_create(users, ignore_conflicts=True)
+
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute(f"ANALYZE {User._meta.db_table}")
@@ -0,0 +1,25 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from app.db import unapplied_migrations
+
+
+class Command(BaseCommand):
+    help = "Run migrate only when the database lacks some migration on disk (container start)."
+
+    # migrate runs the system checks itself when it is needed.
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS, help="Database to check and migrate.")
+
+    def handle(self, *args, **options):
+        database = options["database"]
+        pending = unapplied_migrations(database)
+        if not pending:
+            self.stdout.write("No unapplied migrations, migrate skipped.")
+            return
+
+        self.stdout.write(f"{len(pending)} unapplied migrations, e.g. {'.'.join(pending[0])}: running migrate.")
+        call_command("migrate", database=database, interactive=False, verbosity=options["verbosity"])
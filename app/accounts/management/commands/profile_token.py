@@ -0,0 +1,13 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from app.profiling import PROFILE_HEADER, make_profile_token
+
+
+class Command(BaseCommand):
+    help = "Print a signed header value that makes RequestProfilingMiddleware profile a request."
+
+    def handle(self, *args, **options):
+        max_age = settings.REQUEST_PROFILING.get("TOKEN_MAX_AGE", 3600)
+        self.stderr.write(f"Valid for {max_age} seconds; send it as:")
+        self.stdout.write(f"{PROFILE_HEADER}: {make_profile_token()}")
@@ -0,0 +1,39 @@
+import json
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+
+from app.slow_queries import get_slow_query_recorder
+
+
+class Command(BaseCommand):
+    help = "Show the most recent slow queries kept in the ring buffer of the slow query log."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=20, help="Records to show, newest first.")
+        parser.add_argument("--json", action="store_true", help="Print the records as JSON.")
+        parser.add_argument("--clear", action="store_true", help="Empty the buffer after printing.")
+
+    def handle(self, *args, **options):
+        recorder = get_slow_query_recorder()
+        records = recorder.recent(options["limit"])
+
+        if options["json"]:
+            self.stdout.write(json.dumps(records, indent=2))
+        else:
+            self.write_records(records)
+
+        if options["clear"]:
+            recorder.clear()
+
+    def write_records(self, records: list[dict]) -> None:
+        if not records:
+            self.stdout.write("No slow queries recorded.")
+        for record in records:
+            self.stdout.write(
+                f"#{record['id']} {datetime.fromtimestamp(record['time']).isoformat(timespec='seconds')} "
+                f"{record['duration_ms']:.1f}ms view={record['view']} db={record['alias']} params={record['params']}"
+            )
+            self.stdout.write(f"  {record['sql']}")
+            if record["plan"]:
+                self.stdout.write("  " + record["plan"].replace("\n", "\n  "))
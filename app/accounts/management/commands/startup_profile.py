@@ -0,0 +1,70 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from app.startup import ImportTiming, profile_startup
+
+
+class Command(BaseCommand):
+    help = "Report the import time of each module loaded on a cold start and enforce the startup budget."
+
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        config = settings.STARTUP_PROFILE
+        parser.add_argument("--module", default=config.get("MODULE", "app.wsgi"), help="Module whose start to profile.")
+        parser.add_argument("--limit", type=int, default=20, help="Modules to list, slowest first.")
+        parser.add_argument(
+            "--sort", choices=("self", "cumulative"), default="cumulative", help="Order of the listed modules."
+        )
+        parser.add_argument("--budget-ms", type=float, default=config.get("BUDGET_MS", 0.0))
+        parser.add_argument("--module-budget-ms", type=float, default=config.get("MODULE_BUDGET_MS", 0.0))
+        parser.add_argument("--json", action="store_true", help="Print the timings as JSON.")
+
+    def handle(self, *args, **options):
+        module = options["module"]
+        try:
+            startup_ms, timings = profile_startup(module)
+        except RuntimeError as err:
+            raise CommandError(f"Starting {module} failed:\n{err}") from err
+
+        ranked = sorted(timings, key=lambda timing: getattr(timing, f"{options['sort']}_ms"), reverse=True)
+        if options["json"]:
+            self.stdout.write(
+                json.dumps(
+                    {"module": module, "startup_ms": startup_ms, "imports": [t._asdict() for t in ranked]}, indent=2
+                )
+            )
+        else:
+            self.write_timings(module, startup_ms, len(timings), ranked[: options["limit"]])
+
+        violations = self.check_budgets(module, startup_ms, timings, options["budget_ms"], options["module_budget_ms"])
+        if violations:
+            raise CommandError("Startup budget exceeded:\n" + "\n".join(violations))
+
+    def write_timings(self, module: str, startup_ms: float, count: int, timings: list[ImportTiming]) -> None:
+        self.stdout.write(f"{'self ms':>9} {'cum. ms':>9}  module")
+        for timing in timings:
+            self.stdout.write(f"{timing.self_ms:9.1f} {timing.cumulative_ms:9.1f}  {timing.module}")
+        self.stdout.write(f"{module} started in {startup_ms:.1f}ms, importing {count} modules.")
+
+    def check_budgets(
+        self, module: str, startup_ms: float, timings: list[ImportTiming], budget_ms: float, module_budget_ms: float
+    ) -> list[str]:
+        violations = []
+        if budget_ms and startup_ms > budget_ms:
+            violations.append(f"{module} started in {startup_ms:.1f}ms, over the {budget_ms:.0f}ms budget.")
+
+        # Only the project's own modules are held to the module budget; the
+        # profiled module itself stands for the whole start.
+        package = module.partition(".")[0]
+        for timing in timings:
+            if timing.module == module or timing.module.partition(".")[0] != package:
+                continue
+            if module_budget_ms and timing.cumulative_ms > module_budget_ms:
+                violations.append(
+                    f"{timing.module} took {timing.cumulative_ms:.1f}ms to import, "
+                    f"over the {module_budget_ms:.0f}ms module budget."
+                )
+        return violations
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0002_rename_failed_login_attemps_user_failed_login_attempts"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="email_key",
+            field=models.CharField(editable=False, max_length=254, null=True),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="username_key",
+            field=models.CharField(editable=False, max_length=150, null=True),
+        ),
+    ]
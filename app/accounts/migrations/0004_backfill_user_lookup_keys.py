@@ -0,0 +1,35 @@
+import unicodedata
+
+from django.db import migrations
+
+BATCH_SIZE = 2000
+
+
+def canonical_login_key(value):
+    # Frozen copy of app.accounts.models.canonical_login_key.
+    return unicodedata.normalize("NFKC", value).casefold()
+
+
+def backfill_lookup_keys(apps, schema_editor):
+    User = apps.get_model("accounts", "User")
+    batch = []
+    for user in User.objects.only("id", "email", "username").iterator(chunk_size=BATCH_SIZE):
+        user.email_key = canonical_login_key(user.email or "")
+        user.username_key = canonical_login_key(user.username or "")
+        batch.append(user)
+        if len(batch) >= BATCH_SIZE:
+            User.objects.bulk_update(batch, ["email_key", "username_key"])
+            batch = []
+    if batch:
+        User.objects.bulk_update(batch, ["email_key", "username_key"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0003_user_email_key_user_username_key"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_lookup_keys, migrations.RunPython.noop),
+    ]
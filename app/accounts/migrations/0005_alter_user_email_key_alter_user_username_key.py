@@ -0,0 +1,23 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0004_backfill_user_lookup_keys"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="user",
+            name="email_key",
+            field=models.CharField(editable=False, max_length=254, unique=True),
+        ),
+        migrations.AlterField(
+            model_name="user",
+            name="username_key",
+            field=models.CharField(editable=False, max_length=150, unique=True),
+        ),
+    ]
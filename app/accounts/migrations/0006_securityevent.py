@@ -0,0 +1,48 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:29
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0005_alter_user_email_key_alter_user_username_key"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SecurityEvent",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now, verbose_name="time")),
+                (
+                    "event_type",
+                    models.CharField(
+                        choices=[
+                            ("login_success", "Login success"),
+                            ("login_failure", "Login failure"),
+                            ("account_locked", "Account locked"),
+                        ],
+                        max_length=32,
+                        verbose_name="event",
+                    ),
+                ),
+                ("username", models.CharField(blank=True, max_length=254, verbose_name="username")),
+                ("ip", models.GenericIPAddressField(blank=True, null=True, verbose_name="IP address")),
+                ("user_agent", models.CharField(blank=True, max_length=512, verbose_name="user agent")),
+                ("details", models.JSONField(blank=True, default=dict, verbose_name="details")),
+            ],
+            options={
+                "verbose_name": "security event",
+                "verbose_name_plural": "security events",
+                "db_table": "stock_security_events",
+                "ordering": ["-created_at"],
+                "indexes": [
+                    models.Index(fields=["created_at"], name="security_event_time_idx"),
+                    models.Index(fields=["username", "created_at"], name="security_event_user_idx"),
+                    models.Index(fields=["ip", "created_at"], name="security_event_ip_idx"),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0006_securityevent"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="user",
+            name="username_key",
+            field=models.CharField(editable=False, max_length=450, unique=True),
+        ),
+    ]
@@ -1,11 +1,77 @@
+import unicodedata
 import uuid
+from datetime import timedelta
+from typing import Optional
 
 from django.contrib.auth.models import AbstractUser
+from django.core.exceptions import ValidationError
 from django.core.validators import validate_email
-from django.db import models
+from django.db import connections, models, router
+from django.db.models import Case, F, Value, When
+from django.db.models.sql import UpdateQuery
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 
+def canonical_login_key(value: str) -> str:
+    """
+    Canonical form of an email or username used for indexed lookups:
+    Unicode NFKC normalized and casefolded.
+    """
+    return unicodedata.normalize("NFKC", value).casefold()
+
+
+# Failed attempts allowed before each further failure locks the account. The
+# lock grows by LOCK_STEP_MINUTES per failure, capped at MAX_LOCK_MINUTES.
+LOCKOUT_THRESHOLD = 5
+LOCK_STEP_MINUTES = 5
+MAX_LOCK_MINUTES = 30
+
+
+def lock_minutes_for(failed_login_attempts: int) -> int:
+    """Lock duration applied to a failure seen after ``failed_login_attempts``."""
+    return min(MAX_LOCK_MINUTES, LOCK_STEP_MINUTES * (failed_login_attempts - LOCKOUT_THRESHOLD + 1))
+
+
+def update_returning(queryset: models.QuerySet, values: dict, returning: list[str]) -> Optional[dict]:
+    """
+    Run ``queryset.update(**values)`` as a single ``UPDATE ... RETURNING`` and
+    return the new values of the ``returning`` fields for the first updated
+    row, or None when nothing matched.
+
+    Backends without RETURNING support fall back to an UPDATE followed by a
+    SELECT, which is not atomic.
+    """
+    # queryset.db goes through db_for_read until the queryset is marked for
+    # writing, which update() does itself: route it as a write up front.
+    queryset = queryset.using(queryset._db or router.db_for_write(queryset.model, **queryset._hints))
+    connection = connections[queryset.db]
+    if not connection.features.can_return_columns_from_insert:
+        if not queryset.update(**values):
+            return None
+        return queryset.values(*returning).first()
+
+    opts = queryset.model._meta
+    query = queryset.query.chain(UpdateQuery)
+    query.add_update_values(values)
+    compiler = query.get_compiler(queryset.db)
+    sql, params = compiler.as_sql()
+
+    columns = [opts.get_field(name).get_col(opts.db_table) for name in returning]
+    sql += " RETURNING " + ", ".join(connection.ops.quote_name(col.target.column) for col in columns)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+    if row is None:
+        return None
+
+    converters = compiler.get_converters(columns)
+    if converters:
+        row = next(compiler.apply_converters([row], converters))
+    return dict(zip(returning, row))
+
+
 class User(AbstractUser):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     bio = models.TextField(blank=True)
@@ -19,6 +85,13 @@ class User(AbstractUser):
     last_failed_login = models.DateTimeField(null=True, blank=True)
     account_locked_until = models.DateTimeField(null=True, blank=True)
     password_changed_at = models.DateTimeField(auto_now_add=True)
+    # Canonical lookup keys maintained in save(). Login resolves accounts
+    # through these unique indexes instead of UPPER(col) = UPPER(%s) scans.
+    # Normalizing can lengthen a username ("ß" casefolds to "ss", "ﬃ" becomes
+    # "ffi"): its key has room for three times the length, and clean() rejects
+    # the rare names that grow further.
+    email_key = models.CharField(max_length=254, unique=True, editable=False)
+    username_key = models.CharField(max_length=450, unique=True, editable=False)
 
     class Meta:
         db_table = "stock_users"
@@ -29,7 +102,126 @@ class User(AbstractUser):
     def __str__(self) -> str:
         return f"{self.username}"
 
+    def clean(self) -> None:
+        super().clean()
+        if len(canonical_login_key(self.username or "")) > self._meta.get_field("username_key").max_length:
+            raise ValidationError({"username": _("This username is too long once normalized.")})
+
     def save(self, *args, **kwargs) -> None:
         if self.email:
             self.email = self.email.lower()
+        self.email_key = canonical_login_key(self.email or "")
+        self.username_key = canonical_login_key(self.username or "")
+
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if "email" in update_fields:
+                update_fields.add("email_key")
+            if "username" in update_fields:
+                update_fields.add("username_key")
+            kwargs["update_fields"] = update_fields
         super().save(*args, **kwargs)
+
+    def _successful_login_fields(self) -> list[str]:
+        self.last_login = timezone.now()
+        update_fields = ["last_login"]
+        if self.failed_login_attempts > 0 or self.last_failed_login or self.account_locked_until:
+            self.failed_login_attempts = 0
+            self.last_failed_login = None
+            self.account_locked_until = None
+            update_fields += [
+                "failed_login_attempts",
+                "last_failed_login",
+                "account_locked_until",
+            ]
+        return update_fields
+
+    def record_successful_login(self) -> None:
+        """
+        Stamp ``last_login`` and clear the failed-login state with a single
+        UPDATE, touching the counter columns only when they need resetting.
+        """
+        self.save(update_fields=self._successful_login_fields())
+
+    async def arecord_successful_login(self) -> None:
+        """See record_successful_login()."""
+        await self.asave(update_fields=self._successful_login_fields())
+
+    def record_failed_login(self) -> Optional[int]:
+        """
+        Count a failed login with a single ``UPDATE ... RETURNING``.
+
+        The increment, the lock window and the lock decision are computed by the
+        database from the row's current values, so concurrent failures on the
+        same account are never lost. The instance is refreshed with the stored
+        values. Returns the lock duration in minutes when this failure locked
+        the account, None otherwise.
+        """
+        now = timezone.now()
+        # The lock is decided on the count before this failure, as the
+        # right-hand side of SET sees the row's previous values.
+        capped_from = LOCKOUT_THRESHOLD + MAX_LOCK_MINUTES // LOCK_STEP_MINUTES - 1
+        lock_tiers = [
+            When(failed_login_attempts=attempts, then=Value(now + timedelta(minutes=lock_minutes_for(attempts))))
+            for attempts in range(LOCKOUT_THRESHOLD, capped_from)
+        ]
+        lock_tiers.append(
+            When(failed_login_attempts__gte=capped_from, then=Value(now + timedelta(minutes=MAX_LOCK_MINUTES)))
+        )
+
+        fields = ["failed_login_attempts", "last_failed_login", "account_locked_until"]
+        values = update_returning(
+            type(self)._default_manager.filter(pk=self.pk),
+            {
+                "failed_login_attempts": F("failed_login_attempts") + 1,
+                "last_failed_login": now,
+                "account_locked_until": Case(*lock_tiers, default=F("account_locked_until")),
+            },
+            fields,
+        )
+        if values is None:
+            return None
+        # Imported here: models are loaded by every manage.py command.
+        from app.accounts.user_cache import invalidate_cached_user
+
+        invalidate_cached_user(self.pk)
+
+        for name in fields:
+            setattr(self, name, values[name])
+
+        previous_attempts = self.failed_login_attempts - 1
+        if previous_attempts >= LOCKOUT_THRESHOLD:
+            return lock_minutes_for(previous_attempts)
+        return None
+
+
+class SecurityEvent(models.Model):
+    """Audit record of a login success, failure or lockout."""
+
+    class EventType(models.TextChoices):
+        LOGIN_SUCCESS = "login_success", _("Login success")
+        LOGIN_FAILURE = "login_failure", _("Login failure")
+        ACCOUNT_LOCKED = "account_locked", _("Account locked")
+
+    # Set when the event happens, not when the buffered row is inserted.
+    created_at = models.DateTimeField(_("time"), default=timezone.now)
+    event_type = models.CharField(_("event"), max_length=32, choices=EventType.choices)
+    username = models.CharField(_("username"), max_length=254, blank=True)
+    ip = models.GenericIPAddressField(_("IP address"), null=True, blank=True)
+    user_agent = models.CharField(_("user agent"), max_length=512, blank=True)
+    details = models.JSONField(_("details"), default=dict, blank=True)
+
+    class Meta:
+        db_table = "stock_security_events"
+        verbose_name = _("security event")
+        verbose_name_plural = _("security events")
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["created_at"], name="security_event_time_idx"),
+            models.Index(fields=["username", "created_at"], name="security_event_user_idx"),
+            models.Index(fields=["ip", "created_at"], name="security_event_ip_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.event_type} {self.username} {self.created_at:%Y-%m-%d %H:%M:%S}"
@@ -0,0 +1,185 @@
+import hashlib
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from app.logs import get_event_logger
+
+security_logger = get_event_logger("security")
+
+
+class RateLimitResult(NamedTuple):
+    allowed: bool
+    scope: Optional[str] = None
+    retry_after: int = 0
+
+
+class SlidingWindowRateLimiter(ABC):
+    """
+    Sliding window counter limiter.
+
+    Each scope (e.g. "account" or "ip") has a ``(limit, window_seconds)`` rate.
+    Hits are counted in fixed windows and the estimate weights the previous
+    window by how much of it still overlaps the sliding window. Subclasses
+    provide the storage through ``_increment``.
+    """
+
+    key_prefix = "login_rl"
+
+    def __init__(self, rates: dict[str, tuple[int, int]], **options) -> None:
+        self.rates = rates
+
+    def _key(self, scope: str, identifier: str, window_index: int) -> str:
+        digest = hashlib.blake2b(identifier.encode(), digest_size=16).hexdigest()
+        return f"{self.key_prefix}:{scope}:{digest}:{window_index}"
+
+    @abstractmethod
+    def _increment(self, entries: list[tuple[str, str, int]]) -> list[tuple[int, int]]:
+        """
+        Atomically increment each current window key, setting its TTL, and read
+        the previous window key. ``entries`` holds ``(current_key, previous_key,
+        ttl)`` tuples; returns ``(current_count, previous_count)`` for each.
+        """
+
+    async def _aincrement(self, entries: list[tuple[str, str, int]]) -> list[tuple[int, int]]:
+        """See _increment(). By default runs it in a worker thread."""
+        return await sync_to_async(self._increment, thread_sensitive=False)(entries)
+
+    def _window_entries(self, now: float, identifiers: dict[str, str]) -> tuple[list[str], list[tuple[str, str, int]]]:
+        scopes = [scope for scope in identifiers if scope in self.rates and identifiers[scope]]
+        entries = []
+        for scope in scopes:
+            _, window = self.rates[scope]
+            index = int(now // window)
+            entries.append(
+                (
+                    self._key(scope, identifiers[scope], index),
+                    self._key(scope, identifiers[scope], index - 1),
+                    window * 2,
+                )
+            )
+        return scopes, entries
+
+    def _evaluate(self, now: float, scopes: list[str], counts: list[tuple[int, int]]) -> RateLimitResult:
+        for scope, (current, previous) in zip(scopes, counts):
+            limit, window = self.rates[scope]
+            elapsed = now % window
+            estimate = previous * (1 - elapsed / window) + current
+            if estimate > limit:
+                return RateLimitResult(allowed=False, scope=scope, retry_after=math.ceil(window - elapsed))
+
+        return RateLimitResult(allowed=True)
+
+    def hit(self, **identifiers: str) -> RateLimitResult:
+        """Count one attempt for every scope identifier and check the limits."""
+        now = time.time()
+        scopes, entries = self._window_entries(now, identifiers)
+        try:
+            counts = self._increment(entries)
+        except Exception as err:
+            # Fail open: the account lockout still protects the accounts.
+            security_logger.error("Login rate limiter unavailable: %s", err, event="rate_limiter_unavailable")
+            return RateLimitResult(allowed=True)
+
+        return self._evaluate(now, scopes, counts)
+
+    async def ahit(self, **identifiers: str) -> RateLimitResult:
+        """See hit()."""
+        now = time.time()
+        scopes, entries = self._window_entries(now, identifiers)
+        try:
+            counts = await self._aincrement(entries)
+        except Exception as err:
+            security_logger.error("Login rate limiter unavailable: %s", err, event="rate_limiter_unavailable")
+            return RateLimitResult(allowed=True)
+
+        return self._evaluate(now, scopes, counts)
+
+
+class RedisSlidingWindowRateLimiter(SlidingWindowRateLimiter):
+    """Limiter shared by every worker, backed by Redis INCR/EXPIRE in one MULTI."""
+
+    def __init__(self, rates: dict[str, tuple[int, int]], url: str, **options) -> None:
+        import redis
+        import redis.asyncio
+
+        super().__init__(rates)
+        self.client = redis.Redis.from_url(url, **options)
+        self.async_client = redis.asyncio.Redis.from_url(url, **options)
+
+    def _queue_commands(self, pipe, entries: list[tuple[str, str, int]]) -> None:
+        for current_key, previous_key, ttl in entries:
+            pipe.incr(current_key)
+            pipe.expire(current_key, ttl)
+            pipe.get(previous_key)
+
+    def _counts(self, results: list) -> list[tuple[int, int]]:
+        return [(int(results[i]), int(results[i + 2] or 0)) for i in range(0, len(results), 3)]
+
+    def _increment(self, entries: list[tuple[str, str, int]]) -> list[tuple[int, int]]:
+        with self.client.pipeline(transaction=True) as pipe:
+            self._queue_commands(pipe, entries)
+            return self._counts(pipe.execute())
+
+    async def _aincrement(self, entries: list[tuple[str, str, int]]) -> list[tuple[int, int]]:
+        async with self.async_client.pipeline(transaction=True) as pipe:
+            self._queue_commands(pipe, entries)
+            return self._counts(await pipe.execute())
+
+
+class InMemorySlidingWindowRateLimiter(SlidingWindowRateLimiter):
+    """Per-process limiter for tests and single-process development servers."""
+
+    def __init__(self, rates: dict[str, tuple[int, int]], **options) -> None:
+        super().__init__(rates)
+        self._counters: dict[str, tuple[int, float]] = {}
+        self._lock = threading.Lock()
+
+    def _increment(self, entries: list[tuple[str, str, int]]) -> list[tuple[int, int]]:
+        now = time.monotonic()
+        counts = []
+        with self._lock:
+            for current_key, previous_key, ttl in entries:
+                current, expires_at = self._counters.get(current_key, (0, now + ttl))
+                if expires_at <= now:
+                    current, expires_at = 0, now + ttl
+                self._counters[current_key] = (current + 1, expires_at)
+
+                previous, previous_expires_at = self._counters.get(previous_key, (0, now))
+                counts.append((current + 1, previous if previous_expires_at > now else 0))
+
+            if len(self._counters) > 10_000:
+                self._counters = {key: value for key, value in self._counters.items() if value[1] > now}
+
+        return counts
+
+    async def _aincrement(self, entries: list[tuple[str, str, int]]) -> list[tuple[int, int]]:
+        # Only takes a short in-process lock, no need for a worker thread.
+        return self._increment(entries)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._counters.clear()
+
+
+@lru_cache(maxsize=None)
+def get_login_rate_limiter() -> SlidingWindowRateLimiter:
+    """Return the limiter configured in ``settings.LOGIN_RATE_LIMIT``."""
+    config = settings.LOGIN_RATE_LIMIT
+    limiter_class = import_string(config["BACKEND"])
+    return limiter_class(config["RATES"], **config.get("OPTIONS", {}))
+
+
+@receiver(setting_changed)
+def reset_login_rate_limiter(setting: str, **kwargs) -> None:
+    if setting == "LOGIN_RATE_LIMIT":
+        get_login_rate_limiter.cache_clear()
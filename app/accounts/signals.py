@@ -1,15 +1,21 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.signals import user_logged_in, user_login_failed
-from django.db import transaction
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.http import HttpRequest
-from django.utils import timezone
 
+from app.accounts.middleware import get_client_ip
+from app.accounts.models import SecurityEvent
 from app.accounts.models import User as UserModel
-from app.logs import get_logger
+from app.logs import get_event_logger
+
+# The audit buffer, caches, login id filter, metrics and sessions are imported
+# by the handlers using them: this module is loaded by AccountsConfig.ready on
+# every start, including manage.py commands that never log anyone in.
 
 User = get_user_model()
-security_logger = get_logger("security")
+security_logger = get_event_logger("security")
 
 
 @receiver(user_logged_in)
@@ -19,33 +25,41 @@ def user_logged_handler(
     """
     Records successful login and resets fail counters.
 
+    This also takes over the ``last_login`` update so a successful login costs
+    a single UPDATE on the user row.
+
     Args:
         sender: Signal sender
         request: The HTTP request
         user: The user that successfully logged in
         kwargs: Additional arguments
     """
-    with transaction.atomic():
-        if user.failed_login_attempts > 0:
-            user.failed_login_attempts = 0
-            user.last_failed_login = None
-            user.account_locked_until = None
-            user.save(
-                update_fields=[
-                    "failed_login_attempts",
-                    "last_failed_login",
-                    "account_locked_until",
-                ]
-            )
-
-        # IP AND USER_AGENT registration
-        ip = request.META.get("REMOTE_ADDR", "")
-        user_agent = request.META.get("HTTP_USER_AGENT", "")
-
-        security_logger.info(
-            f"Login success: {user.username} | IP: {ip} | User-Agent: {user_agent}",
-            extra={"username": user.username, "ip": ip, "user_agent": user_agent},
-        )
+    # Django's own update_last_login receiver is disconnected in
+    # AccountsConfig.ready, this covers it in the same UPDATE.
+    from app.accounts.audit import get_security_event_buffer
+
+    user.record_successful_login()
+
+    # IP AND USER_AGENT registration
+    ip = get_client_ip(request)
+    user_agent = request.META.get("HTTP_USER_AGENT", "")
+
+    security_logger.info(
+        "Login success: %s | IP: %s | User-Agent: %s",
+        user.username,
+        ip,
+        user_agent,
+        event="login_success",
+        username=user.username,
+        ip=ip,
+        user_agent=user_agent,
+    )
+    get_security_event_buffer().record(
+        SecurityEvent.EventType.LOGIN_SUCCESS,
+        username=user.username,
+        ip=ip,
+        user_agent=user_agent,
+    )
 
 
 @receiver(user_login_failed)
@@ -55,63 +69,104 @@ def user_login_failed_handler(
     """
     Controls login failures to prevent brute force attacks.
 
+    When the failure comes from the login pipeline, ``credentials["user"]``
+    carries the account resolved by ``auth_login`` and no lookup is made.
+
     Args:
         sender: Signal sender
         credentials: Login credentials
         request: The HTTP request
         kwargs: Additional arguments
     """
+    from app.accounts.audit import get_security_event_buffer, record_lockout
+
     username = credentials.get("username", "")
-    ip = request.META.get("REMOTE_ADDR", "") if request else "N/A"
+    ip = get_client_ip(request) if request else "N/A"
     user_agent = request.META.get("HTTP_USER_AGENT", "") if request else "N/A"
 
     security_logger.warning(
-        f"Login failed: {username} | IP: {ip} | User-Agent: {user_agent}",
-        extra={"username": username, "ip": ip, "user_agent": user_agent},
+        "Login failed: %s | IP: %s | User-Agent: %s",
+        username,
+        ip,
+        user_agent,
+        event="login_failure",
+        username=username,
+        ip=ip,
+        user_agent=user_agent,
+    )
+    get_security_event_buffer().record(
+        SecurityEvent.EventType.LOGIN_FAILURE, username=username, ip=ip, user_agent=user_agent
     )
 
     try:
-        with transaction.atomic():
-            user = (
-                User.objects.get(email=username)
-                if "@" in username
-                else User.objects.get(username=username)
-            )
-
-            # Implements temporary blocking after multiple attempts
-            if user.failed_login_attempts >= 5:
-                lock_minutes = min(30, 5 * (user.failed_login_attempts - 4))
-                user.account_locked_until = timezone.now() + timezone.timedelta(
-                    minutes=lock_minutes
-                )
-                security_logger.warning(
-                    f"Account temporarily blocked: {username} for {lock_minutes} minutes",
-                    extra={"username": username, "lock_minutes": lock_minutes},
-                )
-
-            # Increment the counter
-            user.failed_login_attempts += 1
-            user.last_failed_login = timezone.now()
-
-            # Log the number of failed attempts
-            security_logger.info(
-                f"Failed login attempts for {username}: {user.failed_login_attempts}",
-                extra={
-                    "username": username,
-                    "failed_login_attempts": user.failed_login_attempts,
-                },
-            )
-
-            user.save(
-                update_fields=[
-                    "failed_login_attempts",
-                    "last_failed_login",
-                    "account_locked_until",
-                ]
-            )
+        # The login pipeline hands over the account it already resolved.
+        user = credentials.get("user")
+        if user is None:
+            users = User.objects.using(DEFAULT_DB_ALIAS)
+            user = users.get(email=username) if "@" in username else users.get(username=username)
+
+        # Increment the counter and apply the temporary block in one statement
+        lock_minutes = user.record_failed_login()
+
+        if lock_minutes:
+            record_lockout(request, username, lock_minutes)
+
+        # Log the number of failed attempts
+        security_logger.info(
+            "Failed login attempts for %s: %s",
+            username,
+            user.failed_login_attempts,
+            event="failed_login_attempts",
+            username=username,
+            failed_login_attempts=user.failed_login_attempts,
+        )
 
     except User.DoesNotExist:
         security_logger.warning(
-            f"Login attempt with non-existent user: {username}",
-            extra={"username": username, "ip": ip, "user_agent": user_agent},
+            "Login attempt with non-existent user: %s",
+            username,
+            event="login_failure",
+            username=username,
+            ip=ip,
+            user_agent=user_agent,
         )
+
+
+@receiver(post_save, sender=User)
+def user_saved_handler(sender, instance: UserModel, update_fields=None, **kwargs) -> None:
+    """Adds the account's login keys to the login id filter."""
+    from app.accounts.lookup_filter import get_login_id_filter
+
+    if update_fields is not None and not {"email_key", "username_key"} & set(update_fields):
+        return
+
+    get_login_id_filter().add(instance.email_key, instance.username_key)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_cache_handler(sender, instance: UserModel, **kwargs) -> None:
+    """Drops the account from the user cache of every worker."""
+    from app.accounts.user_cache import invalidate_cached_user
+
+    invalidate_cached_user(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def user_password_changed_handler(sender, instance: UserModel, created: bool = False, **kwargs) -> None:
+    """Ends the account's sessions when its password changes."""
+    from app.sessions import invalidate_user_sessions
+
+    # set_password() leaves the raw password in _password until save() returns.
+    if not created and instance._password is not None:
+        invalidate_user_sessions(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted_handler(sender, instance: UserModel, **kwargs) -> None:
+    """Counts the account's login keys as stale in the login id filter and ends its sessions."""
+    from app.accounts.lookup_filter import get_login_id_filter
+    from app.sessions import invalidate_user_sessions
+
+    get_login_id_filter().discard(instance.email_key, instance.username_key)
+    invalidate_user_sessions(instance.pk)
@@ -0,0 +1,154 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.db import DEFAULT_DB_ALIAS, connection, transaction
+from django.dispatch import receiver
+
+from app.logs import get_event_logger
+from app.metrics import record_cache_lookup
+
+security_logger = get_event_logger("security")
+
+
+class UserCache:
+    """
+    Cross-request cache of the user resolved for each authenticated request.
+
+    Entries are keyed by primary key and a version kept in the shared cache.
+    ``invalidate()`` bumps the version, so every worker misses on its next
+    lookup without being told. Users live pickled in a per-process LRU of
+    ``max_entries`` and in the shared cache for ``timeout`` seconds, so a warm
+    lookup costs one shared cache read and no query. Versions are seeded from
+    the clock, so one evicted from the shared cache never matches old entries.
+    """
+
+    version_prefix = "user_cache:version"
+    entry_prefix = "user_cache:user"
+
+    def __init__(self, enabled: bool = True, max_entries: int = 10_000, timeout: int = 300) -> None:
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._entries: OrderedDict[str, tuple[int, bytes]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _version_key(self, pk) -> str:
+        return f"{self.version_prefix}:{pk}"
+
+    def _version(self, pk) -> int:
+        key = self._version_key(pk)
+        version = cache.get(key)
+        if version is None:
+            cache.add(key, time.time_ns(), timeout=None)
+            version = cache.get(key)
+        return version
+
+    def _load(self, pk):
+        User = get_user_model()
+        try:
+            # Always the primary: a lagging replica read right after invalidate()
+            # would cache the old row under the new version.
+            return User._default_manager.db_manager(DEFAULT_DB_ALIAS).get(pk=pk)
+        except User.DoesNotExist:
+            return None
+
+    def get(self, pk):
+        """The user with primary key ``pk``, or None when there is none."""
+        if not self.enabled:
+            return self._load(pk)
+
+        try:
+            version = self._version(pk)
+        except Exception as err:
+            security_logger.error("User cache unavailable: %s", err, event="user_cache_error")
+            return self._load(pk)
+
+        local_key = str(pk)
+        with self._lock:
+            entry = self._entries.get(local_key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(local_key)
+                record_cache_lookup("user", True)
+                return pickle.loads(entry[1])
+
+        shared_key = f"{self.entry_prefix}:{pk}:{version}"
+        data = cache.get(shared_key)
+        record_cache_lookup("user", data is not None)
+        if data is None:
+            user = self._load(pk)
+            if user is None:
+                return None
+            data = pickle.dumps(user)
+            cache.set(shared_key, data, self.timeout)
+        else:
+            user = pickle.loads(data)
+
+        self._store(local_key, version, data)
+        return user
+
+    def _store(self, local_key: str, version: int, data: bytes) -> None:
+        with self._lock:
+            self._entries[local_key] = (version, data)
+            self._entries.move_to_end(local_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, pk) -> None:
+        """
+        Drop the cached user everywhere. Inside a transaction the version is
+        bumped again on commit, so a lookup that read the old row in between
+        cannot keep it cached.
+        """
+        if not self.enabled:
+            return
+
+        self._bump(pk)
+        if connection.in_atomic_block:
+            transaction.on_commit(lambda: self._bump(pk))
+
+    def _bump(self, pk) -> None:
+        with self._lock:
+            self._entries.pop(str(pk), None)
+        key = self._version_key(pk)
+        try:
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, time.time_ns(), timeout=None)
+        except Exception as err:
+            security_logger.error("User cache not invalidated for %s: %s", pk, err, event="user_cache_error")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+@lru_cache(maxsize=None)
+def get_user_cache() -> UserCache:
+    """Return the cache configured in ``settings.USER_CACHE``."""
+    config = getattr(settings, "USER_CACHE", {})
+    return UserCache(
+        enabled=config.get("ENABLED", True),
+        max_entries=config.get("MAX_ENTRIES", 10_000),
+        timeout=config.get("TIMEOUT", 300),
+    )
+
+
+@receiver(setting_changed)
+def reset_user_cache(setting: str, **kwargs) -> None:
+    if setting == "USER_CACHE":
+        get_user_cache.cache_clear()
+
+
+def invalidate_cached_user(pk: Optional[object]) -> None:
+    """For writes that bypass ``post_save``, e.g. ``QuerySet.update()`` on a user row."""
+    if pk is not None:
+        get_user_cache().invalidate(pk)
@@ -1,9 +1,22 @@
+from django.http import HttpResponse
 from ninja import NinjaAPI
 
 from app.accounts.api import auth_router
+from app.metrics import is_authorized, is_served, metrics_response
+from app.timing import TimedJSONRenderer
 
 app_name = "ninja_stock"
 
-api = NinjaAPI(version="1.0", urls_namespace="api-1.0", csrf=True)
+api = NinjaAPI(version="1.0", urls_namespace="api-1.0", csrf=True, renderer=TimedJSONRenderer())
 
 api.add_router("/auth", auth_router)
+
+
+@api.get("metrics", include_in_schema=False, url_name="metrics")
+def metrics(request):
+    """Prometheus scrape endpoint, aggregated over every worker process."""
+    if not is_served():
+        return HttpResponse(status=404)
+    if not is_authorized(request):
+        return HttpResponse(status=401)
+    return metrics_response()
@@ -0,0 +1,82 @@
+import pkgutil
+from contextlib import contextmanager
+from importlib import import_module
+
+from django.apps import apps
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.recorder import MigrationRecorder
+
+
+def uses_prepared_statements(connection) -> bool:
+    """True for PostgreSQL connections with server-side binding and auto-preparation on."""
+    options = connection.settings_dict.get("OPTIONS", {})
+    return (
+        connection.vendor == "postgresql"
+        and options.get("server_side_binding", False)
+        and options.get("prepare_threshold") is not None
+    )
+
+
+@contextmanager
+def prepared_statements(using: str = DEFAULT_DB_ALIAS):
+    """
+    Prepare the statements run in the block on their first execution.
+
+    psycopg prepares a statement server-side once it ran ``prepare_threshold``
+    times on a connection; hot lookups such as the login one are worth
+    preparing right away when connections are reused by the pool. A no-op
+    unless ``uses_prepared_statements()`` (client-side binding, PgBouncer
+    mode and other databases).
+    """
+    connection = connections[using]
+    if not uses_prepared_statements(connection):
+        yield
+        return
+
+    connection.ensure_connection()
+    conn = connection.connection
+    threshold = conn.prepare_threshold
+    conn.prepare_threshold = 0
+    try:
+        yield
+    finally:
+        conn.prepare_threshold = threshold
+
+
+def disk_migrations() -> set[tuple[str, str]]:
+    """
+    ``(app_label, name)`` of the migration files of the installed apps.
+
+    Files are listed the way MigrationLoader finds them, without importing
+    them or building the migration graph.
+    """
+    migrations = set()
+    for app_config in apps.get_app_configs():
+        module_name, _ = MigrationLoader.migrations_module(app_config.label)
+        if module_name is None:
+            continue
+        try:
+            module = import_module(module_name)
+        except ModuleNotFoundError:
+            continue
+        if not hasattr(module, "__path__"):
+            continue
+        migrations.update(
+            (app_config.label, name)
+            for _, name, is_pkg in pkgutil.iter_modules(module.__path__)
+            if not is_pkg and name[0] not in "_~"
+        )
+    return migrations
+
+
+def unapplied_migrations(using: str = DEFAULT_DB_ALIAS) -> list[tuple[str, str]]:
+    """
+    Migrations on disk the database has no record of, from a single query.
+
+    Squashed migrations count as unapplied until ``migrate`` records them,
+    so a database is never reported up to date when it is not.
+    """
+    recorder = MigrationRecorder(connections[using])
+    applied = set(recorder.applied_migrations()) if recorder.has_table() else set()
+    return sorted(disk_migrations() - applied)
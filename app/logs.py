@@ -1,4 +1,13 @@
+import atexit
+import gzip
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import threading
+from datetime import datetime, timezone
 
 
 def get_logger(name: str = "app", level: int = logging.info) -> logging.Logger:
@@ -12,3 +21,248 @@ def get_logger(name: str = "app", level: int = logging.info) -> logging.Logger:
         logger.setLevel(level)
 
     return logger
+
+
+EVENT_FIELDS = ("event", "username", "ip", "user_agent", "lock_minutes")
+
+
+class EventLogger:
+    """
+    Structured events on top of a logger from ``get_logger``.
+
+    Calls take a %-style message with its arguments, the event type and typed
+    fields (``username``, ``ip``, ``user_agent``: str, ``lock_minutes``: int)
+    plus any extra keyword fields. Nothing is formatted unless the level is
+    enabled, and the message itself is only built when a handler emits the
+    record (with the queue handler, on the listener thread). The fields are
+    set on the record, so ``JsonFormatter`` writes them as keys.
+    """
+
+    def __init__(self, logger: logging.Logger) -> None:
+        self.logger = logger
+
+    def _log(self, level: int, msg: str, args: tuple, event: str, fields: dict) -> None:
+        if not self.logger.isEnabledFor(level):
+            return
+
+        request = fields.pop("request", None)
+        extra = {name: fields.pop(name, None) for name in EVENT_FIELDS}
+        extra["event"] = event
+        extra["fields"] = fields
+        if request is not None:
+            extra["request"] = request
+        self.logger.log(level, msg, *args, extra=extra, stacklevel=3)
+
+    def info(self, msg: str, *args, event: str, **fields) -> None:
+        self._log(logging.INFO, msg, args, event, fields)
+
+    def warning(self, msg: str, *args, event: str, **fields) -> None:
+        self._log(logging.WARNING, msg, args, event, fields)
+
+    def error(self, msg: str, *args, event: str, **fields) -> None:
+        self._log(logging.ERROR, msg, args, event, fields)
+
+
+def get_event_logger(name: str = "security", level: int = logging.INFO) -> EventLogger:
+    """Returns an EventLogger for the logger ``get_logger(name, level)``."""
+    return EventLogger(get_logger(name, level))
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats each record as one JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "module": record.module,
+            "message": record.getMessage(),
+        }
+        for field in EVENT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                data[field] = value
+        data.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+
+        return json.dumps(data, default=str, ensure_ascii=False)
+
+
+class CompressedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    RotatingFileHandler that gzips each rotated file (``security.log.1.gz``, ...).
+
+    For single-process servers only: each process would rotate the shared
+    file on its own and remove it while the others still write to it.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.namer = lambda name: f"{name}.gz"
+        self.rotator = self._compress
+
+    @staticmethod
+    def _compress(source: str, dest: str) -> None:
+        with open(source, "rb") as source_file, gzip.open(dest, "wb") as dest_file:
+            shutil.copyfileobj(source_file, dest_file)
+        os.remove(source)
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler that never lets a full buffer stall the caller for long.
+
+    With the "drop" policy a record arriving at a full queue is discarded at
+    once; with "block" the caller waits up to ``block_timeout`` seconds for
+    room before discarding it. Discarded records are counted and reported by
+    the listener.
+    """
+
+    def __init__(self, log_queue: queue.Queue, policy: str = "drop", block_timeout: float = 0.1) -> None:
+        super().__init__(log_queue)
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            if self.policy == "block":
+                self.queue.put(record, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The queue never leaves the process, so the record is passed as is and
+        # its message is formatted by the listener instead of the caller.
+        return record
+
+    def take_dropped(self) -> int:
+        with self._dropped_lock:
+            dropped, self.dropped = self.dropped, 0
+        return dropped
+
+
+class BatchingQueueListener(logging.handlers.QueueListener):
+    """
+    Listener thread writing queued records in batches of up to ``batch_size``.
+
+    Stream and file handlers, subclasses included, get the whole batch in one
+    write and one flush. Rotating handlers check for rollover and watched
+    files for an external rotation once per batch. Other handlers handle
+    record by record.
+    """
+
+    def __init__(self, log_queue: queue.Queue, *handlers: logging.Handler, batch_size: int = 100, source=None):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.batch_size = batch_size
+        self.source = source
+
+    def _monitor(self) -> None:
+        while True:
+            records = [self.dequeue(True)]
+            while len(records) < self.batch_size:
+                try:
+                    records.append(self.dequeue(False))
+                except queue.Empty:
+                    break
+
+            dequeued = len(records)
+            stop = self._sentinel in records
+            records = [record for record in records if record is not self._sentinel]
+            dropped = self.source.take_dropped() if self.source else 0
+            if dropped:
+                records.append(
+                    logging.makeLogRecord(
+                        {
+                            "name": "app.logs",
+                            "levelno": logging.WARNING,
+                            "levelname": "WARNING",
+                            "msg": f"Log queue full, {dropped} records dropped",
+                        }
+                    )
+                )
+            if records:
+                self.handle_batch([self.prepare(record) for record in records])
+            for _ in range(dequeued):
+                self.queue.task_done()
+            if stop:
+                break
+
+    def stop(self) -> None:
+        """Flush the queued records and stop the thread; a no-op when not running."""
+        if self._thread is not None:
+            super().stop()
+
+    def handle_batch(self, records: list[logging.LogRecord]) -> None:
+        for handler in self.handlers:
+            selected = [record for record in records if record.levelno >= handler.level and handler.filter(record)]
+            if not selected:
+                continue
+
+            if not isinstance(handler, logging.StreamHandler):
+                for record in selected:
+                    handler.handle(record)
+                continue
+
+            try:
+                text = "".join(handler.format(record) + handler.terminator for record in selected)
+                with handler.lock:
+                    if isinstance(handler, logging.handlers.WatchedFileHandler):
+                        handler.reopenIfNeeded()
+                    elif isinstance(handler, logging.handlers.BaseRotatingHandler):
+                        if handler.shouldRollover(selected[0]):
+                            handler.doRollover()
+                    if isinstance(handler, logging.FileHandler) and handler.stream is None:
+                        handler.stream = handler._open()
+                    handler.stream.write(text)
+                    handler.flush()
+            except Exception:
+                handler.handleError(selected[0])
+
+
+def enable_queue_logging(
+    name: str,
+    max_size: int = 10_000,
+    policy: str = "drop",
+    block_timeout: float = 0.1,
+    batch_size: int = 100,
+) -> BatchingQueueListener:
+    """
+    Move the handlers of logger ``name`` behind a bounded queue so logging
+    calls only enqueue the record; a listener thread writes them in batches.
+    The listener is flushed and stopped at interpreter exit and restarted in
+    forked child processes. Calling it again returns the running listener.
+    """
+    logger = logging.getLogger(name)
+    for handler in logger.handlers:
+        if isinstance(handler, BoundedQueueHandler):
+            return handler.listener
+
+    handlers = list(logger.handlers)
+
+    log_queue = queue.Queue(maxsize=max_size)
+    queue_handler = BoundedQueueHandler(log_queue, policy=policy, block_timeout=block_timeout)
+    listener = BatchingQueueListener(log_queue, *handlers, batch_size=batch_size, source=queue_handler)
+    queue_handler.listener = listener
+
+    for handler in handlers:
+        logger.removeHandler(handler)
+    logger.addHandler(queue_handler)
+    listener.start()
+
+    def restart_in_child() -> None:
+        # The listener thread does not survive fork; records queued by the
+        # parent before the fork are discarded with the copied queue.
+        listener.queue = queue_handler.queue = queue.Queue(maxsize=max_size)
+        listener._thread = None
+        listener.start()
+
+    os.register_at_fork(after_in_child=restart_in_child)
+    atexit.register(listener.stop)
+    return listener
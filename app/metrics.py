@@ -0,0 +1,126 @@
+import hmac
+import os
+import time
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.http import HttpRequest, HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# With PROMETHEUS_MULTIPROC_DIR set (before this module is imported) every
+# worker process writes its samples to memory-mapped files in that directory
+# and a scrape sums them, whichever worker answers it.
+MULTIPROCESS = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+LOGIN_URL_NAMES = frozenset({"auth-login", "auth-login-async"})
+
+LOGIN_LATENCY = Histogram(
+    "login_request_duration_seconds",
+    "Login request latency by response status.",
+    ["outcome"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.5, 5.0, 10.0),
+)
+ACCOUNT_LOCKOUTS = Counter("account_lockouts_total", "Accounts locked after repeated failed logins.")
+RATE_LIMIT_REJECTIONS = Counter("login_rate_limit_rejections_total", "Logins rejected by the rate limiter.", ["scope"])
+DB_QUERIES = Histogram(
+    "db_queries_per_request",
+    "Database queries run by each request, by route.",
+    ["route"],
+    buckets=(0, 1, 2, 3, 4, 5, 8, 13, 21, 34),
+)
+REPLICA_LAG = Gauge(
+    "database_replica_lag_seconds",
+    "Replication lag of each read replica at its last check, +Inf when unreachable.",
+    ["alias"],
+    multiprocess_mode="max",
+)
+CACHE_LOOKUPS = Counter("cache_lookups_total", "Cache lookups by cache and result (hit or miss).", ["cache", "result"])
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_LOOKUPS.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+
+def is_served() -> bool:
+    """The endpoint is served only with a token configured or ``METRICS["PUBLIC"]`` set."""
+    return bool(settings.METRICS.get("TOKEN") or settings.METRICS.get("PUBLIC"))
+
+
+def is_authorized(request: HttpRequest) -> bool:
+    """Scrapes must send ``Authorization: Bearer <METRICS["TOKEN"]>`` when a token is configured."""
+    token = settings.METRICS.get("TOKEN")
+    if not token:
+        return True
+    return hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}")
+
+
+def metrics_response() -> HttpResponse:
+    """Current samples in the Prometheus text format, summed over all worker processes."""
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
+
+
+class MetricsMiddleware:
+    """
+    Counts the queries of every request by route and observes the latency
+    of the login routes by response status.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response) -> None:
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        queries = [0]
+        with self._counted_queries(queries):
+            start = time.perf_counter()
+            response = self.get_response(request)
+        return self._observe(request, response, queries[0], time.perf_counter() - start)
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        queries = [0]
+        with self._counted_queries(queries):
+            start = time.perf_counter()
+            response = await self.get_response(request)
+        return self._observe(request, response, queries[0], time.perf_counter() - start)
+
+    @contextmanager
+    def _counted_queries(self, queries: list[int]):
+        def count_query(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(count_query))
+            yield
+
+    def _observe(self, request: HttpRequest, response: HttpResponse, queries: int, elapsed: float) -> HttpResponse:
+        match = request.resolver_match
+        route = match.route if match else "unmatched"
+        DB_QUERIES.labels(route=route).observe(queries)
+        if match and match.url_name in LOGIN_URL_NAMES:
+            LOGIN_LATENCY.labels(outcome=str(response.status_code)).observe(elapsed)
+        return response
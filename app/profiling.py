@@ -0,0 +1,199 @@
+import cProfile
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpRequest, HttpResponse
+
+from app.logs import get_event_logger
+
+timing_logger = get_event_logger("timing")
+
+PROFILE_HEADER = "X-Profile-Request"
+TOKEN_SALT = "app.profiling"
+TOKEN_VALUE = "profile"
+
+
+def make_profile_token() -> str:
+    """Signed value for the ``X-Profile-Request`` header, valid for ``TOKEN_MAX_AGE`` seconds."""
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign(TOKEN_VALUE)
+
+
+def is_valid_profile_token(token: str, max_age: float) -> bool:
+    try:
+        return signing.TimestampSigner(salt=TOKEN_SALT).unsign(token, max_age=max_age) == TOKEN_VALUE
+    except signing.BadSignature:
+        return False
+
+
+class StackSampler:
+    """
+    Samples the call stack of one thread every ``interval`` seconds from a
+    background thread and counts identical stacks, for collapsed-stack output
+    (one ``frame;frame;frame count`` line per stack, root first).
+    """
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._target = None
+
+    def start(self) -> None:
+        self._target = threading.get_ident()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if frames and not self._stopped.is_set():
+                self.stacks[";".join(reversed(frames))] += 1
+
+    def dump(self, path: str) -> None:
+        with open(path, "w") as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f"{stack} {count}\n")
+
+
+class RequestProfilingMiddleware:
+    """
+    Profile the view of selected requests and write one file per request.
+
+    A request is profiled when it carries an ``X-Profile-Request`` header
+    signed with ``make_profile_token()`` (see the profile_token command) or
+    when it falls in ``settings.REQUEST_PROFILING["SAMPLE_RATE"]``. PROFILER
+    "deterministic" writes cProfile ``.pstats`` files, "sampling" writes
+    ``.collapsed`` stacks for flame graph tools. Files are named by time,
+    route and request id, and the name is returned in ``X-Profile-Id``.
+
+    Must be last in ``MIDDLEWARE`` so only the view is measured. Only one
+    request is profiled at a time per process; the others run unprofiled.
+    Under ASGI the profile covers the event loop thread while the view is
+    awaited, so it includes the other requests the loop served meanwhile.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response) -> None:
+        config = getattr(settings, "REQUEST_PROFILING", {})
+        if not config.get("ENABLED", False):
+            raise MiddlewareNotUsed
+
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.sample_rate = config.get("SAMPLE_RATE", 0.0)
+        self.token_max_age = config.get("TOKEN_MAX_AGE", 3600)
+        self.profiler = config.get("PROFILER", "deterministic")
+        self.sample_interval = config.get("SAMPLE_INTERVAL_MS", 1) / 1000
+        self.directory = config["DIRECTORY"]
+        self._active = threading.Lock()
+
+    def _requested(self, request: HttpRequest) -> bool:
+        token = request.headers.get(PROFILE_HEADER)
+        if token is not None:
+            return is_valid_profile_token(token, self.token_max_age)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self._requested(request) or not self._active.acquire(blocking=False):
+            return self.get_response(request)
+
+        try:
+            if self.profiler == "sampling":
+                profiler = StackSampler(self.sample_interval)
+                profiler.start()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    profiler.stop()
+            else:
+                profiler = cProfile.Profile()
+                response = profiler.runcall(self.get_response, request)
+            filename = self._dump(request, profiler)
+        finally:
+            self._active.release()
+        return self._finish(request, response, filename)
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        if not self._requested(request) or not self._active.acquire(blocking=False):
+            return await self.get_response(request)
+
+        try:
+            profiler = StackSampler(self.sample_interval) if self.profiler == "sampling" else cProfile.Profile()
+            if self.profiler == "sampling":
+                profiler.start()
+            else:
+                profiler.enable()
+            try:
+                response = await self.get_response(request)
+            finally:
+                if self.profiler == "sampling":
+                    profiler.stop()
+                else:
+                    profiler.disable()
+            filename = self._dump(request, profiler)
+        finally:
+            self._active.release()
+        return self._finish(request, response, filename)
+
+    def _dump(self, request: HttpRequest, profiler) -> str:
+        filename = self._filename(request)
+        os.makedirs(self.directory, exist_ok=True)
+        if self.profiler == "sampling":
+            profiler.dump(os.path.join(self.directory, filename))
+        else:
+            profiler.dump_stats(os.path.join(self.directory, filename))
+        return filename
+
+    def _finish(self, request: HttpRequest, response: HttpResponse, filename: str) -> HttpResponse:
+        response["X-Profile-Id"] = filename
+        timing_logger.info(
+            "Profiled %s %s into %s",
+            request.method,
+            request.path,
+            filename,
+            event="request_profiled",
+            path=request.path,
+            method=request.method,
+            status=response.status_code,
+            profile=filename,
+        )
+        return response
+
+    def _filename(self, request: HttpRequest) -> str:
+        match = request.resolver_match
+        route = re.sub(r"[^A-Za-z0-9]+", "_", match.route if match else "unmatched").strip("_") or "root"
+        request_id = self._request_id(request)
+        extension = "collapsed" if self.profiler == "sampling" else "pstats"
+        return f"{time.strftime('%Y%m%dT%H%M%S')}_{route}_{request_id}.{extension}"
+
+    def _request_id(self, request: HttpRequest) -> str:
+        request_id: Optional[str] = request.headers.get("X-Request-ID")
+        if request_id:
+            request_id = re.sub(r"[^A-Za-z0-9-]+", "", request_id)[:64]
+        return request_id or uuid.uuid4().hex
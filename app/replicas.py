@@ -0,0 +1,245 @@
+import math
+import os
+import random
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.signals import setting_changed
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.dispatch import receiver
+from django.http import HttpRequest, HttpResponse
+
+from app.logs import get_event_logger
+from app.metrics import REPLICA_LAG
+
+db_logger = get_event_logger("database", level=20)
+
+PIN_COOKIE = "db_primary_until"
+
+# Seconds the replica is behind the primary: 0 when it has replayed
+# everything it received, even if the primary has been idle since.
+POSTGRES_LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+
+@dataclass
+class RoutingState:
+    """Routing of the running request: pinned to the primary, or wrote to it."""
+
+    pinned: bool = False
+    wrote: bool = False
+
+
+_routing_state: ContextVar[Optional[RoutingState]] = ContextVar("routing_state", default=None)
+
+
+class ReplicaLagMonitor:
+    """
+    Tracks how far each replica is behind the primary.
+
+    A background thread, started by the first lookup in each process,
+    measures every replica each ``check_interval`` seconds; lookups only read
+    the last measurement, so a request never waits on a replica. Replicas
+    not measured yet, or that could not be reached, count as infinitely
+    behind until the next check.
+    """
+
+    def __init__(self, replicas: list[str], max_lag: float = 10.0, check_interval: float = 5.0) -> None:
+        self.replicas = replicas
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._lags: dict[str, tuple[float, float]] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def lag(self, alias: str) -> float:
+        self._start()
+        return self._lags.get(alias, (math.inf, -math.inf))[0]
+
+    def measure(self, alias: str) -> float:
+        try:
+            connection = connections[alias]
+            if connection.vendor != "postgresql":
+                return 0.0
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute(POSTGRES_LAG_SQL)
+                    return float(cursor.fetchone()[0])
+            finally:
+                # No request manages the connections of the checker thread.
+                connection.close()
+        except Exception as err:
+            db_logger.warning("Replica %s is unreachable: %s", alias, err, event="replica_unreachable", alias=alias)
+            return math.inf
+
+    def record_lag(self, alias: str, lag: float) -> float:
+        previous = self._lags.get(alias, (0.0, 0.0))[0]
+        self._lags[alias] = (lag, time.monotonic())
+        REPLICA_LAG.labels(alias=alias).set(lag)
+        if lag > self.max_lag >= previous:
+            db_logger.warning(
+                "Replica %s is %.1f s behind, reading from the primary",
+                alias,
+                lag,
+                event="replica_lagging",
+                alias=alias,
+                lag_seconds=lag,
+            )
+        return lag
+
+    def check(self) -> None:
+        """Measure the replicas whose last measurement is ``check_interval`` old."""
+        for alias in self.replicas:
+            checked_at = self._lags.get(alias, (math.inf, -math.inf))[1]
+            if time.monotonic() - checked_at >= self.check_interval:
+                self.record_lag(alias, self.measure(alias))
+
+    def available(self) -> list[str]:
+        """Replicas within ``max_lag`` of the primary."""
+        return [alias for alias in self.replicas if self.lag(alias) <= self.max_lag]
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def _start(self) -> None:
+        # Threads do not survive a fork: each preforked worker starts its own.
+        if not self.replicas or (self._thread is not None and self._pid == os.getpid()):
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="replica-lag-monitor", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self.check()
+            self._stopped.wait(self.check_interval)
+
+
+@lru_cache(maxsize=None)
+def get_replica_monitor() -> ReplicaLagMonitor:
+    """Return the monitor of the replicas in ``settings.REPLICA_ROUTING``."""
+    config = getattr(settings, "REPLICA_ROUTING", {})
+    return ReplicaLagMonitor(
+        list(config.get("REPLICAS", [])),
+        max_lag=config.get("MAX_LAG_SECONDS", 10.0),
+        check_interval=config.get("LAG_CHECK_SECONDS", 5.0),
+    )
+
+
+@receiver(setting_changed)
+def reset_replica_monitor(setting: str, **kwargs) -> None:
+    if setting == "REPLICA_ROUTING":
+        if get_replica_monitor.cache_info().currsize:
+            get_replica_monitor().stop()
+        get_replica_monitor.cache_clear()
+
+
+class PrimaryReplicaRouter:
+    """
+    Sends writes to the primary (``default``) and reads to a replica within
+    ``MAX_LAG_SECONDS`` of it, picked at random.
+
+    Reads stay on the primary inside transactions, for the rest of a request
+    once it wrote, and for requests pinned by ReplicaStickinessMiddleware, so
+    a client reads its own writes. With no replica in sync, reads fall back
+    to the primary. The login pipeline reads accounts from the primary
+    itself, so lockouts apply to clients that never carry the pin.
+    """
+
+    def db_for_read(self, model, **hints) -> str:
+        state = _routing_state.get()
+        if (state and (state.pinned or state.wrote)) or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        replicas = get_replica_monitor().available()
+        return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints) -> str:
+        state = _routing_state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints) -> bool:
+        # Replicas hold the primary's data, so any pair of them relates.
+        return True
+
+    def allow_migrate(self, db: str, app_label: str, model_name: Optional[str] = None, **hints) -> bool:
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaStickinessMiddleware:
+    """
+    Pins a client to the primary for ``STICKY_SECONDS`` after one of its
+    requests wrote, through a cookie holding the end of the window. The
+    cookie only steers reads, so a forged one costs primary capacity and
+    nothing else.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response) -> None:
+        config = getattr(settings, "REPLICA_ROUTING", {})
+        if not config.get("REPLICAS"):
+            raise MiddlewareNotUsed
+
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.sticky_seconds = config.get("STICKY_SECONDS", 5)
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = RoutingState(pinned=self._pinned(request))
+        token = _routing_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing_state.reset(token)
+        return self._pin(response, state)
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        # Queries run through sync_to_async in a copy of this context: the
+        # router marks the shared RoutingState, which is seen here.
+        state = RoutingState(pinned=self._pinned(request))
+        token = _routing_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _routing_state.reset(token)
+        return self._pin(response, state)
+
+    def _pin(self, response: HttpResponse, state: RoutingState) -> HttpResponse:
+        if state.wrote:
+            response.set_cookie(
+                PIN_COOKIE,
+                str(int(time.time() + self.sticky_seconds)),
+                max_age=self.sticky_seconds,
+                secure=settings.SESSION_COOKIE_SECURE,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
+
+    def _pinned(self, request: HttpRequest) -> bool:
+        try:
+            return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
@@ -0,0 +1,315 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.sessions.backends.cache import SessionStore as CacheSessionStore
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from app.logs import get_event_logger
+from app.metrics import record_cache_lookup
+
+session_logger = get_event_logger("sessions", level=20)
+
+KEY_PREFIX = "app.sessions"
+USER_INDEX_PREFIX = "app.sessions.user:"
+INVALIDATION_CHANNEL = "app.sessions.invalidate"
+ACTIVITY_KEY = "last_activity"
+# Session keys whose updates are written back in the background; any other
+# change is written through.
+WRITE_BEHIND_KEYS = frozenset({ACTIVITY_KEY})
+
+
+def _session_cache():
+    return caches[settings.SESSION_CACHE_ALIAS]
+
+
+class LocalSessionCache:
+    """
+    Per-process LRU of session data, each entry kept ``ttl`` seconds.
+
+    Data is copied in and out so requests never share a mutable session.
+    With a Redis ``invalidation_url``, keys evicted by one process (logout,
+    password change) are published and a listener thread evicts them in
+    every other process; without it, other processes see the change within
+    ``ttl``.
+    """
+
+    def __init__(self, ttl: float = 2.0, max_entries: int = 10_000, invalidation_url: str = "") -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.invalidation_url = invalidation_url
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._client = None
+        self._listener = None
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+            else:
+                entry = None
+        record_cache_lookup("session_l1", entry is not None)
+        return copy.deepcopy(entry[1]) if entry is not None else None
+
+    def set(self, key: str, data: dict) -> None:
+        if self.ttl <= 0:
+            return
+        self._listen()
+        entry = (time.monotonic() + self.ttl, copy.deepcopy(data))
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry[0] > time.monotonic()
+
+    def discard(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def invalidate(self, *keys: str) -> None:
+        """Evict ``keys`` here and, through Redis, in the other processes."""
+        self.discard(*keys)
+        if not keys or not self.invalidation_url:
+            return
+        try:
+            client = self._redis()
+            for key in keys:
+                client.publish(INVALIDATION_CHANNEL, key)
+        except Exception as err:
+            session_logger.error("Session invalidation not published: %s", err, event="session_invalidation_failed")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _redis(self):
+        if self._client is None:
+            import redis
+
+            self._client = redis.Redis.from_url(self.invalidation_url)
+        return self._client
+
+    def _listen(self) -> None:
+        if not self.invalidation_url or self._listener is not None:
+            return
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._run, name="session-invalidation", daemon=True)
+                self._listener.start()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                pubsub = self._redis().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                for message in pubsub.listen():
+                    self.discard(message["data"].decode())
+            except Exception as err:
+                # Entries may be stale until the subscription is back: drop them all.
+                self.clear()
+                session_logger.error("Session invalidation listener failed: %s", err, event="session_listener_failed")
+                time.sleep(1)
+
+
+class SessionWriteBehind:
+    """
+    Writes activity updates of sessions every ``interval`` seconds from a
+    background thread, coalescing the updates of each session. Only the
+    updated keys are written, into the session's current data; sessions
+    deleted in the meantime (logout) are not brought back.
+    """
+
+    def __init__(self, interval: float = 5.0) -> None:
+        self.interval = interval
+        self._pending: dict[str, tuple[dict, int]] = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def schedule(self, cache_key: str, values: dict, timeout: int) -> None:
+        with self._lock:
+            pending = self._pending.get(cache_key, ({}, timeout))[0]
+            self._pending[cache_key] = ({**pending, **values}, timeout)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="session-write-behind", daemon=True)
+                self._thread.start()
+
+    def discard(self, cache_key: str) -> None:
+        with self._lock:
+            self._pending.pop(cache_key, None)
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        cache = _session_cache()
+        for cache_key, (values, timeout) in pending.items():
+            try:
+                data = cache.get(cache_key)
+                if data is not None:
+                    cache.set(cache_key, {**data, **values}, timeout)
+            except Exception as err:
+                session_logger.error("Session write-back failed: %s", err, event="session_write_back_failed")
+
+
+@lru_cache(maxsize=None)
+def get_local_session_cache() -> LocalSessionCache:
+    """Return the L1 configured in ``settings.SESSION_STORE``."""
+    config = getattr(settings, "SESSION_STORE", {})
+    return LocalSessionCache(
+        ttl=config.get("L1_TTL", 2.0),
+        max_entries=config.get("L1_MAX_ENTRIES", 10_000),
+        invalidation_url=config.get("INVALIDATION_URL", ""),
+    )
+
+
+@lru_cache(maxsize=None)
+def get_session_write_behind() -> SessionWriteBehind:
+    """Return the activity writer configured in ``settings.SESSION_STORE``."""
+    return SessionWriteBehind(getattr(settings, "SESSION_STORE", {}).get("WRITE_BEHIND_SECONDS", 5.0))
+
+
+@receiver(setting_changed)
+def reset_session_store(setting: str, **kwargs) -> None:
+    if setting == "SESSION_STORE":
+        get_local_session_cache.cache_clear()
+        get_session_write_behind.cache_clear()
+
+
+def invalidate_user_sessions(user_id) -> None:
+    """End every session of the user, e.g. after a password change."""
+    cache = _session_cache()
+    index_key = f"{USER_INDEX_PREFIX}{user_id}"
+    cache_keys = list(cache.get(index_key) or ())
+    cache.delete_many([*cache_keys, index_key])
+    for cache_key in cache_keys:
+        get_session_write_behind().discard(cache_key)
+    get_local_session_cache().invalidate(*cache_keys)
+
+
+class SessionStore(CacheSessionStore):
+    """
+    Cache session store (Redis when configured) with a per-process L1 in
+    front, see LocalSessionCache.
+
+    Authenticated sessions record ``last_activity`` at most every
+    ``ACTIVITY_SECONDS``. Saves that only change it go to SessionWriteBehind
+    instead of the cache. Sessions are indexed by user so a password change
+    ends all of them (invalidate_user_sessions()).
+    """
+
+    cache_key_prefix = KEY_PREFIX
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        self._changed_keys: Optional[set] = set()
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        if self._changed_keys is not None:
+            self._changed_keys.add(key)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._changed_keys = None
+
+    def pop(self, key, *args):
+        self._changed_keys = None
+        return super().pop(key, *args)
+
+    def update(self, dict_):
+        self._changed_keys = None
+        super().update(dict_)
+
+    def clear(self):
+        self._changed_keys = None
+        super().clear()
+
+    def load(self):
+        local = get_local_session_cache()
+        data = local.get(self.cache_key)
+        if data is None:
+            data = super().load()
+            if self.session_key is None:
+                return data
+            local.set(self.cache_key, data)
+
+        activity_seconds = getattr(settings, "SESSION_STORE", {}).get("ACTIVITY_SECONDS", 60)
+        now = int(time.time())
+        if activity_seconds and "_auth_user_id" in data and now - data.get(ACTIVITY_KEY, 0) >= activity_seconds:
+            data[ACTIVITY_KEY] = now
+            self.modified = True
+            if self._changed_keys is not None:
+                self._changed_keys.add(ACTIVITY_KEY)
+        return data
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+
+        data = self._get_session(no_load=must_create)
+        local = get_local_session_cache()
+        cache_key = self.cache_key
+        if not must_create and self._changed_keys and self._changed_keys <= WRITE_BEHIND_KEYS:
+            values = {key: data[key] for key in self._changed_keys if key in data}
+            get_session_write_behind().schedule(cache_key, values, self.get_expiry_age())
+            local.set(cache_key, data)
+            self._changed_keys = set()
+            return
+
+        if not must_create and cache_key in local:
+            # A live L1 entry stands for the cache's own existence check.
+            self._cache.set(cache_key, data, self.get_expiry_age())
+        else:
+            super().save(must_create=must_create)
+        get_session_write_behind().discard(cache_key)
+        local.set(cache_key, data)
+        self._changed_keys = set()
+        if "_auth_user_id" in data:
+            self._index(data["_auth_user_id"], cache_key)
+
+    def _index(self, user_id, cache_key: str) -> None:
+        index_key = f"{USER_INDEX_PREFIX}{user_id}"
+        cache_keys = set(self._cache.get(index_key) or ())
+        if cache_key not in cache_keys:
+            self._cache.set(index_key, cache_keys | {cache_key}, settings.SESSION_COOKIE_AGE)
+
+    def delete(self, session_key=None):
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        super().delete(session_key)
+        get_session_write_behind().discard(self.cache_key_prefix + session_key)
+        get_local_session_cache().invalidate(self.cache_key_prefix + session_key)
+
+    # The cache calls of the Redis backend run in a thread anyway, so the
+    # async API runs the sync methods, L1 included, in one.
+
+    async def aload(self):
+        return await sync_to_async(self.load)()
+
+    async def asave(self, must_create=False):
+        return await sync_to_async(self.save)(must_create)
+
+    async def adelete(self, session_key=None):
+        return await sync_to_async(self.delete)(session_key)
@@ -1,7 +1,8 @@
 import os
 from pathlib import Path
+from urllib.parse import quote
 
-from decouple import config
+from decouple import Csv, config
 from django.contrib.messages import constants
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -36,6 +37,12 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Must stay first, it times every middleware below it.
+    "app.timing.ServerTimingMiddleware",
+    "app.metrics.MetricsMiddleware",
+    "app.slow_queries.CurrentViewMiddleware",
+    # Before any middleware that reads the database (sessions, auth).
+    "app.replicas.ReplicaStickinessMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -46,6 +53,8 @@ MIDDLEWARE = [
     "app.accounts.middleware.SecurityHeadersMiddleware",
     "app.accounts.middleware.RequestValidationMiddleware",
     "app.accounts.middleware.SuperUserEmailLoginMiddleware",
+    # Must stay last, it profiles the view only.
+    "app.profiling.RequestProfilingMiddleware",
 ]
 
 ROOT_URLCONF = "app.urls"
@@ -72,6 +81,41 @@ WSGI_APPLICATION = "app.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# DATABASE POOL
+# With ENABLED each process keeps a psycopg pool of MIN_SIZE to MAX_SIZE
+# connections; connections above MIN_SIZE idle for MAX_IDLE seconds are
+# closed, every checkout is health checked and requests wait up to TIMEOUT
+# seconds for a free one. Without it connections live CONN_MAX_AGE seconds.
+# PGBOUNCER is for a transaction-pooling PgBouncer in front of Postgres: no
+# server-side cursors and no prepared statements. PREPARED_STATEMENTS binds
+# parameters server-side so statements run PREPARE_THRESHOLD times on a
+# connection are prepared (the login lookup on its first run). The sizes are
+# per process: gunicorn.conf.py splits GUNICORN_DATABASE_CONNECTIONS between
+# the workers.
+DATABASE_POOL = {
+    "ENABLED": config("DATABASE_POOL_ENABLED", default=True, cast=bool),
+    "MIN_SIZE": config("DATABASE_POOL_MIN_SIZE", default=2, cast=int),
+    "MAX_SIZE": config("DATABASE_POOL_MAX_SIZE", default=10, cast=int),
+    "MAX_IDLE": config("DATABASE_POOL_MAX_IDLE", default=600.0, cast=float),
+    "TIMEOUT": config("DATABASE_POOL_TIMEOUT", default=10.0, cast=float),
+    "CONN_MAX_AGE": config("DATABASE_CONN_MAX_AGE", default=60, cast=int),
+    "PGBOUNCER": config("DATABASE_PGBOUNCER", default=False, cast=bool),
+    "PREPARED_STATEMENTS": config("DATABASE_PREPARED_STATEMENTS", default=False, cast=bool),
+    "PREPARE_THRESHOLD": config("DATABASE_PREPARE_THRESHOLD", default=5, cast=int),
+}
+
+DATABASE_OPTIONS = {}
+if DATABASE_POOL["ENABLED"]:
+    DATABASE_OPTIONS["pool"] = {
+        "min_size": DATABASE_POOL["MIN_SIZE"],
+        "max_size": DATABASE_POOL["MAX_SIZE"],
+        "max_idle": DATABASE_POOL["MAX_IDLE"],
+        "timeout": DATABASE_POOL["TIMEOUT"],
+    }
+if DATABASE_POOL["PREPARED_STATEMENTS"] and not DATABASE_POOL["PGBOUNCER"]:
+    DATABASE_OPTIONS["server_side_binding"] = True
+    DATABASE_OPTIONS["prepare_threshold"] = DATABASE_POOL["PREPARE_THRESHOLD"]
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.postgresql",
@@ -80,9 +124,65 @@ DATABASES = {
         "PASSWORD": config("POSTGRES_PASSWORD"),
         "HOST": config("POSTGRES_HOST"),
         "PORT": config("POSTGRES_PORT", default=5432, cast=int),
+        # The pool replaces persistent connections, Django rejects both.
+        "CONN_MAX_AGE": 0 if DATABASE_POOL["ENABLED"] else DATABASE_POOL["CONN_MAX_AGE"],
+        # Checks pooled connections on checkout, persistent ones per request.
+        "CONN_HEALTH_CHECKS": True,
+        "DISABLE_SERVER_SIDE_CURSORS": DATABASE_POOL["PGBOUNCER"],
+        "OPTIONS": DATABASE_OPTIONS,
     }
 }
 
+# READ REPLICAS
+# Each host in DATABASE_REPLICA_HOSTS becomes a "replica_<n>" database with
+# the primary's name and credentials. Reads go to a replica at most
+# MAX_LAG_SECONDS behind (checked every LAG_CHECK_SECONDS), writes to the
+# primary. A client whose request wrote reads from the primary for the next
+# STICKY_SECONDS.
+for index, host in enumerate(config("DATABASE_REPLICA_HOSTS", default="", cast=Csv())):
+    DATABASES[f"replica_{index}"] = {**DATABASES["default"], "HOST": host, "TEST": {"MIRROR": "default"}}
+
+REPLICA_ROUTING = {
+    "REPLICAS": [alias for alias in DATABASES if alias != "default"],
+    "STICKY_SECONDS": config("DATABASE_REPLICA_STICKY_SECONDS", default=5, cast=int),
+    "MAX_LAG_SECONDS": config("DATABASE_REPLICA_MAX_LAG_SECONDS", default=10.0, cast=float),
+    "LAG_CHECK_SECONDS": config("DATABASE_REPLICA_LAG_CHECK_SECONDS", default=5.0, cast=float),
+}
+DATABASE_ROUTERS = ["app.replicas.PrimaryReplicaRouter"]
+
+# REDIS
+# Shared by the cache and the login rate limiter. Without REDIS_HOST both fall
+# back to per-process in-memory storage (development and tests).
+REDIS_HOST = config("REDIS_HOST", default="")
+REDIS_URL = (
+    "redis://{username}:{password}@{host}:{port}/{db}".format(
+        username=quote(config("REDIS_USERNAME", default=""), safe=""),
+        password=quote(config("REDIS_PASSWORD", default=""), safe=""),
+        host=REDIS_HOST,
+        port=config("REDIS_PORT", default=6379, cast=int),
+        db=config("REDIS_DB", default=0, cast=int),
+    )
+    if REDIS_HOST
+    else ""
+)
+
+# CACHE
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
 # SQLITE
 # DATABASES = {
 #     "default": {
@@ -150,6 +250,159 @@ AUTHENTICATION_BACKENDS = [
     "django.contrib.auth.backends.ModelBackend",
 ]
 
+# CLIENT IP
+# Reverse proxies (load balancers) in front of the app. With 0 the client IP
+# of rate limits and security logs is REMOTE_ADDR; with N it is the N-th
+# X-Forwarded-For entry from the right, the one the outermost proxy added.
+TRUSTED_PROXY_COUNT = config("TRUSTED_PROXY_COUNT", default=0, cast=int)
+
+# LOGIN RATE LIMIT
+# Sliding window limits checked by auth_login before any database work.
+# RATES maps a scope to (max attempts, window in seconds).
+LOGIN_RATE_LIMIT = {
+    "BACKEND": (
+        "app.accounts.ratelimit.RedisSlidingWindowRateLimiter"
+        if REDIS_URL
+        else "app.accounts.ratelimit.InMemorySlidingWindowRateLimiter"
+    ),
+    "OPTIONS": {"url": REDIS_URL} if REDIS_URL else {},
+    "RATES": {
+        "account": (config("LOGIN_RATE_LIMIT_ACCOUNT", default=10, cast=int), 15 * 60),
+        "ip": (config("LOGIN_RATE_LIMIT_IP", default=100, cast=int), 15 * 60),
+    },
+}
+
+# PASSWORD HASHING POOL
+# check_password runs on a bounded pool: KIND is "thread", "process" or
+# "inline" (on the request thread). Logins beyond MAX_WORKERS + MAX_QUEUE
+# get 503 with Retry-After instead of queueing. MAX_WORKERS is per process:
+# gunicorn.conf.py splits the CPUs between the workers.
+PASSWORD_HASH_POOL = {
+    "KIND": config("PASSWORD_HASH_POOL_KIND", default="thread"),
+    "MAX_WORKERS": config("PASSWORD_HASH_POOL_WORKERS", default=os.cpu_count() or 1, cast=int),
+    "MAX_QUEUE": config("PASSWORD_HASH_POOL_QUEUE", default=64, cast=int),
+    "RETRY_AFTER": config("PASSWORD_HASH_POOL_RETRY_AFTER", default=1, cast=int),
+}
+
+# PASSWORD HASHING COST
+# PASSWORD_HASH_ITERATIONS is the PBKDF2 work factor; 0 keeps Django's default.
+# Run `manage.py calibrate_hasher --target-ms 250` to size it for the hardware.
+# Outdated hashes are upgraded on login: "deferred" writes the new hash on a
+# background thread, "inline" within the request, or "off".
+PASSWORD_HASH_ITERATIONS = config("PASSWORD_HASH_ITERATIONS", default=0, cast=int)
+PASSWORD_REHASH_MODE = config("PASSWORD_REHASH_MODE", default="deferred")
+PASSWORD_HASHERS = [
+    "app.accounts.hashing.CalibratedPBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+    "django.contrib.auth.hashers.ScryptPasswordHasher",
+]
+
+# LOGIN ID FILTER
+# In-memory Bloom filter of the canonical emails and usernames. Logins for an
+# identifier it has never seen are rejected without a database query. Workers
+# learn of each other's new accounts through the default cache: without Redis
+# the filter stays off, unless SINGLE_PROCESS says one process serves it all.
+LOGIN_ID_FILTER = {
+    "ENABLED": config("LOGIN_ID_FILTER_ENABLED", default=True, cast=bool),
+    "SINGLE_PROCESS": config("LOGIN_ID_FILTER_SINGLE_PROCESS", default=False, cast=bool),
+    "CAPACITY": config("LOGIN_ID_FILTER_CAPACITY", default=100_000, cast=int),
+    "ERROR_RATE": config("LOGIN_ID_FILTER_ERROR_RATE", default=0.001, cast=float),
+    "REBUILD_SECONDS": config("LOGIN_ID_FILTER_REBUILD_SECONDS", default=3600, cast=int),
+}
+
+
+# USER CACHE
+# Users resolved from the session are cached per process (LRU of
+# MAX_ENTRIES) and in the default cache for TIMEOUT seconds, under a version
+# bumped on every save, delete or security field update of the user.
+USER_CACHE = {
+    "ENABLED": config("USER_CACHE_ENABLED", default=True, cast=bool),
+    "MAX_ENTRIES": config("USER_CACHE_MAX_ENTRIES", default=10_000, cast=int),
+    "TIMEOUT": config("USER_CACHE_TIMEOUT", default=300, cast=int),
+}
+
+# REQUEST VALIDATION
+# RequestValidationMiddleware scans query strings, form data and JSON bodies.
+# Bodies over MAX_BODY_BYTES get 413; EXCLUDE_PATHS are path prefixes it skips
+# and SKIP_FIELDS are body fields it never checks.
+REQUEST_VALIDATION = {
+    "ENABLED": config("REQUEST_VALIDATION_ENABLED", default=True, cast=bool),
+    "MAX_BODY_BYTES": config("REQUEST_VALIDATION_MAX_BODY_BYTES", default=64 * 1024, cast=int),
+    "EXCLUDE_PATHS": config("REQUEST_VALIDATION_EXCLUDE_PATHS", default="", cast=Csv()),
+    "SKIP_FIELDS": ["password"],
+}
+
+# SECURITY EVENTS
+# Login successes, failures and lockouts are stored as SecurityEvent rows,
+# inserted in batches of BATCH_SIZE or every FLUSH_SECONDS by a background
+# thread. Beyond MAX_PENDING unsaved events new ones are dropped.
+SECURITY_EVENTS = {
+    "ENABLED": config("SECURITY_EVENTS_ENABLED", default=True, cast=bool),
+    "BATCH_SIZE": config("SECURITY_EVENTS_BATCH_SIZE", default=100, cast=int),
+    "FLUSH_SECONDS": config("SECURITY_EVENTS_FLUSH_SECONDS", default=5.0, cast=float),
+    "MAX_PENDING": config("SECURITY_EVENTS_MAX_PENDING", default=10_000, cast=int),
+}
+
+# SERVER TIMING
+# Fraction of requests timed per phase (each middleware, the view, queries,
+# hashing, serialization) and answered with a Server-Timing header. At 0 the
+# middleware is removed from the chain. LOG also writes a JSON timing line.
+SERVER_TIMING = {
+    "SAMPLE_RATE": config("SERVER_TIMING_SAMPLE_RATE", default=0.0, cast=float),
+    "HEADER": config("SERVER_TIMING_HEADER", default=True, cast=bool),
+    "LOG": config("SERVER_TIMING_LOG", default=False, cast=bool),
+}
+
+# REQUEST PROFILING
+# Requests sent with a signed X-Profile-Request header (python manage.py
+# profile_token) or within SAMPLE_RATE are profiled. PROFILER "deterministic"
+# writes cProfile .pstats files, "sampling" writes collapsed stacks taken
+# every SAMPLE_INTERVAL_MS. Files go to DIRECTORY, named by route and request id,
+# which is created on the first profile. Off unless REQUEST_PROFILING_ENABLED.
+REQUEST_PROFILING = {
+    "ENABLED": config("REQUEST_PROFILING_ENABLED", default=False, cast=bool),
+    "SAMPLE_RATE": config("REQUEST_PROFILING_SAMPLE_RATE", default=0.0, cast=float),
+    "PROFILER": config("REQUEST_PROFILING_PROFILER", default="deterministic"),
+    "SAMPLE_INTERVAL_MS": config("REQUEST_PROFILING_SAMPLE_INTERVAL_MS", default=1.0, cast=float),
+    "TOKEN_MAX_AGE": config("REQUEST_PROFILING_TOKEN_MAX_AGE", default=3600, cast=int),
+    "DIRECTORY": config("REQUEST_PROFILING_DIRECTORY", default=os.path.join(BASE_DIR, "profiles")),
+}
+
+# STARTUP PROFILE
+# python manage.py startup_profile starts MODULE in fresh interpreters, lists
+# its slowest imports and fails when the start takes over BUDGET_MS, or when
+# one of the project's modules takes over MODULE_BUDGET_MS to import (0 for
+# no limit).
+STARTUP_PROFILE = {
+    "MODULE": config("STARTUP_PROFILE_MODULE", default="app.wsgi"),
+    "BUDGET_MS": config("STARTUP_BUDGET_MS", default=1000.0, cast=float),
+    "MODULE_BUDGET_MS": config("STARTUP_MODULE_BUDGET_MS", default=0.0, cast=float),
+}
+
+# SLOW QUERY LOG
+# Statements slower than THRESHOLD_MS are logged on the "slow_queries" logger
+# with their view and parameter types, and kept in a ring buffer of
+# BUFFER_SIZE entries in the default cache (python manage.py slow_queries).
+# EXPLAIN_SAMPLE_RATE of them get their plan captured in the background.
+SLOW_QUERY_LOG = {
+    "ENABLED": config("SLOW_QUERY_LOG_ENABLED", default=True, cast=bool),
+    "THRESHOLD_MS": config("SLOW_QUERY_THRESHOLD_MS", default=100.0, cast=float),
+    "EXPLAIN_SAMPLE_RATE": config("SLOW_QUERY_EXPLAIN_SAMPLE_RATE", default=0.1, cast=float),
+    "BUFFER_SIZE": config("SLOW_QUERY_BUFFER_SIZE", default=200, cast=int),
+}
+
+# METRICS
+# Prometheus samples served at /api/v1/metrics. With TOKEN set, scrapes must
+# send "Authorization: Bearer <token>"; without one the endpoint answers 404
+# unless PUBLIC opts in to serving it to anyone. Preforked servers must export
+# PROMETHEUS_MULTIPROC_DIR (an empty, writable directory) before start, so
+# every worker writes to shared mmap files and a scrape sums all of them.
+METRICS = {
+    "TOKEN": config("METRICS_TOKEN", default=""),
+    "PUBLIC": config("METRICS_PUBLIC", default=False, cast=bool),
+}
 
 # MESSAGES
 MESSAGE_TAGS = {
@@ -169,18 +422,42 @@ LOGGING = {
             "format": "{levelname} {asctime} {module} {message}",
             "style": "{",
         },
+        "json": {
+            "()": "app.logs.JsonFormatter",
+        },
     },
     "handlers": {
-        "security_file": {
+        # One JSON object per line. Every worker process appends to the file,
+        # so it is rotated by an external tool (logrotate with "create" and
+        # "delaycompress", never "copytruncate"); each process reopens it once
+        # moved. SECURITY_LOG_ROTATION=size rotates by size into gzipped
+        # backups in process instead, for single-process servers only.
+        "security_file": (
+            {
+                "level": "INFO",
+                "class": "app.logs.CompressedRotatingFileHandler",
+                "filename": "security.log",
+                "maxBytes": config("SECURITY_LOG_MAX_BYTES", default=10 * 1024 * 1024, cast=int),
+                "backupCount": config("SECURITY_LOG_BACKUP_COUNT", default=5, cast=int),
+                "formatter": "json",
+            }
+            if config("SECURITY_LOG_ROTATION", default="external") == "size"
+            else {
+                "level": "INFO",
+                "class": "logging.handlers.WatchedFileHandler",
+                "filename": "security.log",
+                "formatter": "json",
+            }
+        ),
+        "console": {
             "level": "INFO",
-            "class": "logging.FileHandler",
-            "filename": "security.log",
+            "class": "logging.StreamHandler",
             "formatter": "verbose",
         },
-        "console": {
+        "json_console": {
             "level": "INFO",
             "class": "logging.StreamHandler",
-            "formatter": "verbose",
+            "formatter": "json",
         },
     },
     "loggers": {
@@ -189,9 +466,56 @@ LOGGING = {
             "level": "INFO",
             "propagate": False,
         },
+        "timing": {
+            "handlers": ["json_console"],
+            "level": "INFO",
+            "propagate": False,
+        },
+        "database": {
+            "handlers": ["json_console"],
+            "level": "INFO",
+            "propagate": False,
+        },
+        "sessions": {
+            "handlers": ["json_console"],
+            "level": "INFO",
+            "propagate": False,
+        },
+        "slow_queries": {
+            "handlers": ["json_console"],
+            "level": "WARNING",
+            "propagate": False,
+        },
     },
 }
 
+# SECURITY LOG QUEUE
+# When enabled, the "security" logger only enqueues records and a listener
+# thread writes them in batches. POLICY "drop" discards records when MAX_SIZE
+# are pending; "block" waits up to BLOCK_TIMEOUT seconds first.
+SECURITY_LOG_QUEUE = {
+    "ENABLED": config("SECURITY_LOG_QUEUE_ENABLED", default=True, cast=bool),
+    "MAX_SIZE": config("SECURITY_LOG_QUEUE_MAX_SIZE", default=10_000, cast=int),
+    "POLICY": config("SECURITY_LOG_QUEUE_POLICY", default="drop"),
+    "BLOCK_TIMEOUT": config("SECURITY_LOG_QUEUE_BLOCK_TIMEOUT", default=0.1, cast=float),
+    "BATCH_SIZE": config("SECURITY_LOG_QUEUE_BATCH_SIZE", default=100, cast=int),
+}
+
+# SESSIONS
+# Sessions live in the default cache (Redis when configured) behind a
+# per-process L1 of L1_MAX_ENTRIES sessions kept L1_TTL seconds. Logouts and
+# password changes evict them from every process's L1 through Redis pub/sub.
+# Authenticated sessions record last_activity at most every ACTIVITY_SECONDS,
+# written back by a background thread every WRITE_BEHIND_SECONDS.
+SESSION_ENGINE = "app.sessions"
+SESSION_STORE = {
+    "L1_TTL": config("SESSION_L1_TTL", default=2.0, cast=float),
+    "L1_MAX_ENTRIES": config("SESSION_L1_MAX_ENTRIES", default=10_000, cast=int),
+    "INVALIDATION_URL": REDIS_URL,
+    "ACTIVITY_SECONDS": config("SESSION_ACTIVITY_SECONDS", default=60, cast=int),
+    "WRITE_BEHIND_SECONDS": config("SESSION_WRITE_BEHIND_SECONDS", default=5.0, cast=float),
+}
+
 # SESSION SECURITY SETTINGS
 SESSION_COOKIE_SECURE = True  # Requer HTTPS
 SESSION_COOKIE_HTTPONLY = True  # Prevents access via JavaScript.
@@ -0,0 +1,252 @@
+import queue
+import random
+import threading
+import time
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.db import close_old_connections, connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpRequest, HttpResponse
+
+from app.logs import get_event_logger
+
+slow_query_logger = get_event_logger("slow_queries", level=30)
+
+_current_view: ContextVar[Optional[str]] = ContextVar("current_view", default=None)
+
+SEQUENCE_KEY = "slow_queries:seq"
+EXPLAINABLE = ("SELECT", "WITH", "UPDATE", "DELETE", "INSERT")
+
+
+def params_shape(params, many: bool) -> str:
+    """Types of the query parameters, never their values."""
+    if many:
+        params = list(params or [])
+        return f"{len(params)} x {params_shape(params[0], False)}" if params else "0 x ()"
+    if params is None:
+        return "()"
+    if isinstance(params, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in params.items()) + "}"
+    return "(" + ", ".join(type(value).__name__ for value in params) + ")"
+
+
+def current_view() -> str:
+    """The resolved view of the running request, or the thread for work outside requests."""
+    return _current_view.get() or f"thread:{threading.current_thread().name}"
+
+
+class SlowQueryRecorder:
+    """
+    Records statements slower than ``threshold_ms``.
+
+    Each record holds the SQL, the parameter types, the view that ran it,
+    the duration and, for ``explain_sample_rate`` of them, the query plan
+    captured by a background thread. Records are written to the
+    ``slow_queries`` log and to a ring buffer of ``buffer_size`` slots in the
+    default cache, read by the slow_queries command. The buffer is shared
+    between processes only when the cache is (e.g. Redis).
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        threshold_ms: float = 100.0,
+        explain_sample_rate: float = 0.1,
+        buffer_size: int = 200,
+        max_pending_explains: int = 100,
+    ) -> None:
+        self.enabled = enabled
+        self.threshold = threshold_ms / 1000
+        self.explain_sample_rate = explain_sample_rate
+        self.buffer_size = buffer_size
+        self._explains: queue.Queue = queue.Queue(maxsize=max_pending_explains)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        if not self.enabled:
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            if duration >= self.threshold and not sql.lstrip().upper().startswith("EXPLAIN"):
+                self.record(sql, params, many, duration, context["connection"].alias)
+
+    def record(self, sql: str, params, many: bool, duration: float, alias: str) -> None:
+        record = {
+            "time": time.time(),
+            "duration_ms": round(duration * 1000, 3),
+            "view": current_view(),
+            "alias": alias,
+            "sql": sql,
+            "params": params_shape(params, many),
+            "plan": None,
+        }
+        slow_query_logger.warning(
+            "Slow query (%.1f ms) in %s: %s",
+            record["duration_ms"],
+            record["view"],
+            sql,
+            event="slow_query",
+            view=record["view"],
+            duration_ms=record["duration_ms"],
+            params=record["params"],
+            alias=alias,
+        )
+        self._store(record)
+
+        explainable = not many and sql.lstrip().upper().startswith(EXPLAINABLE)
+        if explainable and random.random() < self.explain_sample_rate:
+            try:
+                self._explains.put_nowait((record, params))
+            except queue.Full:
+                return
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="slow-query-explain", daemon=True)
+                    self._thread.start()
+
+    def _store(self, record: dict) -> None:
+        try:
+            cache.add(SEQUENCE_KEY, 0, timeout=None)
+            record["id"] = cache.incr(SEQUENCE_KEY)
+            cache.set(self._slot_key(record["id"]), record, timeout=None)
+        except Exception:
+            record["id"] = None
+
+    def _slot_key(self, record_id: int) -> str:
+        return f"slow_queries:slot:{record_id % self.buffer_size}"
+
+    def recent(self, limit: Optional[int] = None) -> list[dict]:
+        """Buffered records, newest first."""
+        last = cache.get(SEQUENCE_KEY) or 0
+        count = min(last, self.buffer_size, limit or self.buffer_size)
+        slots = cache.get_many([self._slot_key(record_id) for record_id in range(last - count + 1, last + 1)])
+        return sorted(slots.values(), key=lambda record: record["id"], reverse=True)
+
+    def clear(self) -> None:
+        cache.delete_many([self._slot_key(slot) for slot in range(self.buffer_size)] + [SEQUENCE_KEY])
+
+    def _run(self) -> None:
+        while True:
+            record, params = self._explains.get()
+            try:
+                self._explain(record, params)
+            finally:
+                close_old_connections()
+                self._explains.task_done()
+
+    def _explain(self, record: dict, params) -> None:
+        connection = connections[record["alias"]]
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(f"{connection.ops.explain_query_prefix()} {record['sql']}", params)
+                record["plan"] = "\n".join(str(row[-1]) for row in cursor.fetchall())
+        except Exception as err:
+            record["plan"] = f"EXPLAIN failed: {err}"
+
+        slow_query_logger.warning(
+            "Plan of slow query in %s:\n%s",
+            record["view"],
+            record["plan"],
+            event="slow_query_plan",
+            view=record["view"],
+            duration_ms=record["duration_ms"],
+            plan=record["plan"],
+        )
+        if record.get("id") is None:
+            return
+        key = self._slot_key(record["id"])
+        try:
+            stored = cache.get(key)
+            if stored and stored["id"] == record["id"]:
+                cache.set(key, record, timeout=None)
+        except Exception:
+            pass
+
+    def join(self) -> None:
+        """Wait for the pending EXPLAINs (tests and shutdown)."""
+        self._explains.join()
+
+
+@lru_cache(maxsize=None)
+def get_slow_query_recorder() -> SlowQueryRecorder:
+    """Return the recorder configured in ``settings.SLOW_QUERY_LOG``."""
+    config = getattr(settings, "SLOW_QUERY_LOG", {})
+    return SlowQueryRecorder(
+        enabled=config.get("ENABLED", False),
+        threshold_ms=config.get("THRESHOLD_MS", 100.0),
+        explain_sample_rate=config.get("EXPLAIN_SAMPLE_RATE", 0.1),
+        buffer_size=config.get("BUFFER_SIZE", 200),
+    )
+
+
+@receiver(setting_changed)
+def reset_slow_query_recorder(setting: str, **kwargs) -> None:
+    if setting == "SLOW_QUERY_LOG":
+        get_slow_query_recorder.cache_clear()
+
+
+def record_slow_query(execute, sql, params, many, context):
+    """Execute wrapper installed on every connection, see install_slow_query_log()."""
+    return get_slow_query_recorder()(execute, sql, params, many, context)
+
+
+def _install_on_connection(sender, connection, **kwargs) -> None:
+    if record_slow_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_slow_query)
+
+
+def install_slow_query_log() -> None:
+    """Time the statements of every database connection opened from now on."""
+    connection_created.connect(_install_on_connection, dispatch_uid="slow_query_log")
+
+
+class CurrentViewMiddleware:
+    """Makes the resolved view name of the request available to the slow query log."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response) -> None:
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            # Django runs a sync process_view on a thread in async mode.
+            self.process_view = self.aprocess_view
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _current_view.set(None)
+        try:
+            return self.get_response(request)
+        finally:
+            _current_view.reset(token)
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        token = _current_view.set(None)
+        try:
+            return await self.get_response(request)
+        finally:
+            _current_view.reset(token)
+
+    def process_view(self, request: HttpRequest, view_func, view_args, view_kwargs) -> None:
+        self._set_view(request, view_func)
+
+    async def aprocess_view(self, request: HttpRequest, view_func, view_args, view_kwargs) -> None:
+        self._set_view(request, view_func)
+
+    def _set_view(self, request: HttpRequest, view_func) -> None:
+        match = request.resolver_match
+        _current_view.set(match.view_name if match else getattr(view_func, "__qualname__", repr(view_func)))
@@ -0,0 +1,63 @@
+import os
+import subprocess
+import sys
+from typing import NamedTuple
+
+# Run in a fresh interpreter: imports the module, sets Django up if it did
+# not, loads the URLconf (what a worker does before its first response) and
+# prints the milliseconds it took. Modules are imported with __import__, as
+# -X importtime does not time importlib.import_module().
+STARTUP_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+__import__(sys.argv[1])
+import django
+from django.apps import apps
+if not apps.ready:
+    django.setup()
+from django.conf import settings
+from django.urls import get_resolver
+__import__(settings.ROOT_URLCONF)
+get_resolver().url_patterns
+print((time.perf_counter() - start) * 1000)
+"""
+
+
+class ImportTiming(NamedTuple):
+    module: str
+    self_ms: float
+    cumulative_ms: float
+
+
+def parse_importtime(output: str) -> list[ImportTiming]:
+    """Timings of the ``import time: self [us] | cumulative | imported package`` lines of ``-X importtime``."""
+    timings = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, module = line[len("import time:") :].split("|")
+        if not self_us.strip().isdigit():
+            continue
+        timings.append(ImportTiming(module.strip(), int(self_us) / 1000, int(cumulative_us) / 1000))
+    return timings
+
+
+def run_startup(module: str, importtime: bool = False) -> subprocess.CompletedProcess:
+    command = [sys.executable, *(["-X", "importtime"] if importtime else []), "-c", STARTUP_SCRIPT, module]
+    return subprocess.run(command, env=os.environ.copy(), capture_output=True, text=True, check=False)
+
+
+def profile_startup(module: str) -> tuple[float, list[ImportTiming]]:
+    """
+    Cold start of ``module`` in fresh interpreters: the milliseconds it takes
+    and the import timings of every module it loads. The time comes from a
+    run without ``-X importtime``, whose own overhead would count otherwise.
+
+    Raises RuntimeError with the child's stderr when a run fails.
+    """
+    timed = run_startup(module)
+    profiled = run_startup(module, importtime=True)
+    for completed in (timed, profiled):
+        if completed.returncode:
+            raise RuntimeError(completed.stderr)
+    return float(timed.stdout.strip().splitlines()[-1]), parse_importtime(profiled.stderr)
@@ -0,0 +1,213 @@
+import random
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpRequest, HttpResponse
+from ninja.renderers import JSONRenderer
+
+from app.logs import get_event_logger
+
+timing_logger = get_event_logger("timing")
+
+_current_timing: ContextVar[Optional["RequestTiming"]] = ContextVar("request_timing", default=None)
+
+
+class RequestTiming:
+    """
+    Exclusive wall time per phase of one request.
+
+    Phases nest: time spent in an inner phase (e.g. ``db`` inside a view) is
+    only counted for the inner one, so the phases add up to about the total.
+    """
+
+    def __init__(self) -> None:
+        self.phases: dict[str, list] = {}
+        self._stack: list[list] = []
+
+    def enter(self, name: str) -> None:
+        self._stack.append([name, time.perf_counter(), 0.0])
+
+    def exit(self) -> None:
+        name, start, children = self._stack.pop()
+        elapsed = time.perf_counter() - start
+        phase = self.phases.setdefault(name, [0.0, 0])
+        phase[0] += elapsed - children
+        phase[1] += 1
+        if self._stack:
+            self._stack[-1][2] += elapsed
+
+    def header(self) -> str:
+        """Value for the ``Server-Timing`` header, durations in milliseconds."""
+        metrics = []
+        for name, (seconds, count) in self.phases.items():
+            metric = f"{name};dur={seconds * 1000:.2f}"
+            if name == "db":
+                metric += f';desc="{count} queries"'
+            metrics.append(metric)
+        return ", ".join(metrics)
+
+    def as_dict(self) -> dict:
+        return {
+            name: {"ms": round(seconds * 1000, 3), "count": count} for name, (seconds, count) in self.phases.items()
+        }
+
+
+@contextmanager
+def timed(name: str):
+    """Time a block as phase ``name`` of the current request; a no-op when it is not sampled."""
+    timing = _current_timing.get()
+    if timing is None:
+        yield
+        return
+
+    timing.enter(name)
+    try:
+        yield
+    finally:
+        timing.exit()
+
+
+def _time_query(execute, sql, params, many, context):
+    with timed("db"):
+        return execute(sql, params, many, context)
+
+
+def _timed_handler(name: str, handler):
+    if iscoroutinefunction(handler):
+
+        async def async_timed(request):
+            timing = _current_timing.get()
+            if timing is None:
+                return await handler(request)
+            timing.enter(name)
+            try:
+                return await handler(request)
+            finally:
+                timing.exit()
+
+        return async_timed
+
+    def sync_timed(request):
+        timing = _current_timing.get()
+        if timing is None:
+            return handler(request)
+        timing.enter(name)
+        try:
+            return handler(request)
+        finally:
+            timing.exit()
+
+    return sync_timed
+
+
+class ServerTimingMiddleware:
+    """
+    Sampled per-phase timing sent back as a ``Server-Timing`` header.
+
+    Must be first in ``MIDDLEWARE``. On start it wraps the handler passed to
+    every following middleware, so each one gets a ``mw_<Class>`` phase and
+    the view a ``view`` phase. Queries are timed as ``db`` and the code paths
+    instrumented with ``timed()`` (hashing, lookup, serialization) as their
+    own phases. ``settings.SERVER_TIMING["SAMPLE_RATE"]`` is the fraction of
+    requests timed; at 0 the middleware removes itself from the chain.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response) -> None:
+        config = getattr(settings, "SERVER_TIMING", {})
+        self.sample_rate = config.get("SAMPLE_RATE", 0.0)
+        self.send_header = config.get("HEADER", True)
+        self.log = config.get("LOG", False)
+        if self.sample_rate <= 0:
+            raise MiddlewareNotUsed
+
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self._instrument_chain(get_response)
+
+    def _instrument_chain(self, handler) -> None:
+        owner = self
+        while True:
+            middleware = getattr(handler, "__wrapped__", handler)
+            inner = getattr(middleware, "get_response", None)
+            name = f"mw_{type(middleware).__name__}" if inner is not None else "view"
+            owner.get_response = _timed_handler(name, handler)
+            if inner is None:
+                return
+            owner, handler = middleware, inner
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self._sampled():
+            return self.get_response(request)
+
+        timing = RequestTiming()
+        token = _current_timing.set(timing)
+        start = time.perf_counter()
+        try:
+            with self._timed_queries():
+                response = self.get_response(request)
+        finally:
+            _current_timing.reset(token)
+        return self._finish(request, response, timing, start)
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        if not self._sampled():
+            return await self.get_response(request)
+
+        timing = RequestTiming()
+        token = _current_timing.set(timing)
+        start = time.perf_counter()
+        try:
+            with self._timed_queries():
+                response = await self.get_response(request)
+        finally:
+            _current_timing.reset(token)
+        return self._finish(request, response, timing, start)
+
+    def _sampled(self) -> bool:
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    @contextmanager
+    def _timed_queries(self):
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(_time_query))
+            yield
+
+    def _finish(self, request: HttpRequest, response: HttpResponse, timing: RequestTiming, start: float):
+        timing.phases["total"] = [time.perf_counter() - start, 1]
+
+        if self.send_header:
+            response["Server-Timing"] = timing.header()
+        if self.log:
+            timing_logger.info(
+                "%s %s %s",
+                request.method,
+                request.path,
+                response.status_code,
+                event="server_timing",
+                path=request.path,
+                method=request.method,
+                status=response.status_code,
+                phases=timing.as_dict(),
+            )
+        return response
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """Ninja JSON renderer that reports response serialization as a phase."""
+
+    def render(self, request: HttpRequest, data, *, response_status: int):
+        with timed("serialize"):
+            return super().render(request, data, response_status=response_status)
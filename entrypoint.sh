@@ -1,3 +1,13 @@
 #!/bin/sh
-python manage.py migrate
-exec python manage.py runserver 0.0.0.0:8000
+python manage.py migrate_if_needed
+
+# SERVER_MODE: "wsgi" (default) or "asgi" run the preforking Gunicorn server
+# configured in gunicorn.conf.py, "dev" runs Django's development server.
+case "${SERVER_MODE:-wsgi}" in
+    dev)
+        exec python manage.py runserver 0.0.0.0:8000
+        ;;
+    *)
+        exec gunicorn --config gunicorn.conf.py
+        ;;
+esac
@@ -0,0 +1,109 @@
+"""
+Gunicorn settings of the production server (``entrypoint.sh``).
+
+SERVER_MODE "wsgi" serves ``app.wsgi`` with threaded workers, "asgi" serves
+``app.asgi`` with Uvicorn workers. The app is imported once in the master
+and the workers are forked from it, so the imported code and settings are
+shared copy-on-write. Every setting can be overridden with the matching
+GUNICORN_* variable or with GUNICORN_CMD_ARGS.
+"""
+
+import gc
+import math
+import os
+import shutil
+
+# Imported as a module: a top-level "config" would be read as a setting.
+import decouple
+
+
+def cpu_count() -> int:
+    """CPUs this container may use: the cgroup quota when set, else the CPU affinity."""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as file:
+            quota, period = file.read().split()
+        if quota != "max":
+            return max(1, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    return len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+
+
+SERVER_MODE = decouple.config("SERVER_MODE", default="wsgi")
+
+if SERVER_MODE == "asgi":
+    wsgi_app = "app.asgi:application"
+    worker_class = "uvicorn_worker.UvicornWorker"
+    # Each event loop already keeps a core busy.
+    workers = decouple.config("GUNICORN_WORKERS", default=cpu_count(), cast=int)
+else:
+    wsgi_app = "app.wsgi:application"
+    worker_class = "gthread"
+    workers = decouple.config("GUNICORN_WORKERS", default=cpu_count() * 2 + 1, cast=int)
+    threads = decouple.config("GUNICORN_THREADS", default=4, cast=int)
+
+# Every worker builds its own password hashing pool and database connection
+# pool, so the CPUs and the connections Postgres accepts are split between
+# them. Read by the settings, which the preload imports after this file; a
+# value set in the environment is used as is.
+DATABASE_CONNECTIONS = decouple.config("GUNICORN_DATABASE_CONNECTIONS", default=80, cast=int)
+
+
+def share(name: str, budget: int) -> int:
+    value = decouple.config(name, default=max(1, budget // workers), cast=int)
+    os.environ[name] = str(value)
+    return value
+
+
+share("PASSWORD_HASH_POOL_WORKERS", cpu_count())
+pool_max_size = share("DATABASE_POOL_MAX_SIZE", DATABASE_CONNECTIONS)
+# The pool refuses a MIN_SIZE above MAX_SIZE.
+share("DATABASE_POOL_MIN_SIZE", min(2, pool_max_size) * workers)
+
+bind = decouple.config("GUNICORN_BIND", default="0.0.0.0:8000")
+preload_app = True
+
+# Workers are replaced after a jittered number of requests, finishing the
+# ones in flight first, so leaks stay bounded and restarts are spread out.
+max_requests = decouple.config("GUNICORN_MAX_REQUESTS", default=1000, cast=int)
+max_requests_jitter = decouple.config("GUNICORN_MAX_REQUESTS_JITTER", default=max_requests // 10, cast=int)
+
+# On SIGTERM workers stop accepting and get graceful_timeout seconds to
+# drain; the container's stop timeout must be longer.
+graceful_timeout = decouple.config("GUNICORN_GRACEFUL_TIMEOUT", default=30, cast=int)
+timeout = decouple.config("GUNICORN_TIMEOUT", default=30, cast=int)
+keepalive = decouple.config("GUNICORN_KEEPALIVE", default=5, cast=int)
+
+accesslog = decouple.config("GUNICORN_ACCESS_LOG", default="-")
+errorlog = "-"
+
+# Every worker writes its Prometheus samples to files in this directory, and
+# a scrape sums them (app.metrics). It must exist, emptied of the files of
+# previous runs, before the preload imports prometheus_client.
+PROMETHEUS_MULTIPROC_DIR = os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", decouple.config("GUNICORN_PROMETHEUS_DIR", default="/tmp/prometheus_multiproc")
+)
+shutil.rmtree(PROMETHEUS_MULTIPROC_DIR, ignore_errors=True)
+os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+
+# Objects allocated while the master imports the app would be touched (and
+# so copied) by the workers' collections; collect nothing until they are
+# frozen, once, before the first fork.
+gc.disable()
+
+
+def when_ready(server) -> None:
+    from django.db import connections
+
+    # Connections opened while loading the app must not be shared by workers.
+    connections.close_all()
+    # The workers, and the master, collect again, leaving the app alone.
+    gc.freeze()
+    gc.enable()
+    server.log.info("Serving %s with %s %s workers", wsgi_app, workers, worker_class)
+
+
+def child_exit(server, worker) -> None:
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -1,8 +1,17 @@
+import threading
 from datetime import timedelta
 
 import pytest  # noqa F401
+from django.contrib.auth import get_user
+from django.contrib.auth.hashers import make_password
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.contrib.sessions.backends.signed_cookies import SessionStore
+from django.http import HttpRequest
 from django.utils import timezone
 
+from app.accounts.hashing import get_password_hash_pool, get_password_rehash_queue
+from app.accounts.lookup_filter import get_login_id_filter
+from app.accounts.models import lock_minutes_for
 from tests.factories import UserFactory
 from tests.utils import NinjaSessionClient
 
@@ -15,10 +24,8 @@ class TestApiAuthLogin:
     ) -> None:
         """Tests successful login using username."""
 
-        user = user_factory()
         password = "test_password12345"
-        user.set_password(password)
-        user.save()
+        user = user_factory(password=password)
 
         data = {"login_id": user.username, "password": password}
 
@@ -38,10 +45,8 @@ class TestApiAuthLogin:
     ) -> None:
         """Tests successful login using email."""
 
-        user = user_factory()
         password = "test_password12345"
-        user.set_password(password)
-        user.save()
+        user = user_factory(password=password)
 
         data = {"login_id": user.email, "password": password}
 
@@ -59,10 +64,8 @@ class TestApiAuthLogin:
     ) -> None:
         """Test login with password shorter than expected."""
 
-        user = user_factory()
         password = "_pass"
-        user.set_password(password)
-        user.save()
+        user = user_factory(password=password)
 
         data = {"login_id": user.email, "password": password}
 
@@ -83,10 +86,8 @@ class TestApiAuthLogin:
     ) -> None:
         """Test login with incorrect password."""
 
-        user = user_factory()
         password1 = "test_pass12345"
-        user.set_password(password1)
-        user.save()
+        user = user_factory(password=password1)
 
         password2 = "testpassword12345"
         data = {"login_id": user.email, "password": password2}
@@ -105,10 +106,8 @@ class TestApiAuthLogin:
     ) -> None:
         """Test that login fails when the email is not in lowercase."""
 
-        user = user_factory()
         password = "test_password12345"
-        user.set_password(password)
-        user.save()
+        user = user_factory(password=password)
 
         data = {"login_id": user.email.upper(), "password": password}
 
@@ -126,10 +125,8 @@ class TestApiAuthLogin:
     ) -> None:
         """Test login using case insensitive username."""
 
-        user = user_factory()
         password = "test_password121345"
-        user.set_password(password)
-        user.save()
+        user = user_factory(password=password)
 
         data = {"login_id": user.username.upper(), "password": password}
 
@@ -142,6 +139,28 @@ class TestApiAuthLogin:
         assert response_data["message"] == "Invalid credentials."
         assert response_data["detail"] == "Username/Email or password is incorrect."
 
+    @pytest.mark.parametrize("scenario", ["username_variant", "superuser_username"])
+    def test_login_rejection_spends_a_hash(
+        self, ninja_session_client: NinjaSessionClient, user_factory: UserFactory, super_user_factory, scenario: str
+    ) -> None:
+        """Tests that logins rejected after the lookup cost the hashing work of a wrong password."""
+
+        password = "test_password12345"
+        if scenario == "superuser_username":
+            user = super_user_factory(username="superuser", email="superuser@example.com", password=password)
+            login_id = user.username
+        else:
+            user = user_factory(password=password)
+            login_id = user.username.upper()
+        completed = get_password_hash_pool().stats()["completed"]
+
+        extra = {"_messages": CookieStorage(HttpRequest())} if scenario == "superuser_username" else {}
+        data = {"login_id": login_id, "password": password}
+        response = ninja_session_client.post(self.url, json=data, **extra)
+
+        assert response.status_code == 401
+        assert get_password_hash_pool().stats()["completed"] == completed + 1
+
     def test_login_nonexistent_user(
         self, ninja_session_client: NinjaSessionClient, user_factory: UserFactory
     ) -> None:
@@ -163,10 +182,8 @@ class TestApiAuthLogin:
     ) -> None:
         """Test login with empty username field."""
 
-        user = user_factory()
         password = "test_password121345"
-        user.set_password(password)
-        user.save()
+        user_factory(password=password)
 
         data = {"login_id": "", "password": password}
 
@@ -186,10 +203,8 @@ class TestApiAuthLogin:
     ) -> None:
         """Test account lockout after multiple failed attempts."""
 
-        user = user_factory()
         password = "test_password12345"
-        user.set_password(password)
-        user.save()
+        user = user_factory(password=password)
 
         data = {"login_id": user.username, "password": "wrong_password12345"}
 
@@ -212,16 +227,30 @@ class TestApiAuthLogin:
             == "Account temporarily locked for security reasons."
         )
 
+    def test_lock_at_threshold_follows_the_tiers(
+        self, ninja_session_client: NinjaSessionClient, user_factory: UserFactory
+    ) -> None:
+        """Tests that an account over the threshold is locked for its tier, counting the attempt as a failure."""
+
+        user = user_factory(password="test_password12345", failed_login_attempts=7)
+        before = timezone.now()
+
+        data = {"login_id": user.username, "password": "test_password12345"}
+        response = ninja_session_client.post(self.url, json=data)
+
+        assert response.status_code == 429
+        user.refresh_from_db()
+        assert user.failed_login_attempts == 8
+        assert before + timedelta(minutes=lock_minutes_for(7)) <= user.account_locked_until
+        assert user.account_locked_until <= timezone.now() + timedelta(minutes=lock_minutes_for(7))
+
     def test_login_with_locked_account(
         self, ninja_session_client: NinjaSessionClient, user_factory: UserFactory
     ) -> None:
         """Login test with locked account."""
 
-        user = user_factory()
         password = "test_password12345"
-        user.set_password(password)
-        user.account_locked_until = timezone.now() + timedelta(minutes=30)
-        user.save()
+        user = user_factory(password=password, account_locked_until=timezone.now() + timedelta(minutes=30))
 
         data = {"login_id": user.username, "password": password}
 
@@ -242,12 +271,8 @@ class TestApiAuthLogin:
     ) -> None:
         """tests whether successful login resets the failed attempts counter."""
 
-        user = user_factory()
         password = "test_password12345"
-        user.set_password(password)
-        user.failed_login_attempts = 2
-        user.last_failed_login = timezone.now()
-        user.save()
+        user = user_factory(password=password, failed_login_attempts=2, last_failed_login=timezone.now())
 
         data = {"login_id": user.username, "password": password}
 
@@ -265,11 +290,8 @@ class TestApiAuthLogin:
     ) -> None:
         """Tests login after lockout period expires."""
 
-        user = user_factory()
         password = "test_password12345"
-        user.set_password(password)
-        user.account_locked_until = timezone.now() - timedelta(minutes=10)
-        user.save()
+        user = user_factory(password=password, account_locked_until=timezone.now() - timedelta(minutes=10))
 
         data = {"login_id": user.username, "password": password}
 
@@ -281,3 +303,309 @@ class TestApiAuthLogin:
 
         assert response_data["user"]["id"] == str(user.id)
         assert response_data["user"]["email"] == user.email
+
+    def test_login_rate_limited_by_account(
+        self,
+        ninja_session_client: NinjaSessionClient,
+        login_rate_limit: dict,
+        settings,
+        django_assert_num_queries,
+    ) -> None:
+        """Tests that attempts over the account limit get 429 without any query."""
+
+        settings.LOGIN_RATE_LIMIT = {**login_rate_limit, "RATES": {"account": (3, 60), "ip": (100, 60)}}
+        data = {"login_id": "UserNonExistent", "password": "test_password12345"}
+
+        for _ in range(3):
+            response = ninja_session_client.post(self.url, json=data)
+            assert response.status_code == 401
+
+        with django_assert_num_queries(0):
+            response = ninja_session_client.post(self.url, json={**data, "login_id": "usernonexistent"})
+
+        assert response.status_code == 429
+        assert response["Retry-After"]
+        assert response.json()["message"] == "Too many login attempts"
+
+    def test_login_rate_limited_by_ip(
+        self, ninja_session_client: NinjaSessionClient, login_rate_limit: dict, settings
+    ) -> None:
+        """Tests that the client IP limit applies across different accounts."""
+
+        settings.LOGIN_RATE_LIMIT = {**login_rate_limit, "RATES": {"account": (100, 60), "ip": (2, 60)}}
+
+        for i in range(2):
+            data = {"login_id": f"user{i}", "password": "test_password12345"}
+            response = ninja_session_client.post(self.url, json=data)
+            assert response.status_code == 401
+
+        data = {"login_id": "another_user", "password": "test_password12345"}
+        response = ninja_session_client.post(self.url, json=data)
+
+        assert response.status_code == 429
+
+    def test_login_ip_limit_ignores_spoofed_forwarded_for(
+        self, ninja_session_client: NinjaSessionClient, login_rate_limit: dict, settings
+    ) -> None:
+        """Tests that a new X-Forwarded-For per request does not reset the client IP bucket."""
+
+        settings.LOGIN_RATE_LIMIT = {**login_rate_limit, "RATES": {"account": (100, 60), "ip": (2, 60)}}
+
+        for i in range(3):
+            data = {"login_id": f"user{i}", "password": "test_password12345"}
+            response = ninja_session_client.post(self.url, json=data, headers={"X-Forwarded-For": f"203.0.113.{i}"})
+
+        assert response.status_code == 429
+
+    def test_login_ip_limit_uses_trusted_proxy_entry(
+        self, ninja_session_client: NinjaSessionClient, login_rate_limit: dict, settings
+    ) -> None:
+        """Tests that behind one trusted proxy the rightmost X-Forwarded-For entry is the client."""
+
+        settings.TRUSTED_PROXY_COUNT = 1
+        settings.LOGIN_RATE_LIMIT = {**login_rate_limit, "RATES": {"account": (100, 60), "ip": (2, 60)}}
+
+        for i in range(3):
+            data = {"login_id": f"user{i}", "password": "test_password12345"}
+            forwarded_for = f"198.51.100.{i}, 203.0.113.7"
+            response = ninja_session_client.post(self.url, json=data, headers={"X-Forwarded-For": forwarded_for})
+        assert response.status_code == 429
+
+        data = {"login_id": "another_user", "password": "test_password12345"}
+        response = ninja_session_client.post(self.url, json=data, headers={"X-Forwarded-For": "203.0.113.8"})
+        assert response.status_code == 401
+
+    def test_login_hash_pool_full(
+        self, ninja_session_client: NinjaSessionClient, user_factory: UserFactory, settings
+    ) -> None:
+        """Tests that logins are shed with 503 when the hashing queue is full."""
+
+        settings.PASSWORD_HASH_POOL = {"KIND": "inline", "MAX_WORKERS": 1, "MAX_QUEUE": 0, "RETRY_AFTER": 3}
+        pool = get_password_hash_pool()
+        user = user_factory(password="test_password12345")
+
+        assert pool._slots.acquire(blocking=False)
+        try:
+            data = {"login_id": user.username, "password": "test_password12345"}
+            response = ninja_session_client.post(self.url, json=data)
+        finally:
+            pool._slots.release()
+
+        assert response.status_code == 503
+        assert response["Retry-After"] == "3"
+        assert pool.stats()["rejected"] == 1
+
+        user.refresh_from_db()
+        assert user.failed_login_attempts == 0
+
+    def test_hash_pool_shutdown_releases_queued_slots(self, settings) -> None:
+        """Tests that hashes cancelled by a pool shutdown give their queue slots back."""
+
+        settings.PASSWORD_HASH_POOL = {"KIND": "thread", "MAX_WORKERS": 1, "MAX_QUEUE": 2}
+        pool = get_password_hash_pool()
+        started, release = threading.Event(), threading.Event()
+        pool.executor.submit(lambda: started.set() or release.wait())
+        started.wait()
+
+        queued = [pool._submit("test_password12345", make_password("test_password12345")) for _ in range(3)]
+        pool.shutdown()
+        release.set()
+
+        assert all(future.cancelled() for future in queued)
+        assert pool.stats()["in_flight"] == 0
+        assert all(pool._slots.acquire(blocking=False) for _ in range(3))
+
+    def test_login_reports_hash_pool_stats(
+        self, ninja_session_client: NinjaSessionClient, user_factory: UserFactory, settings
+    ) -> None:
+        """Tests that the hashing pool records completed hashes."""
+
+        settings.PASSWORD_HASH_POOL = {"KIND": "thread", "MAX_WORKERS": 2, "MAX_QUEUE": 4}
+        user = user_factory(password="test_password12345")
+
+        data = {"login_id": user.username, "password": "test_password12345"}
+        response = ninja_session_client.post(self.url, json=data)
+
+        assert response.status_code == 200
+        stats = get_password_hash_pool().stats()
+        assert stats["completed"] == 1
+        assert stats["in_flight"] == 0
+        assert stats["avg_hash_ms"] > 0
+
+    def test_login_defers_password_rehash(
+        self, ninja_session_client: NinjaSessionClient, user_factory: UserFactory, settings, monkeypatch
+    ) -> None:
+        """Tests that outdated hashes are upgraded off the request by default."""
+
+        password = "test_password12345"
+        settings.PASSWORD_HASH_ITERATIONS = 1000
+        user = user_factory(password=password)
+        outdated = user.password
+
+        scheduled = []
+        monkeypatch.setattr(
+            get_password_rehash_queue(), "schedule", lambda *args: scheduled.append(args) or True
+        )
+        settings.PASSWORD_HASH_ITERATIONS = 2000
+        settings.PASSWORD_REHASH_MODE = "deferred"
+
+        response = ninja_session_client.post(self.url, json={"login_id": user.username, "password": password})
+
+        assert response.status_code == 200
+        [(user_pk, encoded, scheduled_outdated)] = scheduled
+        assert (user_pk, scheduled_outdated) == (user.pk, outdated)
+        assert encoded.startswith("pbkdf2_sha256$2000$")
+        user.refresh_from_db()
+        assert user.password == outdated
+
+    def test_deferred_password_rehash_keeps_the_session(
+        self, ninja_session_client: NinjaSessionClient, user_factory: UserFactory, settings, transactional_db
+    ) -> None:
+        """Tests that the session of the login that upgraded the hash stays authenticated once it is written."""
+
+        password = "test_password12345"
+        settings.PASSWORD_HASH_ITERATIONS = 1000
+        user = user_factory(password=password)
+        settings.PASSWORD_HASH_ITERATIONS = 2000
+        settings.PASSWORD_REHASH_MODE = "deferred"
+
+        session = SessionStore()
+        data = {"login_id": user.username, "password": password}
+        response = ninja_session_client.post(self.url, json=data, session=session)
+        get_password_rehash_queue().join()
+
+        assert response.status_code == 200
+        user.refresh_from_db()
+        assert user.password.startswith("pbkdf2_sha256$2000$")
+        request = HttpRequest()
+        request.session = session
+        assert get_user(request) == user
+
+    def test_login_inline_password_rehash(
+        self, ninja_session_client: NinjaSessionClient, user_factory: UserFactory, settings
+    ) -> None:
+        """Tests that inline mode upgrades to the configured iteration count."""
+
+        password = "test_password12345"
+        settings.PASSWORD_HASH_ITERATIONS = 1000
+        user = user_factory(password=password)
+
+        settings.PASSWORD_HASH_ITERATIONS = 2000
+        settings.PASSWORD_REHASH_MODE = "inline"
+
+        response = ninja_session_client.post(self.url, json={"login_id": user.username, "password": password})
+
+        assert response.status_code == 200
+        user.refresh_from_db()
+        assert user.password.startswith("pbkdf2_sha256$2000$")
+
+    def test_login_unknown_id_skips_database(
+        self,
+        ninja_session_client: NinjaSessionClient,
+        user_factory: UserFactory,
+        login_id_filter: dict,
+        settings,
+        django_assert_num_queries,
+    ) -> None:
+        """Tests that login ids missing from the filter get 401 without a query but with a hash."""
+
+        user_factory()
+        settings.LOGIN_ID_FILTER = {**login_id_filter, "ENABLED": True}
+        get_login_id_filter().rebuild()
+        completed = get_password_hash_pool().stats()["completed"]
+
+        with django_assert_num_queries(0):
+            response = ninja_session_client.post(
+                self.url, json={"login_id": "nobody_here", "password": "test_password12345"}
+            )
+
+        assert response.status_code == 401
+        assert get_password_hash_pool().stats()["completed"] == completed + 1
+
+    def test_login_id_filter_includes_new_users(
+        self,
+        ninja_session_client: NinjaSessionClient,
+        user_factory: UserFactory,
+        login_id_filter: dict,
+        settings,
+    ) -> None:
+        """Tests that accounts saved after the filter was built can log in."""
+
+        settings.LOGIN_ID_FILTER = {**login_id_filter, "ENABLED": True}
+        get_login_id_filter().rebuild()
+
+        password = "test_password12345"
+        user = user_factory(password=password)
+
+        response = ninja_session_client.post(self.url, json={"login_id": user.email, "password": password})
+
+        assert response.status_code == 200
+
+
+    def test_login_id_filter_needs_a_shared_cache(self, login_id_filter: dict, settings) -> None:
+        """Tests that the filter stays off over a per-process cache, where other workers' accounts are unseen."""
+
+        settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+        settings.LOGIN_ID_FILTER = {**login_id_filter, "ENABLED": True, "SINGLE_PROCESS": False}
+
+        assert not get_login_id_filter().enabled
+
+        settings.LOGIN_ID_FILTER = {**login_id_filter, "ENABLED": True, "SINGLE_PROCESS": True}
+
+        assert get_login_id_filter().enabled
+
+
+class TestLoginQueryBudget:
+    """
+    Query budgets of the login endpoint per scenario. Raise a budget only
+    with a reason: the failure lists the SQL of the request.
+    """
+
+    url = "/login"
+    password = "test_password12345"
+
+    @pytest.mark.parametrize(
+        ("scenario", "status", "budget"),
+        [
+            ("success_username", 200, 2),
+            ("success_email", 200, 2),
+            ("wrong_password", 401, 2),
+            ("unknown_user", 401, 1),
+            ("locked_account", 403, 1),
+            ("lockout_threshold", 429, 2),
+            ("superuser_username", 401, 2),
+        ],
+    )
+    def test_login_query_budget(  # noqa PLR0913
+        self,
+        ninja_session_client: NinjaSessionClient,
+        user_factory: UserFactory,
+        super_user_factory,
+        query_budget,
+        scenario: str,
+        status: int,
+        budget: int,
+    ) -> None:
+        """Tests that each login outcome stays within its query budget."""
+
+        if scenario == "superuser_username":
+            user = super_user_factory(username="superuser", email="superuser@example.com", password=self.password)
+        else:
+            fields = {
+                "locked_account": {"account_locked_until": timezone.now() + timedelta(minutes=30)},
+                "lockout_threshold": {"failed_login_attempts": 5},
+            }.get(scenario, {})
+            user = user_factory(password=self.password, **fields)
+
+        login_id = {"success_email": user.email, "unknown_user": "nobody_here"}.get(scenario, user.username)
+        password = "wrong_password123" if scenario == "wrong_password" else self.password
+
+        # The superuser rejection adds a flash message, stored by MessageMiddleware in the app.
+        extra = {"_messages": CookieStorage(HttpRequest())} if scenario == "superuser_username" else {}
+
+        with query_budget(budget, f"POST {self.url} ({scenario})"):
+            response = ninja_session_client.post(
+                self.url, json={"login_id": login_id, "password": password}, **extra
+            )
+
+        assert response.status_code == status
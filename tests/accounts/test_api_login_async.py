@@ -0,0 +1,115 @@
+import logging
+from datetime import timedelta
+
+import pytest  # noqa F401
+from asgiref.sync import async_to_sync
+from django.test import AsyncClient
+from django.utils import timezone
+from ninja.testing import TestAsyncClient
+
+from app.accounts.api import auth_router
+from app.accounts.hashing import get_password_hash_pool
+from app.accounts.models import lock_minutes_for
+from tests.factories import UserFactory
+
+
+class TestApiAuthLoginAsync:
+    url = "/login/async"
+
+    def post(self, data: dict):
+        client = TestAsyncClient(auth_router)
+
+        async def post():
+            return await client.post(self.url, json=data)
+
+        return async_to_sync(post)()
+
+    def test_middleware_chain_stays_async(self, user_factory: UserFactory, settings, tmp_path, caplog, db) -> None:
+        """Tests that under ASGI no middleware is adapted to run on a thread, the optional ones included."""
+
+        settings.DEBUG = True
+        settings.SERVER_TIMING = {**settings.SERVER_TIMING, "SAMPLE_RATE": 1.0}
+        settings.REQUEST_PROFILING = {**settings.REQUEST_PROFILING, "ENABLED": True, "DIRECTORY": str(tmp_path)}
+        settings.REPLICA_ROUTING = {**settings.REPLICA_ROUTING, "REPLICAS": ["replica_0"], "LAG_CHECK_SECONDS": 3600}
+        user = user_factory(password="test_password12345")
+
+        with caplog.at_level(logging.DEBUG, logger="django.request"):
+            response = async_to_sync(AsyncClient().post)(
+                "/api/v1/auth/login/async",
+                {"login_id": user.username, "password": "test_password12345"},
+                content_type="application/json",
+            )
+
+        assert response.status_code == 200
+        assert "Server-Timing" in response
+        assert [record.message for record in caplog.records if "adapted" in record.message] == []
+
+    def test_login_with_username_success(self, user_factory: UserFactory, db) -> None:
+        """Tests successful async login using username."""
+
+        user = user_factory(password="test_password12345", failed_login_attempts=2)
+
+        response = self.post({"login_id": user.username, "password": "test_password12345"})
+
+        assert response.status_code == 200
+        assert response.json()["user"]["id"] == str(user.id)
+
+        user.refresh_from_db()
+        assert user.failed_login_attempts == 0
+        assert user.last_login is not None
+
+    def test_login_wrong_password(self, user_factory: UserFactory, db) -> None:
+        """Test async login with incorrect password counts the failure."""
+
+        user = user_factory(password="test_password12345")
+
+        response = self.post({"login_id": user.email, "password": "wrong_password12345"})
+
+        assert response.status_code == 401
+        assert response.json()["message"] == "Invalid credentials."
+
+        user.refresh_from_db()
+        assert user.failed_login_attempts == 1
+
+    def test_login_nonexistent_user(self, db) -> None:
+        """Test async login with non-existent user."""
+
+        response = self.post({"login_id": "UserNonExistent", "password": "test_password12345"})
+
+        assert response.status_code == 401
+
+    def test_login_username_variant_spends_a_hash(self, user_factory: UserFactory, db) -> None:
+        """Test async login with a case variant of the username costs the hashing work of a wrong password."""
+
+        user = user_factory(password="test_password12345")
+        completed = get_password_hash_pool().stats()["completed"]
+
+        response = self.post({"login_id": user.username.upper(), "password": "test_password12345"})
+
+        assert response.status_code == 401
+        assert get_password_hash_pool().stats()["completed"] == completed + 1
+
+    def test_login_with_locked_account(self, user_factory: UserFactory, db) -> None:
+        """Async login test with locked account."""
+
+        user = user_factory(
+            password="test_password12345",
+            account_locked_until=timezone.now() + timedelta(minutes=30),
+        )
+
+        response = self.post({"login_id": user.username, "password": "test_password12345"})
+
+        assert response.status_code == 403
+        assert response.json()["message"] == "Account temporarily locked."
+
+    def test_lock_at_threshold_follows_the_tiers(self, user_factory: UserFactory, db) -> None:
+        """Async login test with an account over the threshold, locked for its tier."""
+
+        user = user_factory(password="test_password12345", failed_login_attempts=7)
+
+        response = self.post({"login_id": user.username, "password": "test_password12345"})
+
+        assert response.status_code == 429
+        user.refresh_from_db()
+        assert user.failed_login_attempts == 8
+        assert user.account_locked_until > timezone.now() + timedelta(minutes=lock_minutes_for(6))
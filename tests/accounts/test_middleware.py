@@ -0,0 +1,83 @@
+import json
+
+import pytest
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from app.accounts.middleware import RequestValidationMiddleware
+
+
+class TestRequestValidationMiddleware:
+    factory = RequestFactory()
+
+    def middleware(self) -> RequestValidationMiddleware:
+        return RequestValidationMiddleware(lambda request: HttpResponse("ok"))
+
+    @pytest.mark.parametrize(
+        "value",
+        ["<script>alert(1)</script>", "admin' --", "1 UNION SELECT password FROM users", "eval (payload)"],
+    )
+    def test_blocks_suspicious_query_string(self, value: str) -> None:
+        """Tests that every pattern is caught in query strings."""
+
+        response = self.middleware()(self.factory.get("/api/v1/stocks", {"q": ["ok", value]}))
+
+        assert response.status_code == 403
+
+    def test_blocks_suspicious_json_body(self) -> None:
+        """Tests that nested JSON values and keys are scanned."""
+
+        middleware = self.middleware()
+        body = {"login_id": "user", "items": [{"note": "<SCRIPT src=x>"}]}
+        request = self.factory.post("/api/v1/auth/login", json.dumps(body), content_type="application/json")
+
+        assert middleware(request).status_code == 403
+
+        body = {"login_id": "user", "items": [{"<script>": "note"}]}
+        request = self.factory.post("/api/v1/auth/login", json.dumps(body), content_type="application/json")
+
+        assert middleware(request).status_code == 403
+
+    @pytest.mark.parametrize("content_type", ["text/plain", "application/x-www-form-urlencoded", ""])
+    def test_blocks_json_body_of_any_content_type(self, content_type: str) -> None:
+        """Tests that JSON bodies are scanned whatever their Content-Type, as the API decodes them regardless."""
+
+        body = {"login_id": "admin' --", "password": "test_password12345"}
+        request = self.factory.post("/api/v1/auth/login", json.dumps(body), content_type=content_type)
+
+        assert self.middleware()(request).status_code == 403
+
+    def test_blocks_suspicious_form_body(self) -> None:
+        """Tests that form fields are still scanned."""
+
+        request = self.factory.post("/admin/login/", {"username": "<script>alert(1)</script>"})
+
+        assert self.middleware()(request).status_code == 403
+
+    def test_skips_password_fields(self) -> None:
+        """Tests that passwords are never scanned in JSON or form bodies."""
+
+        middleware = self.middleware()
+        body = {"login_id": "user", "password": "my-secret--"}
+        request = self.factory.post("/api/v1/auth/login", json.dumps(body), content_type="application/json")
+
+        assert middleware(request).status_code == 200
+        assert middleware(self.factory.post("/admin/login/", body)).status_code == 200
+
+    def test_rejects_oversized_body(self, settings) -> None:
+        """Tests that bodies over the cap get 413 without being parsed."""
+
+        settings.REQUEST_VALIDATION = {**settings.REQUEST_VALIDATION, "MAX_BODY_BYTES": 32}
+        body = json.dumps({"login_id": "x" * 64})
+        request = self.factory.post("/api/v1/auth/login", body, content_type="application/json")
+
+        assert self.middleware()(request).status_code == 413
+
+    def test_excluded_paths_are_not_scanned(self, settings) -> None:
+        """Tests that routes can be excluded by path prefix."""
+
+        settings.REQUEST_VALIDATION = {**settings.REQUEST_VALIDATION, "EXCLUDE_PATHS": ["/api/v1/webhooks/"]}
+        middleware = self.middleware()
+
+        assert middleware(self.factory.get("/api/v1/webhooks/x", {"q": "<script>"})).status_code == 200
+        assert middleware(self.factory.get("/api/v1/stocks", {"q": "<script>"})).status_code == 403
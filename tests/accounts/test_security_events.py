@@ -0,0 +1,92 @@
+import atexit
+import os
+
+import pytest  # noqa F401
+
+from app.accounts.audit import get_security_event_buffer
+from app.accounts.models import SecurityEvent
+from tests.factories import UserFactory
+from tests.utils import NinjaSessionClient
+
+
+class TestSecurityEvents:
+    def test_events_are_buffered_and_bulk_inserted(
+        self, db, security_events: dict, settings, django_assert_num_queries
+    ) -> None:
+        """Tests that recording makes no query and a flush is a single INSERT."""
+
+        settings.SECURITY_EVENTS = {**security_events, "ENABLED": True}
+        events = get_security_event_buffer()
+
+        with django_assert_num_queries(0):
+            for i in range(3):
+                events.record(SecurityEvent.EventType.LOGIN_FAILURE, username=f"user{i}", ip="10.0.0.1")
+            events.record(SecurityEvent.EventType.LOGIN_FAILURE, username="user3", ip="N/A")
+
+        with django_assert_num_queries(1):
+            assert events.flush() == 4
+
+        assert SecurityEvent.objects.filter(ip="10.0.0.1").count() == 3
+        assert SecurityEvent.objects.get(username="user3").ip is None
+
+    def test_new_buffers_install_no_process_hooks(self, security_events: dict, settings, monkeypatch) -> None:
+        """Tests that rebuilding the buffer does not add exit or fork hooks."""
+
+        hooks = []
+        monkeypatch.setattr(atexit, "register", lambda *args, **kwargs: hooks.append(args))
+        monkeypatch.setattr(os, "register_at_fork", lambda **kwargs: hooks.append(kwargs))
+
+        for flush_seconds in (60, 120):
+            settings.SECURITY_EVENTS = {**security_events, "FLUSH_SECONDS": flush_seconds}
+            assert get_security_event_buffer().flush_seconds == flush_seconds
+
+        assert hooks == []
+
+    def test_failed_login_records_event(
+        self,
+        ninja_session_client: NinjaSessionClient,
+        user_factory: UserFactory,
+        security_events: dict,
+        settings,
+    ) -> None:
+        """Tests that a wrong password is stored as a login failure event, from the client's IP behind a proxy."""
+
+        settings.SECURITY_EVENTS = {**security_events, "ENABLED": True}
+        settings.TRUSTED_PROXY_COUNT = 1
+        user = user_factory(password="test_password12345")
+
+        response = ninja_session_client.post(
+            "/login",
+            json={"login_id": user.username, "password": "wrong_password12345"},
+            headers={"X-Forwarded-For": "203.0.113.7"},
+        )
+        get_security_event_buffer().flush()
+
+        assert response.status_code == 401
+        event = SecurityEvent.objects.get()
+        assert event.event_type == SecurityEvent.EventType.LOGIN_FAILURE
+        assert event.username == user.username
+        assert event.ip == "203.0.113.7"
+
+    def test_lockout_of_the_login_api_records_event(
+        self,
+        ninja_session_client: NinjaSessionClient,
+        user_factory: UserFactory,
+        security_events: dict,
+        settings,
+    ) -> None:
+        """Tests that an account locked by the login API on reaching the threshold is stored as a lockout event."""
+
+        settings.SECURITY_EVENTS = {**security_events, "ENABLED": True}
+        user = user_factory(password="test_password12345", failed_login_attempts=5)
+
+        response = ninja_session_client.post(
+            "/login", json={"login_id": user.username, "password": "test_password12345"}
+        )
+        get_security_event_buffer().flush()
+
+        assert response.status_code == 429
+        event = SecurityEvent.objects.get()
+        assert event.event_type == SecurityEvent.EventType.ACCOUNT_LOCKED
+        assert event.username == user.username
+        assert event.ip == "127.0.0.1"
@@ -1,9 +1,15 @@
+from datetime import timedelta
+
 import pytest
 from django.contrib.messages.middleware import MessageMiddleware
 from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.exceptions import ValidationError
+from django.db import connection
 from django.db.utils import IntegrityError
 from django.http import HttpRequest
 from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
 from app.accounts.backends import EmailOrUsernameModelBackend
 from app.accounts.models import User
@@ -122,3 +128,79 @@ class TestUser:
             password=password,
         )
         assert authenticated_superuser is None
+
+    def test_lookup_keys_are_maintained_on_save(self, user_factory: UserFactory, db):
+        """Test that the canonical lookup keys follow email and username changes."""
+        user = user_factory(username="CommonUser", email="Common.User@Example.com")
+
+        assert user.username_key == "commonuser"
+        assert user.email_key == "common.user@example.com"
+
+        user.username = "Ｒenamed"  # fullwidth R is NFKC normalized
+        user.save(update_fields=["username"])
+        user.refresh_from_db()
+
+        assert user.username_key == "renamed"
+
+    def test_username_key_uniqueness(self, user_factory: UserFactory, db):
+        """Test that usernames differing only in case cannot coexist."""
+        user_factory(username="commonuser")
+        user2 = user_factory.build(username="COMMONUSER")
+        with pytest.raises(IntegrityError):
+            user2.save()
+
+    def test_expanding_username_fits_its_key(self, user_factory: UserFactory, db):
+        """Test that a username growing when normalized still saves, and one growing past the key is rejected."""
+        user = user_factory(username="ß" * 150, email="expanding@example.com")
+        user.full_clean()
+        user.refresh_from_db()
+
+        assert user.username_key == "ss" * 150
+
+        # U+FDFA is a single character that NFKC expands to 18.
+        user.username = "\ufdfa" * 30
+        with pytest.raises(ValidationError, match="too long once normalized"):
+            user.full_clean()
+
+    def test_record_failed_login_is_a_single_statement(self, new_user: User, db):
+        """Test that a failed login is counted with one UPDATE ... RETURNING."""
+        with CaptureQueriesContext(connection) as queries:
+            lock_minutes = new_user.record_failed_login()
+
+        assert len(queries) == 1
+        assert queries[0]["sql"].startswith("UPDATE")
+        assert lock_minutes is None
+        assert new_user.failed_login_attempts == 1
+        assert new_user.last_failed_login is not None
+        assert new_user.account_locked_until is None
+
+    def test_record_failed_login_counts_from_stored_value(self, new_user: User, db):
+        """Test that the increment uses the row's value, not a stale instance."""
+        stale = User.objects.get(pk=new_user.pk)
+        new_user.record_failed_login()
+        stale.record_failed_login()
+
+        assert stale.failed_login_attempts == 2
+        assert User.objects.get(pk=new_user.pk).failed_login_attempts == 2
+
+    @pytest.mark.parametrize(
+        ("previous_attempts", "expected_minutes"),
+        [(4, None), (5, 5), (6, 10), (9, 25), (10, 30), (42, 30)],
+    )
+    def test_record_failed_login_lock_window(
+        self, new_user: User, previous_attempts: int, expected_minutes, db
+    ):
+        """Test the lock decision and window computed by the database."""
+        User.objects.filter(pk=new_user.pk).update(failed_login_attempts=previous_attempts)
+        new_user.refresh_from_db()
+
+        before = timezone.now()
+        lock_minutes = new_user.record_failed_login()
+
+        assert lock_minutes == expected_minutes
+        assert new_user.failed_login_attempts == previous_attempts + 1
+        if expected_minutes is None:
+            assert new_user.account_locked_until is None
+        else:
+            assert new_user.account_locked_until >= before + timedelta(minutes=expected_minutes)
+            assert new_user.account_locked_until <= timezone.now() + timedelta(minutes=expected_minutes)
@@ -0,0 +1,107 @@
+import pytest
+from django.contrib.auth.hashers import make_password
+
+from app.accounts.backends import EmailOrUsernameModelBackend
+from app.accounts.hashing import get_password_rehash_queue
+from app.accounts.user_cache import UserCache, get_user_cache
+from app.metrics import CACHE_LOOKUPS
+from app.replicas import get_replica_monitor
+from tests.factories import UserFactory
+from tests.utils import assert_query_budget
+
+
+@pytest.fixture
+def user_cache(settings):
+    settings.USER_CACHE = {"ENABLED": True, "MAX_ENTRIES": 100, "TIMEOUT": 300}
+    return settings.USER_CACHE
+
+
+def lookups(result: str) -> float:
+    return CACHE_LOOKUPS.labels(cache="user", result=result)._value.get()
+
+
+class TestUserCache:
+    def test_warm_lookup_runs_no_query(self, user_cache: dict, user_factory: UserFactory, db) -> None:
+        """Tests that only the first get_user of an account reaches the database."""
+
+        user = user_factory()
+        backend = EmailOrUsernameModelBackend()
+        hits, misses = lookups("hit"), lookups("miss")
+
+        with assert_query_budget(1, "cold get_user"):
+            assert backend.get_user(user.pk) == user
+        with assert_query_budget(0, "warm get_user"):
+            cached = backend.get_user(user.pk)
+
+        assert cached.username == user.username
+        assert cached is not backend.get_user(user.pk)
+        assert (lookups("hit") - hits, lookups("miss") - misses) == (2, 1)
+
+    def test_save_and_delete_invalidate(self, user_cache: dict, user_factory: UserFactory, db) -> None:
+        """Tests that post_save and post_delete drop the cached user."""
+
+        user = user_factory(first_name="Before")
+        get_user_cache().get(user.pk)
+
+        user.first_name = "After"
+        user.save(update_fields=["first_name"])
+        assert get_user_cache().get(user.pk).first_name == "After"
+
+        user.delete()
+        assert get_user_cache().get(user.pk) is None
+
+    def test_misses_read_the_primary(self, user_cache: dict, user_factory: UserFactory, settings, db) -> None:
+        """Tests that a miss never fills the cache from a replica, which may not have the invalidating write yet."""
+
+        settings.REPLICA_ROUTING = {"REPLICAS": ["replica_0"], "MAX_LAG_SECONDS": 10.0, "LAG_CHECK_SECONDS": 3600}
+        get_replica_monitor().record_lag("replica_0", 0.5)
+        user = user_factory()
+
+        assert get_user_cache().get(user.pk)._state.db == "default"
+
+    def test_failed_login_counter_update_invalidates(self, user_cache: dict, user_factory: UserFactory, db) -> None:
+        """Tests that the UPDATE ... RETURNING of a failed login, which sends no signal, drops the cached user."""
+
+        user = user_factory()
+        get_user_cache().get(user.pk)
+
+        user.record_failed_login()
+
+        assert get_user_cache().get(user.pk).failed_login_attempts == 1
+
+    def test_deferred_rehash_invalidates(self, user_cache: dict, user_factory: UserFactory, transactional_db) -> None:
+        """Tests that the rehash queue's QuerySet.update() drops the cached user."""
+
+        user = user_factory(password="test_password12345")
+        get_user_cache().get(user.pk)
+
+        queue = get_password_rehash_queue()
+        queue.schedule(user.pk, make_password("test_password12345"), user.password)
+        queue.join()
+
+        assert get_user_cache().get(user.pk).password != user.password
+
+    def test_invalidation_reaches_other_workers(self, user_cache: dict, user_factory: UserFactory, db) -> None:
+        """Tests that a version bump in one process makes the others miss."""
+
+        user = user_factory()
+        worker, other_worker = UserCache(), UserCache()
+        worker.get(user.pk)
+
+        type(user).objects.filter(pk=user.pk).update(password=make_password("another_password_12345"))
+        other_worker.invalidate(user.pk)
+
+        with assert_query_budget(1, "lookup after invalidation"):
+            assert worker.get(user.pk).password != user.password
+
+    def test_local_entries_are_bounded(self, user_factory: UserFactory, db) -> None:
+        """Tests that the per-process LRU evicts the least recently used user."""
+
+        users = user_factory.create_batch(3)
+        cache = UserCache(max_entries=2)
+        for user in users:
+            cache.get(user.pk)
+        cache.get(users[1].pk)
+        cache.get(users[2].pk)
+
+        assert list(cache._entries) == [str(users[1].pk), str(users[2].pk)]
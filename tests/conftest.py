@@ -1,30 +1,110 @@
+import copy
+
 import pytest
-from django.conf import settings
+from django.test.utils import override_settings
 from pytest_factoryboy import register
 
+# The URLconf adds auth_router to the project API, which fails once a ninja
+# test client has attached the router to its own: load it first.
+import app.urls  # noqa: F401
 from app.accounts.api import auth_router
 from tests.factories import SuperUserFactory, UserFactory
-from tests.utils import NinjaSessionClient
+from tests.utils import NinjaSessionClient, assert_query_budget
 
 register(UserFactory)
 register(SuperUserFactory)
 
+USER_POOL_SIZE = 20
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--full-hashing",
+        action="store_true",
+        help="Hash passwords with the production PBKDF2 cost instead of the fast test setting.",
+    )
+
+
+@pytest.fixture(scope="session", autouse=True)
+def fast_password_hashing(request):
+    """
+    Hash with a single PBKDF2 iteration for the whole session. Hashes keep
+    the production format, so tests that change the iteration count still
+    see upgrades. ``--full-hashing`` restores the production cost.
+    """
+    if request.config.getoption("--full-hashing"):
+        yield
+        return
+
+    with override_settings(PASSWORD_HASH_ITERATIONS=1):
+        yield
+
 
 @pytest.fixture(scope="session")
-def django_db_setup():
-    settings.DATABASES["default"] = {
-        "ENGINE": "django.db.backends.postgresql",
-        "HOST": "test_django_db",
-        "NAME": "test_djangodb",
-        "PASSWORD": "TestDjangoDB",
-        "USER": "test_django",
-        "PORT": 5432,
+def user_pool(fast_password_hashing, django_db_setup, django_db_blocker):
+    """
+    Users inserted once per session with the factory default password.
+
+    pytest-django's django_db_setup creates a test database per xdist worker
+    (``test_<name>_gw0``, ...), so each worker seeds its own pool. Use the
+    copies from ``pooled_users``: changes made in ``db`` tests are rolled
+    back, but transactional tests flush the table and must not use the pool.
+    """
+    with django_db_blocker.unblock():
+        users = UserFactory.create_bulk(USER_POOL_SIZE)
+    yield users
+    with django_db_blocker.unblock():
+        UserFactory._meta.model.objects.filter(pk__in=[user.pk for user in users]).delete()
+
+
+@pytest.fixture
+def pooled_users(db, user_pool):
+    """Copies of the session's pre-seeded users, free to modify within a test."""
+    return copy.deepcopy(user_pool)
+
+
+@pytest.fixture(autouse=True)
+def login_rate_limit(settings):
+    """Give each test a fresh in-memory login rate limiter."""
+    settings.LOGIN_RATE_LIMIT = {
+        **settings.LOGIN_RATE_LIMIT,
+        "BACKEND": "app.accounts.ratelimit.InMemorySlidingWindowRateLimiter",
+        "OPTIONS": {},
     }
+    return settings.LOGIN_RATE_LIMIT
+
+
+@pytest.fixture(autouse=True)
+def login_id_filter(settings):
+    """Keep the login id filter off unless a test builds it explicitly, then over the per-process test cache."""
+    settings.LOGIN_ID_FILTER = {**settings.LOGIN_ID_FILTER, "ENABLED": False, "SINGLE_PROCESS": True}
+    return settings.LOGIN_ID_FILTER
+
+
+@pytest.fixture(autouse=True)
+def security_events(settings):
+    """Keep the security event buffer off; tests that enable it flush explicitly."""
+    settings.SECURITY_EVENTS = {**settings.SECURITY_EVENTS, "ENABLED": False, "FLUSH_SECONDS": 3600}
+    return settings.SECURITY_EVENTS
+
+
+@pytest.fixture(autouse=True)
+def user_cache(settings):
+    """Keep the user cache off; the shared cache outlives each test's rolled back rows."""
+    settings.USER_CACHE = {**settings.USER_CACHE, "ENABLED": False}
+    return settings.USER_CACHE
+
+
+@pytest.fixture(autouse=True)
+def slow_query_log(settings):
+    """Keep the slow query log off unless a test enables it."""
+    settings.SLOW_QUERY_LOG = {**settings.SLOW_QUERY_LOG, "ENABLED": False}
+    return settings.SLOW_QUERY_LOG
 
 
 @pytest.fixture
-def new_user(db, user_factory):
-    return user_factory()
+def new_user(pooled_users):
+    return pooled_users[0]
 
 
 @pytest.fixture
@@ -38,12 +118,22 @@ def ninja_session_client(db):
     return NinjaSessionClient(auth_router)
 
 
+@pytest.fixture
+def query_budget(db):
+    """
+    Context manager that fails the test when a block exceeds its query
+    budget, printing the SQL it ran::
+
+        with query_budget(3, "login"):
+            ninja_session_client.post("/login", json=data)
+    """
+    return assert_query_budget
+
+
 @pytest.fixture
 def authenticated_client(ninja_session_client, user_factory):
     """Fixture that provides an authenticated client with a user."""
-    user = user_factory()
-    user.set_password("test_password12345")
-    user.save()
+    user = user_factory(password="test_password12345")
 
     response = ninja_session_client.post(
         "/login", json={"login_id": user.username, "password": "test_password12345"}
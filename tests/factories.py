@@ -7,6 +7,7 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.hashers import make_password
 from faker import Faker
 
+from app.accounts.models import canonical_login_key
 from app.logs import get_logger
 
 User = get_user_model()
@@ -20,22 +21,31 @@ class BaseUserFactory(factory.django.DjangoModelFactory):
     class Meta:
         model = User
         abstract = True
-        django_get_or_create = (
-            "username",
-            "email",
-        )
 
     username = factory.Sequence(lambda n: f"user{n}")
-    email = factory.Faker("email")
+    # Derived from the unique username, so plain creates never collide.
+    email = factory.LazyAttribute(lambda user: f"{user.username}@example.com")
     first_name = factory.Faker("first_name")
     last_name = factory.Faker("last_name")
     is_active = True
-
-    @factory.post_generation
-    def password(self, create, extracted, **kwargs):
-        self.password = make_password(extracted or "password123")
-        if create:
-            self.save()
+    # Hashed while the instance is built, so create() saves only once.
+    password = factory.django.Password("password123")
+
+    @classmethod
+    def create_bulk(cls, size: int, password: str = "password123", **kwargs) -> list:
+        """
+        Insert ``size`` users with a single bulk_create and a single password hash.
+
+        save() is not called: the lookup keys are filled in here and post_save
+        receivers (e.g. the login id filter) do not run.
+        """
+        encoded = factory.django.Password.Force(make_password(password))
+        users = cls.build_batch(size, password=encoded, **kwargs)
+        for user in users:
+            user.email = user.email.lower()
+            user.email_key = canonical_login_key(user.email)
+            user.username_key = canonical_login_key(user.username)
+        return User.objects.bulk_create(users)
 
 
 class UserFactory(BaseUserFactory):
@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.recorder import MigrationRecorder
+
+from app.accounts.backends import EmailOrUsernameModelBackend
+from app.accounts.management.commands import migrate_if_needed
+from app.db import disk_migrations, prepared_statements, unapplied_migrations, uses_prepared_statements
+
+
+def postgres(**options) -> SimpleNamespace:
+    return SimpleNamespace(vendor="postgresql", settings_dict={"OPTIONS": options})
+
+
+class TestPreparedStatements:
+    @pytest.mark.parametrize(
+        ("wrapper", "expected"),
+        [
+            (postgres(server_side_binding=True, prepare_threshold=5), True),
+            (postgres(server_side_binding=True, prepare_threshold=None), False),
+            (postgres(prepare_threshold=5), False),
+            (postgres(), False),
+            (SimpleNamespace(vendor="sqlite", settings_dict={"OPTIONS": {"server_side_binding": True}}), False),
+        ],
+    )
+    def test_only_server_side_binding_with_a_threshold_prepares(self, wrapper, expected: bool) -> None:
+        """Tests that client-side binding and PgBouncer mode (no threshold) never prepare."""
+
+        assert bool(uses_prepared_statements(wrapper)) is expected
+
+    def test_other_databases_run_the_block_unchanged(self, db, new_user) -> None:
+        """Tests that the login lookup still resolves accounts where statements cannot be prepared."""
+
+        with prepared_statements():
+            assert connection.vendor != "postgresql" or not uses_prepared_statements(connection)
+
+        assert EmailOrUsernameModelBackend().resolve_user(new_user.email) == new_user
+
+
+class TestUnappliedMigrations:
+    def test_migrated_database_skips_migrate(self, db, monkeypatch, capsys) -> None:
+        """Tests that a database holding every migration on disk is not migrated again."""
+
+        calls = []
+        monkeypatch.setattr(migrate_if_needed, "call_command", lambda *args, **kwargs: calls.append(args))
+
+        call_command("migrate_if_needed")
+
+        assert ("accounts", "0001_initial") in disk_migrations()
+        assert unapplied_migrations() == []
+        assert calls == []
+        assert "skipped" in capsys.readouterr().out
+
+    def test_missing_record_runs_migrate(self, db, monkeypatch) -> None:
+        """Tests that a migration the database has no record of triggers migrate."""
+
+        calls = []
+        monkeypatch.setattr(migrate_if_needed, "call_command", lambda *args, **kwargs: calls.append(args))
+        MigrationRecorder(connection).record_unapplied("accounts", "0001_initial")
+
+        call_command("migrate_if_needed")
+
+        assert unapplied_migrations() == [("accounts", "0001_initial")]
+        assert calls == [("migrate",)]
@@ -0,0 +1,134 @@
+import gzip
+import io
+import json
+import logging
+import logging.handlers
+import queue
+
+from app.logs import (
+    BatchingQueueListener,
+    BoundedQueueHandler,
+    CompressedRotatingFileHandler,
+    JsonFormatter,
+    enable_queue_logging,
+    get_event_logger,
+)
+
+
+class TestQueueLogging:
+    def test_records_are_written_by_the_listener(self) -> None:
+        """Tests that queued records reach the original handlers, in order, on stop."""
+
+        stream = io.StringIO()
+        logger = logging.getLogger("tests.queue_logging")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        logger.addHandler(logging.StreamHandler(stream))
+
+        listener = enable_queue_logging("tests.queue_logging", batch_size=3)
+        assert enable_queue_logging("tests.queue_logging") is listener
+
+        for i in range(10):
+            logger.info("event %s", i)
+        listener.stop()
+
+        assert stream.getvalue().splitlines() == [f"event {i}" for i in range(10)]
+
+    def test_file_handler_subclasses_are_batched(self, tmp_path) -> None:
+        """Tests that rotating and watched files get one write per batch, with rotation checked per batch."""
+
+        rotating = CompressedRotatingFileHandler(tmp_path / "rotating.log", maxBytes=64, backupCount=2)
+        watched = logging.handlers.WatchedFileHandler(tmp_path / "watched.log")
+        listener = BatchingQueueListener(queue.Queue(), rotating, watched)
+        records = [logging.makeLogRecord({"msg": f"event {i} " + "x" * 40, "levelno": logging.INFO}) for i in range(3)]
+
+        listener.handle_batch(records)
+        (tmp_path / "watched.log").rename(tmp_path / "watched.log.1")
+        listener.handle_batch(records)
+        rotating.close()
+        watched.close()
+
+        # The whole first batch went into one file before the rollover.
+        with gzip.open(tmp_path / "rotating.log.1.gz", "rt") as rotated:
+            assert len(rotated.read().splitlines()) == 3
+        assert len((tmp_path / "rotating.log").read_text().splitlines()) == 3
+        assert len((tmp_path / "watched.log.1").read_text().splitlines()) == 3
+        assert len((tmp_path / "watched.log").read_text().splitlines()) == 3
+
+    def test_full_queue_drops_records(self) -> None:
+        """Tests that the drop policy never blocks and counts what it discards."""
+
+        handler = BoundedQueueHandler(queue.Queue(maxsize=1), policy="drop")
+        logger = logging.getLogger("tests.queue_logging_drop")
+        logger.propagate = False
+        logger.addHandler(handler)
+
+        for i in range(3):
+            logger.warning("event %s", i)
+
+        assert handler.queue.qsize() == 1
+        assert handler.take_dropped() == 2
+        assert handler.take_dropped() == 0
+
+
+class TestEventLogger:
+    def test_events_are_written_as_json_lines(self) -> None:
+        """Tests that typed and extra fields become keys of one JSON object per line."""
+
+        stream = io.StringIO()
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(JsonFormatter())
+        logger = logging.getLogger("tests.events_json")
+        logger.propagate = False
+        logger.addHandler(handler)
+        events = get_event_logger("tests.events_json")
+
+        events.warning(
+            "Account temporarily blocked: %s for %s minutes",
+            "alice",
+            5,
+            event="account_locked",
+            username="alice",
+            lock_minutes=5,
+            failed_login_attempts=6,
+        )
+
+        data = json.loads(stream.getvalue())
+        assert data["message"] == "Account temporarily blocked: alice for 5 minutes"
+        assert data["event"] == "account_locked"
+        assert data["username"] == "alice"
+        assert data["lock_minutes"] == 5
+        assert data["failed_login_attempts"] == 6
+        assert "ip" not in data
+
+    def test_filtered_events_are_not_formatted(self) -> None:
+        """Tests that arguments are never rendered when the level is disabled."""
+
+        class Unrenderable:
+            def __str__(self) -> str:
+                raise AssertionError("formatted a filtered record")
+
+        logger = logging.getLogger("tests.events_lazy")
+        logger.propagate = False
+        logger.addHandler(logging.NullHandler())
+        logger.setLevel(logging.WARNING)
+
+        get_event_logger("tests.events_lazy").info("value %s", Unrenderable(), event="noise")
+
+    def test_security_file_is_rotated_externally(self, settings) -> None:
+        """Tests that worker processes only append to the security log, never rotate it themselves."""
+
+        assert settings.LOGGING["handlers"]["security_file"]["class"] == "logging.handlers.WatchedFileHandler"
+
+    def test_rotated_files_are_compressed(self, tmp_path) -> None:
+        """Tests that size based rotation gzips the rotated file."""
+
+        path = tmp_path / "security.log"
+        handler = CompressedRotatingFileHandler(path, maxBytes=64, backupCount=2)
+        for i in range(5):
+            handler.emit(logging.makeLogRecord({"msg": f"event {i} " + "x" * 40, "levelno": logging.INFO}))
+        handler.close()
+
+        with gzip.open(f"{path}.1.gz", "rt") as rotated:
+            assert rotated.read().startswith("event")
+        assert not (tmp_path / "security.log.1").exists()
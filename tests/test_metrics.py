@@ -0,0 +1,88 @@
+import subprocess
+import sys
+
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.urls import ResolverMatch
+from prometheus_client import REGISTRY, CollectorRegistry, generate_latest
+from prometheus_client.multiprocess import MultiProcessCollector
+
+from app.api import metrics
+from app.metrics import MetricsMiddleware
+
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def login_view(request):
+    request.resolver_match = ResolverMatch(login_view, (), {}, url_name="auth-login", route="api/v1/auth/login")
+    get_user_model().objects.count()
+    get_user_model().objects.count()
+    return HttpResponse(status=401)
+
+
+class TestMetricsMiddleware:
+    def test_login_request_is_measured(self, db) -> None:
+        """Tests that a login records its latency by status and its queries by route."""
+
+        latency = sample("login_request_duration_seconds_count", outcome="401")
+        queries = sample("db_queries_per_request_sum", route="api/v1/auth/login")
+
+        MetricsMiddleware(login_view)(RequestFactory().post("/api/v1/auth/login"))
+
+        assert sample("login_request_duration_seconds_count", outcome="401") == latency + 1
+        assert sample("db_queries_per_request_sum", route="api/v1/auth/login") == queries + 2
+
+    def test_unresolved_request_is_not_a_login(self) -> None:
+        """Tests that requests without a route are grouped and not timed as logins."""
+
+        unmatched = sample("db_queries_per_request_count", route="unmatched")
+
+        MetricsMiddleware(lambda request: HttpResponse(status=404))(RequestFactory().get("/missing"))
+
+        assert sample("db_queries_per_request_count", route="unmatched") == unmatched + 1
+
+
+class TestMetricsEndpoint:
+    def test_exposes_prometheus_text(self, settings) -> None:
+        """Tests that the scrape returns the login metrics in the text format."""
+
+        settings.METRICS = {"TOKEN": "", "PUBLIC": True}
+
+        response = metrics(RequestFactory().get("/api/v1/metrics"))
+
+        assert response.status_code == 200
+        assert response["Content-Type"].startswith("text/plain")
+        assert b"# TYPE login_request_duration_seconds histogram" in response.content
+        assert b"# TYPE account_lockouts_total counter" in response.content
+
+    def test_token_is_required_when_configured(self, settings) -> None:
+        """Tests that a configured token rejects scrapes without the bearer header."""
+
+        settings.METRICS = {"TOKEN": "secret"}
+        factory = RequestFactory()
+
+        assert metrics(factory.get("/api/v1/metrics")).status_code == 401
+        assert metrics(factory.get("/api/v1/metrics", HTTP_AUTHORIZATION="Bearer secret")).status_code == 200
+
+    def test_not_served_without_a_token(self, settings) -> None:
+        """Tests that the endpoint is hidden when no token is configured and it is not public."""
+
+        settings.METRICS = {"TOKEN": "", "PUBLIC": False}
+
+        assert metrics(RequestFactory().get("/api/v1/metrics")).status_code == 404
+
+    def test_counters_are_summed_across_processes(self, tmp_path) -> None:
+        """Tests that samples of separate worker processes add up in one scrape."""
+
+        script = "from app.metrics import ACCOUNT_LOCKOUTS; ACCOUNT_LOCKOUTS.inc(2)"
+        env = {"PROMETHEUS_MULTIPROC_DIR": str(tmp_path), "PYTHONPATH": "."}
+        for _ in range(3):
+            subprocess.run([sys.executable, "-c", script], env=env, check=True)
+
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry, path=str(tmp_path))
+
+        assert b"account_lockouts_total 6.0" in generate_latest(registry)
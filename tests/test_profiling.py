@@ -0,0 +1,87 @@
+import pstats
+import time
+
+import pytest
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.urls import ResolverMatch
+
+from app.profiling import RequestProfilingMiddleware, make_profile_token
+
+
+def login_view(request):
+    request.resolver_match = ResolverMatch(login_view, (), {}, url_name="auth-login", route="api/v1/auth/login")
+    sum(i * i for i in range(20_000))
+    return HttpResponse("ok")
+
+
+@pytest.fixture
+def profiling(settings, tmp_path):
+    settings.REQUEST_PROFILING = {
+        "ENABLED": True,
+        "SAMPLE_RATE": 0.0,
+        "PROFILER": "deterministic",
+        "TOKEN_MAX_AGE": 60,
+        "DIRECTORY": str(tmp_path / "profiles"),
+    }
+    return settings.REQUEST_PROFILING
+
+
+class TestRequestProfiling:
+    def test_signed_header_writes_pstats(self, profiling: dict, tmp_path) -> None:
+        """Tests that a request with a valid token is profiled into a file named by route and request id."""
+
+        request = RequestFactory().post(
+            "/api/v1/auth/login", HTTP_X_PROFILE_REQUEST=make_profile_token(), HTTP_X_REQUEST_ID="abc-123"
+        )
+
+        response = RequestProfilingMiddleware(login_view)(request)
+
+        assert response["X-Profile-Id"].endswith("_api_v1_auth_login_abc-123.pstats")
+        stats = pstats.Stats(str(tmp_path / "profiles" / response["X-Profile-Id"]))
+        assert any(function == "login_view" for _, _, function in stats.stats)
+
+    def test_unsigned_header_is_ignored(self, profiling: dict, tmp_path) -> None:
+        """Tests that a forged token neither profiles nor fails the request, nor creates the directory."""
+
+        request = RequestFactory().get("/api/v1/auth/login", HTTP_X_PROFILE_REQUEST="profile:forged:token")
+
+        response = RequestProfilingMiddleware(login_view)(request)
+
+        assert response.status_code == 200
+        assert "X-Profile-Id" not in response
+        assert not (tmp_path / "profiles").exists()
+
+    def test_sampled_request_writes_collapsed_stacks(self, profiling: dict, settings, tmp_path) -> None:
+        """Tests that the sampling profiler writes one counted stack per line."""
+
+        settings.REQUEST_PROFILING = {
+            **profiling,
+            "SAMPLE_RATE": 1.0,
+            "PROFILER": "sampling",
+            "SAMPLE_INTERVAL_MS": 0.1,
+        }
+
+        def slow_view(request):
+            deadline = time.perf_counter() + 0.1
+            while time.perf_counter() < deadline:
+                sum(i * i for i in range(1_000))
+            return HttpResponse("ok")
+
+        response = RequestProfilingMiddleware(slow_view)(RequestFactory().get("/"))
+
+        lines = (tmp_path / "profiles" / response["X-Profile-Id"]).read_text().splitlines()
+        assert response["X-Profile-Id"].startswith(tuple("0123456789"))
+        assert "_unmatched_" in response["X-Profile-Id"]
+        stacks = dict(line.rsplit(" ", 1) for line in lines)
+        assert any("slow_view" in stack for stack in stacks)
+        assert all(int(count) >= 1 for count in stacks.values())
+
+    def test_disabled_profiling_is_removed_from_the_chain(self, profiling: dict, settings) -> None:
+        """Tests that disabled profiling costs nothing per request."""
+
+        settings.REQUEST_PROFILING = {**profiling, "ENABLED": False}
+
+        with pytest.raises(MiddlewareNotUsed):
+            RequestProfilingMiddleware(login_view)
@@ -0,0 +1,167 @@
+import math
+import threading
+import time
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import transaction
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from app.accounts.backends import EmailOrUsernameModelBackend
+from app.replicas import PIN_COOKIE, PrimaryReplicaRouter, ReplicaStickinessMiddleware, get_replica_monitor
+from tests.factories import UserFactory
+from tests.utils import NinjaSessionClient
+
+User = get_user_model()
+
+
+@pytest.fixture
+def replica_routing(settings):
+    settings.REPLICA_ROUTING = {
+        "REPLICAS": ["replica_0"],
+        "STICKY_SECONDS": 30,
+        "MAX_LAG_SECONDS": 10.0,
+        "LAG_CHECK_SECONDS": 3600,
+    }
+    get_replica_monitor().record_lag("replica_0", 0.5)
+    return settings.REPLICA_ROUTING
+
+
+def routed_read(request) -> HttpResponse:
+    return HttpResponse(PrimaryReplicaRouter().db_for_read(User))
+
+
+def routed_write(request) -> HttpResponse:
+    router = PrimaryReplicaRouter()
+    router.db_for_write(User)
+    return HttpResponse(router.db_for_read(User))
+
+
+class TestPrimaryReplicaRouter:
+    def test_reads_go_to_an_up_to_date_replica(self, replica_routing: dict) -> None:
+        """Tests that reads use the replica and writes the primary."""
+
+        router = PrimaryReplicaRouter()
+
+        assert router.db_for_read(User) == "replica_0"
+        assert router.db_for_write(User) == "default"
+
+    def test_login_reads_the_primary(
+        self, replica_routing: dict, ninja_session_client: NinjaSessionClient, user_factory: UserFactory
+    ) -> None:
+        """Tests that account lookups and lockout counters of logins never come from a lagging replica."""
+
+        user = user_factory(password="test_password12345")
+        backend = EmailOrUsernameModelBackend()
+
+        assert backend.resolve_user(user.email)._state.db == "default"
+        assert backend.authenticate(None, username=user.username, password="test_password12345") == user
+
+        response = ninja_session_client.post("/login", json={"login_id": user.email, "password": "wrong_password1"})
+
+        assert response.status_code == 401
+        assert User.objects.using("default").get(pk=user.pk).failed_login_attempts == 1
+
+    def test_failed_login_writes_the_primary(
+        self,
+        replica_routing: dict,
+        ninja_session_client: NinjaSessionClient,
+        user_factory: UserFactory,
+        transactional_db,
+    ) -> None:
+        """Tests that the failure counter of a login outside any transaction is written to the primary."""
+
+        user = user_factory(password="test_password12345")
+        data = {"login_id": user.email, "password": "wrong_password1"}
+
+        response = ReplicaStickinessMiddleware(lambda request: ninja_session_client.post("/login", json=data))(
+            RequestFactory().post("/login")
+        )
+
+        assert response.status_code == 401
+        assert PIN_COOKIE in response.cookies
+        assert User.objects.using("default").get(pk=user.pk).failed_login_attempts == 1
+
+    def test_lagging_replica_falls_back_to_the_primary(self, replica_routing: dict) -> None:
+        """Tests that a replica over MAX_LAG_SECONDS is skipped."""
+
+        get_replica_monitor().record_lag("replica_0", 60.0)
+
+        assert PrimaryReplicaRouter().db_for_read(User) == "default"
+
+    def test_unreachable_replica_falls_back_to_the_primary(self, replica_routing: dict, settings) -> None:
+        """Tests that a replica whose lag check fails counts as infinitely behind."""
+
+        monitor = get_replica_monitor()
+        monitor.record_lag("replica_0", monitor.measure("replica_0"))
+
+        assert PrimaryReplicaRouter().db_for_read(User) == "default"
+        assert monitor.lag("replica_0") == math.inf
+
+    def test_lag_is_measured_off_the_request_thread(self, replica_routing: dict, settings, monkeypatch) -> None:
+        """Tests that lookups only read the last measurement while a background thread measures."""
+
+        settings.REPLICA_ROUTING = {**replica_routing, "LAG_CHECK_SECONDS": 0.01}
+        monitor = get_replica_monitor()
+        measured = threading.Event()
+
+        def slow_measure(alias: str) -> float:
+            measured.set()
+            time.sleep(0.2)
+            return 0.5
+
+        monkeypatch.setattr(monitor, "measure", slow_measure)
+
+        started = time.monotonic()
+        assert PrimaryReplicaRouter().db_for_read(User) == "default"
+        assert time.monotonic() - started < 0.1
+
+        assert measured.wait(1)
+        deadline = time.monotonic() + 2
+        while monitor.lag("replica_0") == math.inf and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert PrimaryReplicaRouter().db_for_read(User) == "replica_0"
+
+    def test_reads_inside_transactions_stay_on_the_primary(self, replica_routing: dict, transactional_db) -> None:
+        """Tests that a transaction reads what it wrote."""
+
+        with transaction.atomic():
+            assert PrimaryReplicaRouter().db_for_read(User) == "default"
+
+        assert PrimaryReplicaRouter().db_for_read(User) == "replica_0"
+
+
+class TestReplicaStickiness:
+    def test_writing_request_reads_its_writes_and_pins_the_client(self, replica_routing: dict) -> None:
+        """Tests that after a write the request and the client's next ones read from the primary."""
+
+        response = ReplicaStickinessMiddleware(routed_write)(RequestFactory().post("/"))
+
+        assert response.content == b"default"
+        assert response.cookies[PIN_COOKIE]["max-age"] == 30
+
+        request = RequestFactory().get("/")
+        request.COOKIES[PIN_COOKIE] = response.cookies[PIN_COOKIE].value
+        assert ReplicaStickinessMiddleware(routed_read)(request).content == b"default"
+
+    def test_expired_or_invalid_pin_reads_from_the_replica(self, replica_routing: dict) -> None:
+        """Tests that the pin ends with its window and that read-only requests set none."""
+
+        for value in (str(int(time.time()) - 1), "not-a-time"):
+            request = RequestFactory().get("/")
+            request.COOKIES[PIN_COOKIE] = value
+
+            response = ReplicaStickinessMiddleware(routed_read)(request)
+
+            assert response.content == b"replica_0"
+            assert PIN_COOKIE not in response.cookies
+
+    def test_without_replicas_the_middleware_is_removed(self, replica_routing: dict, settings) -> None:
+        """Tests that single-database deployments pay nothing per request."""
+
+        settings.REPLICA_ROUTING = {**replica_routing, "REPLICAS": []}
+
+        with pytest.raises(MiddlewareNotUsed):
+            ReplicaStickinessMiddleware(routed_read)
@@ -0,0 +1,100 @@
+import time
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+
+from app.sessions import ACTIVITY_KEY, SessionStore, get_local_session_cache, get_session_write_behind
+
+
+@pytest.fixture
+def session_store(settings):
+    settings.SESSION_STORE = {
+        "L1_TTL": 60.0,
+        "L1_MAX_ENTRIES": 100,
+        "INVALIDATION_URL": "",
+        "ACTIVITY_SECONDS": 60,
+        "WRITE_BEHIND_SECONDS": 3600,
+    }
+    return settings.SESSION_STORE
+
+
+def login_session(user, **data) -> SessionStore:
+    session = SessionStore()
+    session.update({"_auth_user_id": str(user.pk), **data})
+    session.save()
+    return session
+
+
+class TestSessionStore:
+    def test_sessions_are_read_from_the_local_cache(self, session_store: dict, settings) -> None:
+        """Tests that a saved session is served by the L1 without reading the shared cache."""
+
+        session = SessionStore()
+        session["cart"] = [1, 2]
+        session.save()
+        cache.delete(session.cache_key)
+
+        assert SessionStore(session.session_key)["cart"] == [1, 2]
+
+        settings.SESSION_STORE = {**session_store, "L1_TTL": 0}
+        assert "cart" not in SessionStore(session.session_key)
+
+    def test_local_cache_returns_copies(self, session_store: dict) -> None:
+        """Tests that requests never share the mutable data of a cached session."""
+
+        session = SessionStore()
+        session["cart"] = [1]
+        session.save()
+
+        SessionStore(session.session_key)["cart"].append(2)
+
+        assert SessionStore(session.session_key)["cart"] == [1]
+
+    def test_activity_is_written_back_in_the_background(self, session_store: dict, new_user) -> None:
+        """Tests that last_activity updates skip the shared cache until the writer flushes."""
+
+        session = login_session(new_user, **{ACTIVITY_KEY: int(time.time()) - 120})
+        get_local_session_cache().clear()
+
+        touched = SessionStore(session.session_key)
+        assert touched["_auth_user_id"] == str(new_user.pk)
+        assert touched.modified
+        touched.save()
+
+        assert cache.get(session.cache_key)[ACTIVITY_KEY] < time.time() - 60
+        get_session_write_behind().flush()
+        assert cache.get(session.cache_key)[ACTIVITY_KEY] >= time.time() - 5
+
+    def test_logout_ends_the_session_everywhere(self, session_store: dict, new_user) -> None:
+        """Tests that flush() removes the session from the L1, the shared cache and the pending writes."""
+
+        session = login_session(new_user)
+        get_session_write_behind().schedule(session.cache_key, {ACTIVITY_KEY: 1}, 60)
+        session_key, cache_key = session.session_key, session.cache_key
+
+        session.flush()
+        get_session_write_behind().flush()
+
+        assert cache.get(cache_key) is None
+        assert "_auth_user_id" not in SessionStore(session_key)
+
+    def test_password_change_ends_all_sessions_of_the_user(self, session_store: dict, new_user) -> None:
+        """Tests that every session of the account is invalidated when its password changes."""
+
+        sessions = [login_session(new_user), login_session(new_user)]
+
+        new_user.set_password("another_password_12345")
+        new_user.save()
+
+        for session in sessions:
+            assert "_auth_user_id" not in SessionStore(session.session_key)
+
+    def test_async_api_uses_the_same_store(self, session_store: dict) -> None:
+        """Tests that asave() and aload() go through the L1 and the shared cache."""
+
+        session = SessionStore()
+        session["theme"] = "dark"
+        async_to_sync(session.asave)()
+
+        assert async_to_sync(SessionStore(session.session_key).aget)("theme") == "dark"
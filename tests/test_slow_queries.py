@@ -0,0 +1,78 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.urls import ResolverMatch
+
+from app.slow_queries import CurrentViewMiddleware, get_slow_query_recorder, params_shape
+
+
+def changelist_view(request):
+    get_user_model().objects.filter(email__iexact="nobody@example.com").exists()
+    return HttpResponse("ok")
+
+
+def run_view(view, view_name: str) -> None:
+    request = RequestFactory().get("/admin/accounts/user/")
+    request.resolver_match = ResolverMatch(view, (), {}, url_name=view_name.split(":")[-1], namespaces=["admin"])
+
+    def handler(request):
+        middleware.process_view(request, view, (), {})
+        return view(request)
+
+    middleware = CurrentViewMiddleware(handler)
+    middleware(request)
+
+
+class TestSlowQueryLog:
+    def test_slow_statement_is_recorded_with_view_and_plan(self, db, slow_query_log: dict, settings) -> None:
+        """Tests that a statement over the threshold is buffered with its view, parameter types and plan."""
+
+        settings.SLOW_QUERY_LOG = {**slow_query_log, "ENABLED": True, "THRESHOLD_MS": 0, "EXPLAIN_SAMPLE_RATE": 1.0}
+        recorder = get_slow_query_recorder()
+        recorder.clear()
+
+        run_view(changelist_view, "admin:accounts_user_changelist")
+        recorder.join()
+
+        record = recorder.recent(1)[0]
+        assert record["view"] == "admin:accounts_user_changelist"
+        assert "LIKE" in record["sql"]
+        assert "str" in record["params"]
+        assert "nobody" not in record["params"]
+        assert record["duration_ms"] >= 0
+        assert record["plan"]
+        assert not record["plan"].startswith("EXPLAIN failed")
+
+    def test_fast_statements_are_not_recorded(self, db, slow_query_log: dict, settings) -> None:
+        """Tests that statements under the threshold leave the buffer empty."""
+
+        settings.SLOW_QUERY_LOG = {**slow_query_log, "ENABLED": True, "THRESHOLD_MS": 60_000}
+        recorder = get_slow_query_recorder()
+        recorder.clear()
+
+        get_user_model().objects.count()
+
+        assert recorder.recent() == []
+
+    def test_command_prints_buffered_records(self, db, slow_query_log: dict, settings, capsys) -> None:
+        """Tests that the slow_queries command reads the buffer as JSON."""
+
+        settings.SLOW_QUERY_LOG = {**slow_query_log, "ENABLED": True, "THRESHOLD_MS": 0, "EXPLAIN_SAMPLE_RATE": 0}
+        get_slow_query_recorder().clear()
+        get_user_model().objects.count()
+
+        call_command("slow_queries", "--json", "--clear")
+
+        records = json.loads(capsys.readouterr().out)
+        assert records[0]["view"].startswith("thread:")
+        assert get_slow_query_recorder().recent() == []
+
+    def test_params_shape_hides_values(self) -> None:
+        """Tests that only parameter types are kept."""
+
+        assert params_shape(("secret", 3), many=False) == "(str, int)"
+        assert params_shape([("a",), ("b",)], many=True) == "2 x (str)"
+        assert params_shape(None, many=False) == "()"
@@ -0,0 +1,51 @@
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from app.accounts.management.commands import startup_profile
+from app.startup import ImportTiming, parse_importtime, profile_startup
+
+IMPORTTIME = """\
+import time: self [us] | cumulative | imported package
+import time:       120 |        120 |     app.logs
+2026-01-01 00:00:00,000 - root - INFO - Accounts security signals registered successfully.
+import time:      1500 |      42000 |   app.metrics
+import time:      3000 |      90000 | app.wsgi
+"""
+
+
+class TestStartupProfile:
+    def test_parse_importtime_skips_header_and_other_output(self) -> None:
+        """Tests that every module line becomes a timing in milliseconds."""
+
+        assert parse_importtime(IMPORTTIME) == [
+            ImportTiming("app.logs", 0.12, 0.12),
+            ImportTiming("app.metrics", 1.5, 42.0),
+            ImportTiming("app.wsgi", 3.0, 90.0),
+        ]
+
+    def test_cold_start_is_timed_in_a_fresh_interpreter(self) -> None:
+        """Tests that the profiled start sets Django up and reports the project's modules."""
+
+        startup_ms, timings = profile_startup("app.wsgi")
+
+        assert startup_ms > 0
+        assert {"app.wsgi", "app.settings", "app.logs"} <= {timing.module for timing in timings}
+
+    @pytest.mark.parametrize(
+        ("options", "message"),
+        [
+            ({"budget_ms": 50}, "app.wsgi started in 100.0ms, over the 50ms budget."),
+            ({"module_budget_ms": 40}, "app.metrics took 42.0ms to import, over the 40ms module budget."),
+        ],
+    )
+    def test_exceeded_budget_fails(self, options: dict, message: str, monkeypatch, capsys) -> None:
+        """Tests that the start and each project module are held to their budgets, the profiled module excepted."""
+
+        monkeypatch.setattr(startup_profile, "profile_startup", lambda module: (100.0, parse_importtime(IMPORTTIME)))
+
+        with pytest.raises(CommandError, match=message):
+            call_command("startup_profile", module="app.wsgi", **{"budget_ms": 0, "module_budget_ms": 0, **options})
+
+        call_command("startup_profile", module="app.wsgi", budget_ms=200, module_budget_ms=100)
+        assert "app.wsgi started in 100.0ms, importing 3 modules." in capsys.readouterr().out
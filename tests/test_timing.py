@@ -0,0 +1,50 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.handlers.exception import convert_exception_to_response
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from app.accounts.middleware import RequestValidationMiddleware, SecurityHeadersMiddleware
+from app.timing import ServerTimingMiddleware, timed
+
+
+def view(request):
+    with timed("hash"):
+        get_user_model().objects.count()
+    return HttpResponse("ok")
+
+
+def build_chain():
+    handler = convert_exception_to_response(view)
+    for middleware in (RequestValidationMiddleware, SecurityHeadersMiddleware):
+        handler = convert_exception_to_response(middleware(handler))
+    return ServerTimingMiddleware(handler)
+
+
+class TestServerTiming:
+    def test_sampled_request_reports_phases(self, db, settings) -> None:
+        """Tests that every middleware, the view, queries and timed blocks get a metric."""
+
+        settings.SERVER_TIMING = {**settings.SERVER_TIMING, "SAMPLE_RATE": 1.0}
+
+        response = build_chain()(RequestFactory().get("/api/v1/stocks"))
+
+        metrics = dict(metric.split(";", 1) for metric in response["Server-Timing"].split(", "))
+        assert set(metrics) == {
+            "mw_SecurityHeadersMiddleware",
+            "mw_RequestValidationMiddleware",
+            "view",
+            "hash",
+            "db",
+            "total",
+        }
+        assert metrics["db"].endswith('desc="1 queries"')
+
+    def test_disabled_timing_is_removed_from_the_chain(self, settings) -> None:
+        """Tests that a zero sample rate costs nothing per request."""
+
+        settings.SERVER_TIMING = {**settings.SERVER_TIMING, "SAMPLE_RATE": 0.0}
+
+        with pytest.raises(MiddlewareNotUsed):
+            build_chain()
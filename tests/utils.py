@@ -1,6 +1,10 @@
+from contextlib import contextmanager
+
 import pytest  # noqa F401
 from django.contrib.sessions.middleware import SessionMiddleware
+from django.db import connection
 from django.http import HttpRequest
+from django.test.utils import CaptureQueriesContext
 from ninja.testing import TestClient
 
 
@@ -32,3 +36,17 @@ class NinjaSessionClient(TestClient):
         if "REQUEST" not in kwargs:
             kwargs["REQUEST"] = self.request
         return super().get(*args, **kwargs)
+
+
+@contextmanager
+def assert_query_budget(budget: int, label: str = "block"):
+    """
+    Fail when the wrapped block runs more than ``budget`` queries, listing
+    every query it ran. Works as a context manager and as a decorator.
+    """
+    with CaptureQueriesContext(connection) as context:
+        yield context
+
+    if len(context) > budget:
+        queries = "\n".join(f"  {number}. {query['sql']}" for number, query in enumerate(context, start=1))
+        pytest.fail(f"{label} ran {len(context)} queries, budget is {budget}:\n{queries}", pytrace=False)